@@ -6,9 +6,11 @@ import pandas as pd
 import hashlib
 import asyncio
 from dspy.teleprompt import BootstrapFewShotWithRandomSearch
-from agent_dojo.agents.DigitalTwinCreatorAgent.InsuranceProspectModel import InsuranceProspect
+from agent_dojo.agents.DigitalTwinCreatorAgent.InsuranceProspectModel import InsuranceProspect, insurance_prospect_from_metadata
 from agent_dojo.tools.file_utils import get_optimized_program_file_directory, get_training_set_directory
-from agent_dojo.tools.lmtools import log_lm_execution_cost
+from agent_dojo.tools.lmtools import TrackedLM, track_lm_usage
+from agent_dojo.tools.program_registry import program_registry
+from agent_dojo.tools.stage_graph import StageGraph
 from typing import Any,Literal
 
 from dotenv import load_dotenv
@@ -16,8 +18,8 @@ load_dotenv()
 
 # Add parent directories to path for storage imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
-from storage.digital_twin_storage import ScalableDigitalTwinStorage
-from utils.async_helper import run_async
+from storage.digital_twin_storage import ScalableDigitalTwinStorage, compute_input_hash
+from utils.async_helper import run_async, run_blocking
 
 #dspy.settings.configure( track_usage=True )
 
@@ -37,9 +39,9 @@ from utils.async_helper import run_async
 
 TEST_SET="lead_personas_dataset_v6_10records_detailed_existing.csv"
 
-reflection_model=dspy.LM(model="azure/gpt-4.1-mini", temperature=1.0, max_tokens=32000)
-model_for_optimization=dspy.LM('azure/gpt-4.1-mini',temperature=1.0, max_tokens=16000)
-model_for_execution=dspy.LM('azure/gpt-4.1-mini',temperature=1.0, max_tokens=16000)
+reflection_model=TrackedLM(model="azure/gpt-4.1-mini", temperature=1.0, max_tokens=32000)
+model_for_optimization=TrackedLM('azure/gpt-4.1-mini',temperature=1.0, max_tokens=16000)
+model_for_execution=TrackedLM('azure/gpt-4.1-mini',temperature=1.0, max_tokens=16000)
 
 
 class ExtractDigitalTwinSig(dspy.Signature):
@@ -69,12 +71,29 @@ class DigitalTwinCreatorAgent(dspy.Module):
         self.extract_insurance_prospect = dspy.ChainOfThought(InsuranceProspectSig)
 
     def forward(self, data,existing_digital_twin):
-        digital_twin = self.perform_digital_twin_extraction(data=data,existing_digital_twin=existing_digital_twin).digital_twin
-        lead_classification = self.classify_lead(digital_twin=digital_twin).lead_classification
-        insurance_prospect = self.extract_insurance_prospect(digital_twin=digital_twin).insurance_prospect
-        insurance_prospect.lead_classification = lead_classification
+        #classify_lead and extract_insurance_prospect only depend on the digital twin, so they run in parallel
+        graph = StageGraph()
+        graph.add_stage(
+            "perform_digital_twin_extraction",
+            lambda results: self.perform_digital_twin_extraction(data=data,existing_digital_twin=existing_digital_twin).digital_twin,
+        )
+        graph.add_stage(
+            "classify_lead",
+            lambda results: self.classify_lead(digital_twin=results["perform_digital_twin_extraction"]).lead_classification,
+            depends_on=["perform_digital_twin_extraction"],
+        )
+        graph.add_stage(
+            "extract_insurance_prospect",
+            lambda results: self.extract_insurance_prospect(digital_twin=results["perform_digital_twin_extraction"]).insurance_prospect,
+            depends_on=["perform_digital_twin_extraction"],
+        )
+        results, stage_timings = graph.run()
+
+        digital_twin = results["perform_digital_twin_extraction"]
+        insurance_prospect = results["extract_insurance_prospect"]
+        insurance_prospect.lead_classification = results["classify_lead"]
        
-        return dspy.Prediction(digital_twin=digital_twin, insurance_prospect=insurance_prospect)
+        return dspy.Prediction(digital_twin=digital_twin, insurance_prospect=insurance_prospect, stage_timings=stage_timings)
 
 class AssessDigitalTwinQualitySig(dspy.Signature):
     """Assess the quality of digital twin text created"""
@@ -250,71 +269,118 @@ def _compute_score_with_feedback(gold, pred, trace=None, pred_name=None, pred_tr
 
 def optimize_using_gepa():
     test_set, val_set = _load_test_set(TEST_SET, __file__)
-    with dspy.context(lm=model_for_optimization):
+    with track_lm_usage("optimize_using_gepa") as usage, dspy.context(lm=model_for_optimization):
         program = DigitalTwinCreatorAgent()
         optimizer = dspy.GEPA(metric=_compute_score_with_feedback, use_merge=False, num_threads=2, reflection_lm=reflection_model,max_full_evals=2)
         optimized_program = optimizer.compile(program, trainset=test_set)
         _save_optimized_program(optimized_program, __file__)
-        log_lm_execution_cost(model_for_optimization,"optimize_using_gepa_metrics")
-        log_lm_execution_cost(reflection_model,"optimize_using_gepa_reflection")
+    print(f"optimize_using_gepa - LLM usage by model: {usage.as_dict()['by_model']}")
 
 def run(data, existing_digital_twin=None, lead_id=None) -> Any:
-    agent = DigitalTwinCreatorAgent()
     optimized_program_file_dir = get_optimized_program_file_directory(__file__)
     optimized_program_file = os.path.join(optimized_program_file_dir, 'DigitalTwinCreatorAgent_Optimized')
-    if os.path.exists(optimized_program_file):
-        agent = dspy.load(optimized_program_file)
-    else:
+    agent = program_registry.get_program("DigitalTwinCreatorAgent", optimized_program_file)
+    if agent is None:
         #Throw error
         raise FileNotFoundError("Optimized program not found. Please train the agent first.")
 
     lm=model_for_execution
-    with dspy.context(lm=lm):
+    with track_lm_usage("DigitalTwinCreatorAgent") as usage, dspy.context(lm=lm):
         output = agent(data=data, existing_digital_twin=existing_digital_twin)
-        #print(output.get_lm_usage())
-        execution_cost=log_lm_execution_cost(lm,"DigitalTwinCreatorAgent")
-
-        # Store the digital twin to Azure storage
-        digital_twin_content = output.digital_twin
-        
-        return {
-            "digital_twin": digital_twin_content,
-            "lead_classification": None,  # output.insurance_prospect.lead_classification if hasattr(output, 'insurance_prospect') else None,
-            "lead_id": lead_id,
-            "execution_cost": execution_cost,
-            "insurance_prospect": output.insurance_prospect if hasattr(output, 'insurance_prospect') else None
-        }
-    
 
+    # Store the digital twin to Azure storage
+    digital_twin_content = output.digital_twin
+
+    return {
+        "digital_twin": digital_twin_content,
+        "lead_classification": None,  # output.insurance_prospect.lead_classification if hasattr(output, 'insurance_prospect') else None,
+        "lead_id": lead_id,
+        "execution_cost": usage.cost,
+        "lm_usage": usage.as_dict(),
+        "insurance_prospect": output.insurance_prospect if hasattr(output, 'insurance_prospect') else None,
+        "stage_timings": output.stage_timings if hasattr(output, 'stage_timings') else None
+    }
+
+
+async def arun(data, existing_digital_twin=None, lead_id=None) -> Any:
+    """Async variant of run() that executes the agent in the shared agent executor"""
+    return await run_blocking(run, data, existing_digital_twin, lead_id)
+
+
+def _get_memoized_output(storage, input_hash, lead_id=None):
+    """Return the stored twin previously created from the same inputs, if any"""
+    if lead_id:
+        metadata = run_async(storage.get_digital_twin_metadata(lead_id))
+        if not metadata or metadata.get('input_hash') != input_hash:
+            return None
+    else:
+        metadata = run_async(storage.find_by_input_hash(input_hash))
+        if not metadata:
+            return None
+
+    digital_twin_content = run_async(storage.get_digital_twin(metadata['id']))
+    if not digital_twin_content:
+        return None
+
+    return {
+        "digital_twin": digital_twin_content,
+        "lead_classification": None,
+        "lead_id": metadata['id'],
+        "execution_cost": 0.0,
+        "lm_usage": None,
+        "insurance_prospect": insurance_prospect_from_metadata(metadata),
+        "stage_timings": None,
+        "memoized": True
+    }
+
+
+def create(data, existing_digital_twin=None, lead_id=None, use_memo=True) -> Any:
+    storage = ScalableDigitalTwinStorage()
+    input_hash = compute_input_hash(data, existing_digital_twin)
+
+    # Replayed inputs return the stored twin instead of re-running the LLM pipeline
+    if use_memo:
+        try:
+            memoized_output = _get_memoized_output(storage, input_hash, lead_id)
+            if memoized_output:
+                print(f"Digital twin inputs unchanged, returning stored twin for lead_id: {memoized_output['lead_id']}")
+                return memoized_output
+        except Exception as e:
+            print(f"Warning: Could not check for a stored digital twin: {e}")
 
-def create(data, existing_digital_twin=None, lead_id=None) -> Any:
     # Generate lead_id if not provided
     if not lead_id:
         lead_id = str(uuid.uuid4())
 
     output=run(data, existing_digital_twin, lead_id)
     output["lead_id"]=lead_id
+    output["memoized"]=False
     # Store the digital twin to Azure storage
     digital_twin_content = output["digital_twin"]
     
     # Store to Azure storage
     try:
-        storage = ScalableDigitalTwinStorage()
         insurance_prospect=output["insurance_prospect"] if "insurance_prospect" in output else None
         insurance_prospect.id=lead_id
         # Save or update the digital twin
-        run_async(
+        save_result = run_async(
             storage.save_digital_twin(
                 lead_id=lead_id,
                 markdown=digital_twin_content,
                 insurance_prospect=insurance_prospect,
+                input_hash=input_hash,
             )
         )
+        output["content_hash"] = save_result["content_hash"]
         
-        print(f"Digital twin saved to Azure storage with lead_id: {lead_id}")
+        print(f"Digital twin saved to Azure storage with lead_id: {lead_id} (blob written: {save_result['blob_written']}, metadata written: {save_result['metadata_written']})")
 
         return output
        
     except Exception as e:
         print(f"Warning: Could not save to Azure storage: {e}")
-        
\ No newline at end of file
+
+
+async def acreate(data, existing_digital_twin=None, lead_id=None, use_memo=True) -> Any:
+    """Async variant of create() that executes the agent in the shared agent executor"""
+    return await run_blocking(create, data, existing_digital_twin, lead_id, use_memo)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 
 
 @dataclass
@@ -34,3 +34,20 @@ class InsuranceProspect:
     insurance_history: InsuranceHistory
     lead_classification: str = "Cold"
     persona_summary:str="Unknown"
+
+
+def _from_dict(cls, values):
+    known_fields = {f.name for f in fields(cls)}
+    return cls(**{k: v for k, v in (values or {}).items() if k in known_fields})
+
+
+def insurance_prospect_from_metadata(metadata: dict) -> InsuranceProspect:
+    """Rebuild an InsuranceProspect from a stored digital twin metadata document"""
+    return InsuranceProspect(
+        personal_information=_from_dict(PersonalInformation, metadata.get("personal_information")),
+        demographic_information=_from_dict(DemographicInformation, metadata.get("demographic_information")),
+        financial_information=_from_dict(FinancialInformation, metadata.get("financial_information")),
+        insurance_history=_from_dict(InsuranceHistory, metadata.get("insurance_history")),
+        lead_classification=metadata.get("lead_classification", "Cold"),
+        persona_summary=metadata.get("persona_summary", "Unknown"),
+    )
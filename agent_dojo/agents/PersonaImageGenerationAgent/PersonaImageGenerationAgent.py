@@ -8,11 +8,19 @@ from agent_dojo.tools.file_utils import get_persona_photographs_directory
 
 # Add parent directories to path for storage imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
-from agent_dojo.tools.lmtools import log_lm_execution_cost
+from agent_dojo.tools.lmtools import TrackedLM, track_lm_usage
 from storage.persona_image_storage import PersonaImageStorage
-from utils.async_helper import run_async
+from utils.async_helper import run_async, run_blocking
+from utils.work_queue import BackgroundWorkQueue, WorkJob
 
-model_for_execution=dspy.LM('openai/gpt-4.1-mini')
+model_for_execution=TrackedLM('openai/gpt-4.1-mini')
+
+#Image generation runs off the request path; one active job per lead_id
+image_generation_queue = BackgroundWorkQueue(
+    "persona_image_generation",
+    max_workers=int(os.getenv("IMAGE_GENERATION_MAX_CONCURRENCY", "2")),
+    max_attempts=int(os.getenv("IMAGE_GENERATION_MAX_ATTEMPTS", "3")),
+)
 
 class PersonaSummarization(dspy.Signature):
     """Create an prompt to create a realistic photograph of the persona provided by capturing all relevant details to represent the person"""
@@ -32,14 +40,22 @@ def run(persona: str, lead_id: str = None):
     prog=PersonaImageGenerationAgent()
 
     lm=model_for_execution
-    with dspy.context(lm=lm):
+    with track_lm_usage("PersonaImageGenerationAgent") as usage, dspy.context(lm=lm):
         prog(persona=persona, lead_id=lead_id)
-        execution_cost=log_lm_execution_cost(lm,"DigitalTwinCreatorAgent")
 
-        return {
-            "generated_image_id": lead_id,
-            "execution_cost": execution_cost
-        }
+    return {
+        "generated_image_id": lead_id,
+        "execution_cost": usage.cost,
+        "lm_usage": usage.as_dict()
+    }
+
+async def arun(persona: str, lead_id: str = None):
+    """Async variant of run() that executes the agent in the shared agent executor"""
+    return await run_blocking(run, persona, lead_id)
+
+def submit(persona: str, lead_id: str) -> WorkJob:
+    """Queue image generation for a lead; returns the already active job if one exists for lead_id"""
+    return image_generation_queue.submit(run, persona, lead_id=lead_id, dedup_key=lead_id)
 
 
 
@@ -6,6 +6,7 @@ import base64
 from typing import List, Dict, Any, Union
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
+import contextvars
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,16 +14,17 @@ load_dotenv()
 # Add parent directories to path for storage imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 from storage.digital_twin_storage import ScalableDigitalTwinStorage
-from utils.async_helper import run_async
+from utils.async_helper import run_async, run_blocking
 from agent_dojo.tools.file_utils import get_optimized_program_file_directory, get_training_set_directory
-from agent_dojo.tools.lmtools import log_lm_execution_cost
+from agent_dojo.tools.lmtools import TrackedLM, track_lm_usage
+from agent_dojo.tools.program_registry import program_registry
 
 # Initialize storage
 digital_twin_storage = ScalableDigitalTwinStorage()
 
 # Model configurations
-model_for_execution = dspy.LM(os.getenv('GROQ_LLAMA_MODEL', 'openai/gpt-4-mini'), temperature=0.7, max_tokens=4000)
-model_for_survey = dspy.LM('openai/gpt-4-mini', temperature=0.8, max_tokens=2000)
+model_for_execution = TrackedLM(os.getenv('GROQ_LLAMA_MODEL', 'openai/gpt-4-mini'), temperature=0.7, max_tokens=4000)
+model_for_survey = TrackedLM('openai/gpt-4-mini', temperature=0.8, max_tokens=2000)
 
 
 class GenerateSurveyQuestionsSig(dspy.Signature):
@@ -96,22 +98,28 @@ class SurveyResponseAgent(dspy.Module):
     def _get_digital_twins(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Retrieve digital twins from storage"""
         try:
-            # Get list of digital twins with their metadata
+            # Get list of digital twins with their full metadata documents
             twins_metadata = run_async(
-                digital_twin_storage.list_digital_twins(limit=limit)
+                digital_twin_storage.list_digital_twins(limit=limit, fields=None)
             )
             
-            digital_twins = []
-            for twin_meta in twins_metadata:
-                twin_content = run_async(
-                    digital_twin_storage.get_digital_twin(twin_meta['id'])
+            # Download the markdown of all listed twins in parallel, reusing the listed metadata
+            twins = run_async(
+                digital_twin_storage.get_many(
+                    [twin_meta['id'] for twin_meta in twins_metadata],
+                    metadata=[twin_meta['metadata'] for twin_meta in twins_metadata]
                 )
-                if twin_content:
+            )
+            
+            digital_twins = []
+            for twin in twins:
+                if twin['markdown']:
+                    metadata = twin['metadata'] or {}
                     digital_twins.append({
-                        'lead_id': twin_meta['id'],
-                        'classification': twin_meta.get('lead_classification', 'unknown'),
-                        'content': twin_content,
-                        'metadata': twin_meta
+                        'lead_id': twin['lead_id'],
+                        'classification': metadata.get('lead_classification', 'unknown'),
+                        'content': twin['markdown'],
+                        'metadata': metadata
                     })
             
             return digital_twins
@@ -154,7 +162,7 @@ class SurveyResponseAgent(dspy.Module):
         with ThreadPoolExecutor(max_workers=batch_size) as executor:
             futures = []
             for twin_data in digital_twins:
-                future = executor.submit(get_persona_response, twin_data)
+                future = executor.submit(contextvars.copy_context().run, get_persona_response, twin_data)
                 futures.append(future)
             
             # Collect results as they complete
@@ -180,18 +188,16 @@ def run(survey_input: str, is_image: bool = False, max_personas: int = 20, lead_
     Returns:
         Dictionary containing survey questions, individual responses, and consolidated report
     """
-    agent = SurveyResponseAgent()
-    
     # Try to load optimized program if available
     optimized_program_file_dir = get_optimized_program_file_directory(__file__)
     optimized_program_file = os.path.join(optimized_program_file_dir, 'SurveyResponseAgent_Optimized')
-    if os.path.exists(optimized_program_file):
-        agent = dspy.load(optimized_program_file)
+    agent = program_registry.get_program("SurveyResponseAgent", optimized_program_file)
+    if agent is None:
+        agent = SurveyResponseAgent()
     
     lm = model_for_execution
-    with dspy.context(lm=lm):
+    with track_lm_usage("SurveyResponseAgent") as usage, dspy.context(lm=lm):
         output = agent(survey_input=survey_input, is_image=is_image, max_personas=max_personas)
-        log_lm_execution_cost(lm, "SurveyResponseAgent")
     
     # Format the output
     result = {
@@ -199,12 +205,19 @@ def run(survey_input: str, is_image: bool = False, max_personas: int = 20, lead_
         "total_respondents": output.total_respondents,
         "responses": output.responses,
         "consolidated_report": output.consolidated_report,
-        "summary": _generate_summary(output.consolidated_report, output.total_respondents)
+        "summary": _generate_summary(output.consolidated_report, output.total_respondents),
+        "execution_cost": usage.cost,
+        "lm_usage": usage.as_dict()
     }
     
     return result
 
 
+async def arun(survey_input: str, is_image: bool = False, max_personas: int = 20, lead_ids: List[str] = None) -> Dict[str, Any]:
+    """Async variant of run() that executes the survey in the shared agent executor"""
+    return await run_blocking(run, survey_input, is_image, max_personas, lead_ids)
+
+
 def _generate_summary(consolidated_report: Dict[str, Any], total_respondents: int) -> str:
     """Generate a brief summary of the survey results"""
     summary_parts = [
@@ -248,6 +261,11 @@ def process_image_survey(image_path: str, initial_questions: str = None) -> Dict
     return run(survey_input=image_description, is_image=True)
 
 
+async def aprocess_image_survey(image_path: str, initial_questions: str = None) -> Dict[str, Any]:
+    """Async variant of process_image_survey() that runs in the shared agent executor"""
+    return await run_blocking(process_image_survey, image_path, initial_questions)
+
+
 def optimize():
     """Placeholder for future optimization using DSPy optimizers"""
     # This would be implemented similar to DigitalTwinCreatorAgent
@@ -1,3 +1,3 @@
-from .SurveyResponseAgent import SurveyResponseAgent, run, process_image_survey
+from .SurveyResponseAgent import SurveyResponseAgent, run, arun, process_image_survey, aprocess_image_survey, optimize
 
-__all__ = ['SurveyResponseAgent', 'run', 'process_image_survey']
\ No newline at end of file
+__all__ = ['SurveyResponseAgent', 'run', 'arun', 'process_image_survey', 'aprocess_image_survey', 'optimize']
@@ -31,4 +31,13 @@ def get_persona_photographs_directory():
     persona_photographs_dir = os.path.join(current_dir, 'agent_dojo', 'persona_photographs')
     if not os.path.exists(persona_photographs_dir):
         os.makedirs(persona_photographs_dir)
-    return persona_photographs_dir
\ No newline at end of file
+    return persona_photographs_dir
+
+def get_cache_directory(cache_name):
+    # Cache files live next to the agents, e.g. agent_dojo/cache/<cache_name>
+    agent_dojo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_dir = os.getenv("AGENT_CACHE_DIR", os.path.join(agent_dojo_dir, 'cache'))
+    cache_dir = os.path.join(cache_dir, cache_name)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
@@ -1,4 +1,120 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import dspy
+
+#Number of entries kept in each LM's own history. Request accounting no longer reads it, so keep it small.
+LM_HISTORY_LIMIT = int(os.getenv("LM_HISTORY_LIMIT", "20"))
+
+
+class LMUsage:
+    """Token, cost and latency counters for the LM calls made inside one agent invocation."""
+
+    def __init__(self, activity: str):
+        self.activity = activity
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.cost = 0.0
+        self.latency_seconds = 0.0
+        self.by_model: Dict[str, Dict[str, Any]] = {}
+
+    def record_call(self, entry: Dict[str, Any]) -> None:
+        usage = entry.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        total_tokens = usage.get("total_tokens") or (prompt_tokens + completion_tokens)
+        cost = entry.get("cost") or 0.0
+        model = entry.get("model") or "unknown"
+
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.total_tokens += total_tokens
+            self.cost += cost
+            model_usage = self.by_model.setdefault(model, {"calls": 0, "total_tokens": 0, "cost": 0.0})
+            model_usage["calls"] += 1
+            model_usage["total_tokens"] += total_tokens
+            model_usage["cost"] += cost
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self.latency_seconds += seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total_tokens,
+                "cost": self.cost,
+                "latency_seconds": round(self.latency_seconds, 3),
+                "by_model": {model: dict(values) for model, values in self.by_model.items()},
+            }
+
+
+_current_usage: contextvars.ContextVar[Optional[LMUsage]] = contextvars.ContextVar("lm_usage", default=None)
+
+
+def get_current_usage() -> Optional[LMUsage]:
+    return _current_usage.get()
+
+
+@contextmanager
+def track_lm_usage(activity: str) -> Iterator[LMUsage]:
+    """
+    Collect usage of every TrackedLM call made in this context (including threads started
+    with a copied context) and log it on exit.
+    """
+    usage = LMUsage(activity)
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        print(f"{activity} - LLM execution cost:{usage.cost} tokens:{usage.total_tokens} calls:{usage.calls} latency:{usage.latency_seconds:.2f}s")
+
+
+class TrackedLM(dspy.LM):
+    """dspy.LM that reports each call to the active LMUsage and keeps only a bounded history."""
+
+    def forward(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().forward(*args, **kwargs)
+        finally:
+            usage = _current_usage.get()
+            if usage is not None:
+                usage.record_latency(time.perf_counter() - start)
+
+    async def aforward(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().aforward(*args, **kwargs)
+        finally:
+            usage = _current_usage.get()
+            if usage is not None:
+                usage.record_latency(time.perf_counter() - start)
+
+    def update_history(self, entry):
+        usage = _current_usage.get()
+        if usage is not None:
+            usage.record_call(entry)
+        super().update_history(entry)
+        if len(self.history) > LM_HISTORY_LIMIT:
+            del self.history[:-LM_HISTORY_LIMIT]
+
+
 def log_lm_execution_cost(lm,activity:str) -> float:
+    #Only reflects the bounded lm.history; prefer track_lm_usage for per-request accounting
     cost = sum(x["cost"] for x in lm.history if x.get("cost") is not None)
     print(f"{activity} - LLM execution cost:{cost}")
-    return cost
\ No newline at end of file
+    return cost
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import dspy
+
+
+#Files written by dspy's save(..., save_program=True) that define a loaded program version
+PROGRAM_FILES = ("program.pkl", "metadata.json")
+
+
+@dataclass
+class ProgramStats:
+    """Per-agent counters describing how often the optimized program was served from memory."""
+    hits: int = 0
+    misses: int = 0
+    reloads: int = 0
+    load_count: int = 0
+    total_load_time_ms: float = 0.0
+    last_load_time_ms: float = 0.0
+    last_loaded_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "load_count": self.load_count,
+            "total_load_time_ms": round(self.total_load_time_ms, 3),
+            "avg_load_time_ms": round(self.total_load_time_ms / self.load_count, 3) if self.load_count else 0.0,
+            "last_load_time_ms": round(self.last_load_time_ms, 3),
+            "last_loaded_at": self.last_loaded_at,
+        }
+
+
+@dataclass
+class _LoadedProgram:
+    program: Any
+    signature: Tuple
+
+
+class ProgramRegistry:
+    """
+    Process-wide cache of optimized DSPy programs.
+
+    Each optimized program directory is unpickled once and shared by all requests.
+    The program is reloaded only when program.pkl/metadata.json change on disk.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._programs: Dict[str, _LoadedProgram] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._stats: Dict[str, ProgramStats] = {}
+
+    def _file_signature(self, program_dir: str) -> Optional[Tuple]:
+        """Return (mtime_ns, size) for each program file, or None if the program is missing"""
+        signature = []
+        for file_name in PROGRAM_FILES:
+            file_path = os.path.join(program_dir, file_name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                if file_name == "program.pkl":
+                    return None
+                signature.append((file_name, None, None))
+                continue
+            signature.append((file_name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def get_program(self, agent_name: str, program_dir: str) -> Optional[Any]:
+        """
+        Return the loaded program for program_dir, loading or reloading it when needed.
+        Returns None if no optimized program exists at program_dir.
+        """
+        signature = self._file_signature(program_dir)
+        if signature is None:
+            return None
+
+        with self._lock:
+            stats = self._stats.setdefault(agent_name, ProgramStats())
+            loaded = self._programs.get(program_dir)
+            if loaded and loaded.signature == signature:
+                stats.hits += 1
+                return loaded.program
+            stats.misses += 1
+            load_lock = self._load_locks.setdefault(program_dir, threading.Lock())
+
+        #Only one thread loads a given program; others wait and reuse its result
+        with load_lock:
+            with self._lock:
+                loaded = self._programs.get(program_dir)
+                if loaded and loaded.signature == signature:
+                    return loaded.program
+
+            start = time.perf_counter()
+            program = dspy.load(program_dir)
+            load_time_ms = (time.perf_counter() - start) * 1000
+
+            with self._lock:
+                if program_dir in self._programs:
+                    stats.reloads += 1
+                self._programs[program_dir] = _LoadedProgram(program=program, signature=signature)
+                stats.load_count += 1
+                stats.total_load_time_ms += load_time_ms
+                stats.last_load_time_ms = load_time_ms
+                stats.last_loaded_at = time.time()
+
+        print(f"{agent_name} - loaded optimized program in {load_time_ms:.1f} ms")
+        return program
+
+    def invalidate(self, program_dir: Optional[str] = None) -> None:
+        """Drop a loaded program (or all of them) so the next request reloads from disk"""
+        with self._lock:
+            if program_dir is None:
+                self._programs.clear()
+            else:
+                self._programs.pop(program_dir, None)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+
+program_registry = ProgramRegistry()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from agent_dojo.tools.file_utils import get_cache_directory
+
+#All caches created in this process, for metrics
+_caches: Dict[str, "ResponseCache"] = {}
+
+
+class ResponseCache:
+    """
+    Two-tier cache for agent responses: an in-memory LRU with TTL in front of a disk tier.
+
+    Values must be JSON-serializable. A ttl_seconds of None means entries never expire,
+    which suits content-addressed keys.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 use_disk: bool = True, enabled: bool = True):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.use_disk = use_disk
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_dir = get_cache_directory(name) if use_disk and enabled else None
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypasses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+        _caches[name] = self
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable hash of the given parts"""
+        payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        #Shard by key prefix so a single directory does not grow unbounded
+        return os.path.join(self._disk_dir, key[:2], f"{key}.json")
+
+    def _is_expired(self, expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at < time.time()
+
+    def _remember(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        #Caller must hold self._lock
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats["bypasses"] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if not self._is_expired(expires_at):
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self._disk_dir:
+            try:
+                with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                if not self._is_expired(record.get("expires_at")):
+                    with self._lock:
+                        self._remember(key, record["value"], record.get("expires_at"))
+                        self._stats["disk_hits"] += 1
+                    return record["value"]
+                os.remove(self._disk_path(key))
+                with self._lock:
+                    self._stats["expirations"] += 1
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+            except OSError as e:
+                print(f"{self.name} cache - error reading disk entry: {e}")
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._stats["stores"] += 1
+
+        if self._disk_dir:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"expires_at": expires_at, "value": value}, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except (OSError, TypeError) as e:
+                print(f"{self.name} cache - error writing disk entry: {e}")
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._disk_dir:
+            for root, _, files in os.walk(self._disk_dir):
+                for file_name in files:
+                    if file_name.endswith(".json"):
+                        os.remove(os.path.join(root, file_name))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.get_stats() for name, cache in _caches.items()}
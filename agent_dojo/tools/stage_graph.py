@@ -0,0 +1,81 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    depends_on: List[str] = field(default_factory=list)
+
+
+class StageGraph:
+    """
+    Runs the stages of an agent's forward() as a dependency graph.
+
+    Stages whose dependencies are satisfied run in parallel threads. Each stage receives
+    the results of the stages completed so far and its wall-clock time is recorded.
+    The caller's context (dspy.context settings, usage collectors) is copied into every thread.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._stages: Dict[str, Stage] = {}
+        self._max_workers = max_workers
+
+    def add_stage(self, name: str, func: Callable[[Dict[str, Any]], Any], depends_on: Optional[List[str]] = None) -> "StageGraph":
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' already defined")
+        self._stages[name] = Stage(name=name, func=func, depends_on=list(depends_on or []))
+        return self
+
+    def _waves(self) -> List[List[Stage]]:
+        """Group stages into waves where each wave only depends on earlier waves"""
+        for stage in self._stages.values():
+            for dependency in stage.depends_on:
+                if dependency not in self._stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+
+        waves = []
+        done = set()
+        remaining = dict(self._stages)
+        while remaining:
+            wave = [stage for stage in remaining.values() if all(d in done for d in stage.depends_on)]
+            if not wave:
+                raise ValueError(f"Cycle detected between stages: {list(remaining)}")
+            waves.append(wave)
+            for stage in wave:
+                done.add(stage.name)
+                del remaining[stage.name]
+        return waves
+
+    def _run_stage(self, stage: Stage, results: Dict[str, Any]) -> Tuple[Any, float]:
+        start = time.perf_counter()
+        result = stage.func(results)
+        return result, (time.perf_counter() - start) * 1000
+
+    def run(self) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Execute all stages and return (results by stage name, timings in ms by stage name)"""
+        results: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        total_start = time.perf_counter()
+
+        for wave in self._waves():
+            if len(wave) == 1:
+                stage = wave[0]
+                results[stage.name], timings[stage.name] = self._run_stage(stage, results)
+                continue
+
+            snapshot = dict(results)
+            with ThreadPoolExecutor(max_workers=self._max_workers or len(wave)) as executor:
+                futures = {
+                    stage.name: executor.submit(contextvars.copy_context().run, self._run_stage, stage, snapshot)
+                    for stage in wave
+                }
+                for name, future in futures.items():
+                    results[name], timings[name] = future.result()
+
+        timings["total"] = (time.perf_counter() - total_start) * 1000
+        return results, {name: round(ms, 3) for name, ms in timings.items()}
@@ -0,0 +1,206 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from agent_dojo.agents.DigitalTwinCreatorAgent import DigitalTwinCreatorAgent
+from agent_dojo.agents.PersonaImageGenerationAgent import PersonaImageGenerationAgent
+from agent_dojo.tools.file_utils import get_cache_directory
+from voice_chat.voice_chat_manager import prepare_realtime_instructions
+
+# Upper bound for the per-job concurrency requested by callers
+BULK_INGESTION_MAX_CONCURRENCY = int(os.getenv("BULK_INGESTION_MAX_CONCURRENCY", "8"))
+
+# Realtime instruction warm-ups run outside the concurrency slots; the loop only keeps weak references to tasks
+_realtime_prep_tasks = set()
+
+
+@dataclass
+class BulkRecord:
+    """One traffic record to turn into a digital twin"""
+    record_id: str
+    data: str
+    existing_digital_twin: str = ""
+    lead_id: Optional[str] = None
+
+
+def make_bulk_record(raw: Dict[str, Any]) -> BulkRecord:
+    """
+    Build a BulkRecord from a parsed row. Accepts 'data' or the 'webtraffic' column of personas.csv.
+    Records without a record_id get one derived from their content, so resubmitting the same
+    file resumes the same records.
+    """
+    data = raw.get("data") or raw.get("webtraffic") or ""
+    existing_digital_twin = raw.get("existing_digital_twin") or ""
+    record_id = raw.get("record_id") or hashlib.sha256(
+        json.dumps([data, existing_digital_twin, raw.get("lead_id")]).encode("utf-8")
+    ).hexdigest()[:16]
+    return BulkRecord(
+        record_id=str(record_id),
+        data=data,
+        existing_digital_twin=existing_digital_twin,
+        lead_id=raw.get("lead_id") or None,
+    )
+
+
+def parse_records_file(content: bytes, filename: str = "") -> List[BulkRecord]:
+    """Parse an uploaded CSV or NDJSON file into bulk records"""
+    text = content.decode("utf-8-sig")
+    if filename.lower().endswith((".ndjson", ".jsonl")) or (not filename.lower().endswith(".csv") and text.lstrip().startswith("{")):
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    return [make_bulk_record(row) for row in rows]
+
+
+def default_job_id(records: List[BulkRecord]) -> str:
+    """Job id derived from the record ids, so an interrupted upload resumes when resubmitted"""
+    digest = hashlib.sha256("\n".join(r.record_id for r in records).encode("utf-8")).hexdigest()
+    return f"bulk-{digest[:16]}"
+
+
+class BulkJobCheckpoint:
+    """Append-only NDJSON log of the records a bulk job has completed, used to resume the job"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        safe_job_id = re.sub(r"[^A-Za-z0-9_.-]", "_", job_id)
+        self.path = os.path.join(get_cache_directory("bulk_jobs"), f"{safe_job_id}.ndjson")
+        self._lock = threading.Lock()
+
+    def completed(self) -> Dict[str, Dict[str, Any]]:
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A torn last line from an interrupted write; that record is simply redone
+                    continue
+                completed[result["record_id"]] = result
+        return completed
+
+    def record(self, result: Dict[str, Any]) -> None:
+        line = json.dumps(result, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+
+
+def _schedule_realtime_instructions(lead_id: str) -> None:
+    """
+    Warm the realtime instruction cache for a stored twin without holding a concurrency slot.
+    prepare_realtime_instructions logs its own failures, which leave the record succeeded.
+    """
+    task = asyncio.create_task(prepare_realtime_instructions(lead_id))
+    _realtime_prep_tasks.add(task)
+    task.add_done_callback(_realtime_prep_tasks.discard)
+
+
+async def _process_record(index: int, record: BulkRecord, generate_images: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = {"event": "record", "index": index, "record_id": record.record_id}
+    try:
+        output = await DigitalTwinCreatorAgent.acreate(
+            record.data,
+            existing_digital_twin=record.existing_digital_twin,
+            lead_id=record.lead_id
+        )
+        if not output:
+            raise RuntimeError("Digital twin could not be stored")
+
+        lead_id = output["lead_id"]
+        insurance_prospect = output.get("insurance_prospect")
+        result.update({
+            "status": "succeeded",
+            "lead_id": lead_id,
+            "lead_classification": getattr(insurance_prospect, "lead_classification", None),
+            "execution_cost": output.get("execution_cost"),
+            "memoized": bool(output.get("memoized")),
+        })
+
+        if not output.get("memoized"):
+            if generate_images:
+                image_job = PersonaImageGenerationAgent.submit(output["digital_twin"], lead_id=lead_id)
+                result["image_job_id"] = image_job.job_id
+            _schedule_realtime_instructions(lead_id)
+    except Exception as e:
+        print(f"Bulk ingestion - record {record.record_id} failed: {e}")
+        result.update({"status": "failed", "error": str(e)})
+
+    result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def stream_bulk_creation(records: List[BulkRecord], job_id: Optional[str] = None,
+                               concurrency: int = 4, generate_images: bool = True) -> AsyncIterator[str]:
+    """
+    Create digital twins for many records with at most `concurrency` in flight,
+    yielding one NDJSON line per record as it completes.
+    Records already completed by an earlier run of the same job are skipped.
+    """
+    job_id = job_id or default_job_id(records)
+    concurrency = max(1, min(concurrency, BULK_INGESTION_MAX_CONCURRENCY))
+    checkpoint = BulkJobCheckpoint(job_id)
+    completed = checkpoint.completed()
+
+    pending = [(index, record) for index, record in enumerate(records) if record.record_id not in completed]
+    counts = {"succeeded": 0, "failed": 0, "skipped": len(records) - len(pending)}
+
+    yield json.dumps({
+        "event": "job_started",
+        "job_id": job_id,
+        "total": len(records),
+        "already_completed": counts["skipped"],
+        "concurrency": concurrency,
+    }) + "\n"
+
+    for index, record in enumerate(records):
+        if record.record_id in completed:
+            previous = completed[record.record_id]
+            yield json.dumps({
+                "event": "record",
+                "index": index,
+                "record_id": record.record_id,
+                "status": "skipped",
+                "lead_id": previous.get("lead_id"),
+            }) + "\n"
+
+    work: asyncio.Queue = asyncio.Queue()
+    for item in pending:
+        work.put_nowait(item)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index, record = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await _process_record(index, record, generate_images)
+            if result["status"] == "succeeded":
+                checkpoint.record(result)
+            await results.put(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(pending)))]
+    try:
+        for _ in range(len(pending)):
+            result = await results.get()
+            counts[result["status"]] += 1
+            yield json.dumps(result, default=str) + "\n"
+    finally:
+        # Client went away or the job finished; completed records stay checkpointed for a resume
+        for task in workers:
+            task.cancel()
+
+    yield json.dumps({"event": "job_completed", "job_id": job_id, **counts}) + "\n"
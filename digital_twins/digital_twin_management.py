@@ -2,7 +2,7 @@
 
 import asyncio
 from dataclasses import dataclass
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import os
 import sys
 
@@ -14,6 +14,7 @@ from utils.async_helper import run_async
 from storage.digital_twin_storage import ScalableDigitalTwinStorage
 from storage.digital_twin_search import DigitalTwinSearch
 from storage.persona_image_storage import PersonaImageStorage
+from storage.pagination import InvalidContinuationToken
 
 # Initialize storage instances
 digital_twin_storage = ScalableDigitalTwinStorage()
@@ -87,6 +88,7 @@ class SyntheticPersona:
     next_best_actions: str
 
     markdown: str = ""  # Optional markdown representation of the persona
+    content_hash: str = ""  # Hash of the twin version the persona was built from
 
 
 # Async wrapper functions for storage operations
@@ -111,15 +113,24 @@ async def get_persona_image(lead_id: str, size: str = "full") -> Optional[bytes]
     return await persona_image_storage.get_persona_image(lead_id, size)
 
 #Return a list of synthetic personas from database.
-async def get_synthetic_personas() -> List[SyntheticPersona]:
+async def get_synthetic_personas(limit: int = 100) -> List[SyntheticPersona]:
     """
     Returns a list of synthetic personas from Azure storage or mock data.
     """
+    personas, _ = await get_synthetic_personas_page(limit=limit)
+    return personas
+
+async def get_synthetic_personas_page(limit: int = 100, continuation_token: Optional[str] = None) -> Tuple[List[SyntheticPersona], Optional[str]]:
+    """
+    Returns one page of synthetic personas and the continuation token of the next page (None on the last page).
+    Mock data is only served for the first page when storage has nothing.
+    """
     # Try to get from Azure storage first
     try:
-        twins = await digital_twin_storage.list_digital_twins(limit=100)
+        page = await digital_twin_storage.list_digital_twins_page(limit=limit, continuation_token=continuation_token)
+        twins = page["items"]
         
-        if twins:
+        if twins or continuation_token:
             personas = []
             for twin in twins:
                 twin_meta = twin.get('metadata', {})
@@ -191,11 +202,18 @@ async def get_synthetic_personas() -> List[SyntheticPersona]:
                     markdown=""  # No markdown content fetched for performance
                 )
                 personas.append(persona)
-            return personas
+            return personas, page["continuation_token"]
+    except InvalidContinuationToken:
+        raise
     except Exception as e:
         print(f"Error fetching from Azure storage: {e}")
     
     # Fall back to mock data
+    return _get_mock_personas(), None
+
+
+def _get_mock_personas() -> List[SyntheticPersona]:
+    """Sample personas served when Azure storage is unavailable or empty"""
     import random
     classifications = ["hot", "cold", "warm"]
     mock_personas = [
@@ -327,14 +345,14 @@ async def get_synthetic_persona(id: str) -> SyntheticPersona:
     """Get a specific synthetic persona by ID"""
     # Try to get from Azure storage first
     try:
-        # Get metadata and content
-        twin_meta = await digital_twin_storage.get_digital_twin_metadata(id)
+        # Get metadata and content together (concurrently only with the flat blob layout)
+        bundle = await digital_twin_storage.get_twin_bundle(id)
+        twin_meta = bundle['metadata'] if bundle else None
         if twin_meta:
             # Check if image exists
             image_url = f"/persona_image/{id}"
             
-            # Get the markdown content
-            markdown_content = await digital_twin_storage.get_digital_twin(id) or ""
+            markdown_content = bundle['markdown']
             
             # Extract data from insurance prospect structure in metadata
             personal_info = twin_meta.get('personal_information', {})
@@ -400,13 +418,14 @@ async def get_synthetic_persona(id: str) -> SyntheticPersona:
                 behaioral_signals='Unknown',
                 interaction_history='Unknown',
                 next_best_actions='Unknown',
-                markdown=markdown_content
+                markdown=markdown_content,
+                content_hash=twin_meta.get('content_hash', '')
             )
     except Exception as e:
         print(f"Error fetching from Azure storage: {e}")
     
-    # Fall back to mock data search
-    personas = await get_synthetic_personas()
+    # Fall back to mock data search; storage was already consulted above
+    personas = _get_mock_personas()
     for persona in personas:
         if persona.lead_id == id:
             return persona
@@ -1,35 +1,45 @@
 import uuid
 import dspy
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Response, WebSocket
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Response, WebSocket, UploadFile, File, Form, Header
 from fastapi.responses import FileResponse
 from agent_dojo.tools.file_utils import get_persona_photographs_directory
 from fastapi.middleware.cors import CORSMiddleware
 from agent_dojo.agents.DigitalTwinCreatorAgent import DigitalTwinCreatorAgent
 from agent_dojo.agent_management import get_agents_list, get_agent
+from agent_dojo.tools.program_registry import program_registry
+from agent_dojo.tools.response_cache import get_cache_stats
 from agent_dojo.agents.PersonaImageGenerationAgent import PersonaImageGenerationAgent
 from agent_dojo.agents.SyntheticPersonChatAgent import SyntheticPersonChatAgent
-from agent_dojo.agents.SyntheticPersonChatAgent.SyntheticPersonChatAgent import get_instructions_for_persona
-from agent_dojo.agents.SurveyResponseAgent import SurveyResponseAgent
+from agent_dojo.agents import SurveyResponseAgent
 from storage.persona_image_storage import PersonaImageStorage
 from storage.digital_twin_storage import ScalableDigitalTwinStorage
 from storage.digital_twin_search import DigitalTwinSearch
 from storage.qa_session_storage import QASessionStorage
-from voice_chat.voice_chat_manager import create_realtime_session
+from voice_chat.voice_chat_manager import create_realtime_session, get_realtime_instructions, prepare_realtime_instructions
+from utils.async_helper import run_blocking, set_main_loop, shutdown_agent_executor
+from storage.azure_config import azure_config
+from storage.twin_cache import twin_cache
+from storage.pagination import InvalidContinuationToken
+from storage.backends import STORAGE_BACKEND, get_blob_store
 from services.qa_service import QAService
+from services.qa_session_events import (
+    SessionSubscription, publish_session_event, start_session_event_relay, stop_session_event_relay
+)
+from digital_twins.bulk_ingestion import make_bulk_record, parse_records_file, stream_bulk_creation
 from models.qa_models import (
     QuestionSubmitRequest, QuestionSubmitResponse,
     SessionListRequest, SessionListResponse,
     QuestionSession, ResponsesListResponse,
     CancelSessionResponse, RegenerateSummaryRequest,
-    SessionSummary, SessionStatus, ResponseUpdateNotification
+    SessionSummary, SessionStatus, ResponseUpdateNotification, ProspectResponse
 )
 import json
 import os
 import asyncio
-from flask import  jsonify, request, abort
 from datetime import datetime
 import secrets
 from typing import Literal
+from contextlib import asynccontextmanager
 
 # Initialize storage instances
 persona_image_storage = PersonaImageStorage()
@@ -40,7 +50,22 @@ qa_service = QAService()
 
 
 
-app = FastAPI(title="Mirai LMS API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Storage calls made from agent threads are scheduled on this loop, which owns the async Azure clients
+    set_main_loop(asyncio.get_running_loop())
+    await azure_config.open_async_clients()
+    start_session_event_relay()
+    yield
+    await stop_session_event_relay()
+    # Let in-flight agent calls finish before the worker exits; off the loop, as they may still await storage on it
+    await asyncio.to_thread(shutdown_agent_executor, True)
+    PersonaImageGenerationAgent.image_generation_queue.shutdown(wait=False)
+    await azure_config.close_async_clients()
+    set_main_loop(None)
+
+
+app = FastAPI(title="Mirai LMS API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +73,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Continuation-Token"],
 )
 
 from pydantic import BaseModel
@@ -58,12 +84,25 @@ class QuestionPayload(BaseModel):
     question: str
     persona: str = None
     response_language: Literal["en-US", "ja"] = "en-US"
+    bypass_cache: bool = False
 
 class DigitalTwinInputPayload(BaseModel):
     data: str
     existing_digital_twin: str = ""
     lead_id: str = None
 
+class BulkDigitalTwinRecord(BaseModel):
+    data: str
+    existing_digital_twin: str = ""
+    lead_id: str = None
+    record_id: str = None
+
+class BulkDigitalTwinPayload(BaseModel):
+    records: List[BulkDigitalTwinRecord]
+    job_id: str = None
+    concurrency: int = 4
+    generate_images: bool = True
+
 class SearchPayload(BaseModel):
     query: str
     filters: dict = None
@@ -111,16 +150,51 @@ def run_digital_twin_agent(data, existing_digital_twin=""):
 
 #API to run  DigitalTwinCreatorAgent
 @app.post("/create_digital_twin_agent")
-def create_digital_twin_agent(payload: DigitalTwinInputPayload):
+def create_digital_twin_agent(payload: DigitalTwinInputPayload, background_tasks: BackgroundTasks):
    output = DigitalTwinCreatorAgent.create(payload.data, existing_digital_twin=payload.existing_digital_twin)
 
+   # A memoized twin already has its image and voice instructions from the original run
+   if output.get("memoized"):
+      return output
+
    lead_id = output["lead_id"]
    digital_twin = output["digital_twin"]
-   PersonaImageGenerationAgent.run(digital_twin, lead_id=lead_id)
+   image_job = PersonaImageGenerationAgent.submit(digital_twin, lead_id=lead_id)
+   output["image_job"] = {"job_id": image_job.job_id, "status": image_job.status.value}
+
+   # Warm the realtime voice instructions for this twin version
+   background_tasks.add_task(prepare_realtime_instructions, lead_id)
    
    return output
 
 
+#API to create many digital twins; streams one NDJSON result line per record
+@app.post("/bulk_create_digital_twins")
+async def bulk_create_digital_twins(payload: BulkDigitalTwinPayload):
+    records = [make_bulk_record(record.model_dump()) for record in payload.records]
+    return StreamingResponse(
+        stream_bulk_creation(records, job_id=payload.job_id, concurrency=payload.concurrency, generate_images=payload.generate_images),
+        media_type="application/x-ndjson"
+    )
+
+#API to create digital twins from an uploaded CSV or NDJSON file of traffic records
+@app.post("/bulk_create_digital_twins/upload")
+async def bulk_create_digital_twins_upload(
+    file: UploadFile = File(...),
+    job_id: Optional[str] = Form(None),
+    concurrency: int = Form(4),
+    generate_images: bool = Form(True)
+):
+    try:
+        records = parse_records_file(await file.read(), file.filename or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse records file: {e}")
+    return StreamingResponse(
+        stream_bulk_creation(records, job_id=job_id, concurrency=concurrency, generate_images=generate_images),
+        media_type="application/x-ndjson"
+    )
+
+
 #API to run  DigitalTwinCreatorAgent
 @app.post("/test_digital_twin_agent")
 def test_digital_twin_agent(payload: DigitalTwinInputPayload):
@@ -136,11 +210,29 @@ async def agent_list():
 async def agent(id: str):
     return get_agent(id)
 
+#API to return runtime metrics of the agents (optimized program loads, cache hits)
+@app.get("/agent_metrics")
+async def agent_metrics():
+    return {
+        "program_registry": program_registry.get_stats(),
+        "response_caches": get_cache_stats(),
+        "twin_cache": twin_cache.get_stats(),
+        "image_generation_queue": PersonaImageGenerationAgent.image_generation_queue.get_stats()
+    }
+
 #API to return list of SP
 @app.get("/get_synthetic_personas")
-async def get_synthetic_personas_route():
-    from digital_twins.digital_twin_management import get_synthetic_personas
-    return await get_synthetic_personas()
+async def get_synthetic_personas_route(response: Response, limit: int = 100, continuation_token: Optional[str] = None):
+    """One page of personas; the token for the next page is returned in the X-Continuation-Token header"""
+    from digital_twins.digital_twin_management import get_synthetic_personas_page
+    limit = max(1, min(limit, 500))
+    try:
+        personas, next_token = await get_synthetic_personas_page(limit=limit, continuation_token=continuation_token)
+    except InvalidContinuationToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_token:
+        response.headers["X-Continuation-Token"] = next_token
+    return personas
 
 #API to return SP
 @app.get("/get_synthetic_persona/{id}")
@@ -148,6 +240,22 @@ async def get_synthetic_persona_route(id: str):
     from digital_twins.digital_twin_management import get_synthetic_persona
     return await get_synthetic_persona(id)
 
+#API to return status of a persona image generation job
+@app.get("/image_generation_jobs/{job_id}")
+async def get_image_generation_job(job_id: str):
+    job = PersonaImageGenerationAgent.image_generation_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Image generation job not found")
+    return job.as_dict()
+
+#API to return the latest image generation job of a lead
+@app.get("/image_generation_jobs/lead/{lead_id}")
+async def get_image_generation_job_for_lead(lead_id: str):
+    job = PersonaImageGenerationAgent.image_generation_queue.get_latest_job_for_key(lead_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No image generation job for this lead")
+    return job.as_dict()
+
 @app.post("/generate_persona_image")
 def generate_persona_image(persona: str, lead_id: str = None):
    return PersonaImageGenerationAgent.run(persona, lead_id=lead_id)
@@ -175,10 +283,11 @@ def get_or_create_history(session_id: str | None) -> tuple[str, dspy.History]:
 @app.post("/chat_with_synthetic_persona/{lead_id}")
 async def chat_with_synthetic_persona(lead_id: str, payload: QuestionPayload, session_id: str | None = None):
     session_id, history = get_or_create_history(session_id)
-    persona = await digital_twin_storage.get_digital_twin(lead_id)
+    bundle = await digital_twin_storage.get_twin_bundle(lead_id)
+    persona = bundle['markdown'] if bundle else None
     if not persona:
         persona = PERSONA
-    answer = SyntheticPersonChatAgent.run(payload.question, history, persona)
+    answer = await SyntheticPersonChatAgent.arun(payload.question, history, persona, use_cache=not payload.bypass_cache)
     history.messages.append({"question": payload.question, "answer": answer})
     return {
         "answer": answer,
@@ -186,13 +295,53 @@ async def chat_with_synthetic_persona(lead_id: str, payload: QuestionPayload, se
         "messages": history.messages
     }
 
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@app.post("/chat_with_synthetic_persona/{lead_id}/stream")
+async def stream_chat_with_synthetic_persona(lead_id: str, payload: QuestionPayload, session_id: str | None = None):
+    """
+    Server-Sent Events variant of /chat_with_synthetic_persona. Emits 'token' events as the answer
+    is generated and a final 'done' event with the session id and LLM usage.
+    The exchange is added to the session history only when the answer is complete.
+    """
+    session_id, history = get_or_create_history(session_id)
+    bundle = await digital_twin_storage.get_twin_bundle(lead_id)
+    persona = bundle['markdown'] if bundle else None
+    if not persona:
+        persona = PERSONA
+
+    async def event_stream():
+        try:
+            async for event in SyntheticPersonChatAgent.astream(payload.question, history, persona, use_cache=not payload.bypass_cache):
+                if event["type"] == "token":
+                    yield _sse_event("token", {"text": event["text"]})
+                    continue
+                history.messages.append({"question": payload.question, "answer": event["answer"]})
+                yield _sse_event("done", {
+                    "answer": event["answer"],
+                    "session_id": session_id,
+                    "usage": event["usage"],
+                    "cached": event["cached"],
+                })
+        except Exception as e:
+            print(f"Error streaming chat for lead_id {lead_id}: {e}")
+            yield _sse_event("error", {"detail": str(e), "session_id": session_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/test_synthetic_person_chat_agent")
 def test_synthetic_person_chat_agent(payload: QuestionPayload, session_id: str | None = None):
     session_id, history = get_or_create_history(session_id)
     answer = SyntheticPersonChatAgent.run(
         question=payload.question,
         history=history,
-        persona=payload.persona
+        persona=payload.persona,
+        use_cache=not payload.bypass_cache
     )
     history.messages.append({"question": payload.question, "answer": answer})
     return {
@@ -279,6 +428,20 @@ async def get_persona_image_full(image_id: str):
         raise HTTPException(status_code=404, detail="Image not found")
     return FileResponse(image_path)
 
+# Containers whose blobs the local backend hands out URLs for; twin markdown is never served raw
+LOCAL_BLOB_PUBLIC_CONTAINERS = ("persona-images", "qa-images")
+
+# API to serve image blobs when STORAGE_BACKEND=local (the URLs Blob Storage would otherwise serve)
+@app.get("/local_blobs/{container}/{name:path}")
+async def get_local_blob(container: str, name: str):
+    if STORAGE_BACKEND != "local" or container not in LOCAL_BLOB_PUBLIC_CONTAINERS:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    blob = await asyncio.to_thread(get_blob_store(container).read_with_content_type, name)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    data, _, content_type = blob
+    return Response(content=data, media_type=content_type or "application/octet-stream")
+
 PERSONA="""Persona Summary
 - User U005 is likely a new parent (inferred) living in Sydney, Australia, actively seeking term life insurance to protect their spouse and child.
 - They are exploring coverage options focused on family needs, including education planning, and have demonstrated clear purchase intent by starting a quote.
@@ -341,7 +504,7 @@ Engagement & Opportunities
 async def run_survey(payload: SurveyPayload):
     """Run a survey across multiple digital twin personas"""
     try:
-        result = SurveyResponseAgent.run(
+        result = await SurveyResponseAgent.arun(
             survey_input=payload.survey_input,
             is_image=payload.is_image,
             max_personas=payload.max_personas,
@@ -365,7 +528,7 @@ async def run_image_survey(payload: ImageSurveyPayload):
             tmp_path = tmp_file.name
         
         # Process image survey
-        result = SurveyResponseAgent.process_image_survey(
+        result = await SurveyResponseAgent.aprocess_image_survey(
             image_path=tmp_path,
             initial_questions=payload.initial_questions
         )
@@ -464,6 +627,7 @@ async def cancel_qa_session(session_id: str):
     success = qa_session_storage.cancel_session(session_id)
     if not success:
         raise HTTPException(status_code=400, detail="Session cannot be cancelled or not found")
+    await publish_session_event(session_id, "session_failed", error="Session cancelled by user")
 
     return CancelSessionResponse(
         session_id=session_id,
@@ -497,50 +661,63 @@ async def regenerate_session_summary(session_id: str, request: RegenerateSummary
 
     return summary
 
+# Seconds between SSE keep-alive comments while a session stream waits for events
+QA_STREAM_KEEPALIVE_SECONDS = float(os.getenv("QA_STREAM_KEEPALIVE_SECONDS", "15"))
+
 @app.get("/api/v1/qa/sessions/{session_id}/stream")
-async def stream_session_updates(session_id: str):
-    """Server-Sent Events endpoint for real-time session updates"""
-    async def event_generator():
-        last_check = datetime.utcnow()
+async def stream_session_updates(session_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events endpoint for real-time session updates.
+    Events are pushed by QAService as they happen. The session is read once per connection; a client
+    reconnecting with Last-Event-ID (the answered_at of the last response it saw) first gets the
+    responses it missed.
+    """
+    def format_event(notification: ResponseUpdateNotification, event_id: Optional[str] = None) -> str:
+        id_line = f"id: {event_id}\n" if event_id else ""
+        return f"{id_line}event: {notification.event_type}\ndata: {notification.model_dump_json()}\n\n"
+
+    def response_key(response: ProspectResponse):
+        return (response.persona.lead_id, response.answered_at.isoformat())
 
-        while True:
-            session = qa_session_storage.get_session(session_id)
+    async def event_generator():
+        # Subscribe before reading the session so nothing published in between is lost
+        with SessionSubscription(session_id) as subscription:
+            session = await asyncio.to_thread(qa_session_storage.get_session, session_id)
             if not session:
                 yield f"event: error\ndata: Session not found\n\n"
-                break
-
-            # Check for new responses
-            new_responses = qa_session_storage.get_responses(session_id, last_check)
+                return
+
+            progress = {"responded": session.total_responded, "total": session.total_expected}
+            sent = set()
+
+            if last_event_id:
+                try:
+                    since = datetime.fromisoformat(last_event_id)
+                except ValueError:
+                    since = None
+                missed = [r for r in session.responses if since is None or r.answered_at > since]
+                for response in missed:
+                    sent.add(response_key(response))
+                    notification = ResponseUpdateNotification(
+                        event_type="response_received",
+                        session_id=session_id,
+                        timestamp=datetime.utcnow(),
+                        new_response=response,
+                        progress=progress
+                    )
+                    yield format_event(notification, response.answered_at.isoformat())
 
-            for response in new_responses:
-                notification = ResponseUpdateNotification(
-                    event_type="response_received",
-                    session_id=session_id,
-                    timestamp=datetime.utcnow(),
-                    new_response=response,
-                    progress={
-                        "responded": session.total_responded,
-                        "total": session.total_expected
-                    }
-                )
-                yield f"event: response_received\ndata: {notification.model_dump_json()}\n\n"
-
-            # Check if session completed
             if session.status == SessionStatus.COMPLETED:
                 notification = ResponseUpdateNotification(
                     event_type="session_completed",
                     session_id=session_id,
                     timestamp=datetime.utcnow(),
                     summary=session.summary,
-                    progress={
-                        "responded": session.total_responded,
-                        "total": session.total_expected
-                    }
+                    progress=progress
                 )
-                yield f"event: session_completed\ndata: {notification.model_dump_json()}\n\n"
-                break
+                yield format_event(notification)
+                return
 
-            # Check if session failed
             if session.status == SessionStatus.FAILED:
                 notification = ResponseUpdateNotification(
                     event_type="session_failed",
@@ -548,11 +725,50 @@ async def stream_session_updates(session_id: str):
                     timestamp=datetime.utcnow(),
                     data={"error": session.error_message}
                 )
-                yield f"event: session_failed\ndata: {notification.model_dump_json()}\n\n"
-                break
-
-            last_check = datetime.utcnow()
-            await asyncio.sleep(2)  # Poll every 2 seconds
+                yield format_event(notification)
+                return
+
+            while True:
+                event = await subscription.get(QA_STREAM_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                event_type = event["event_type"]
+                if event_type == "response_received":
+                    response = ProspectResponse(**event["response"])
+                    if response_key(response) in sent:
+                        continue
+                    sent.add(response_key(response))
+                    notification = ResponseUpdateNotification(
+                        event_type=event_type,
+                        session_id=session_id,
+                        timestamp=datetime.fromisoformat(event["timestamp"]),
+                        new_response=response,
+                        progress=event.get("progress")
+                    )
+                    yield format_event(notification, response.answered_at.isoformat())
+
+                elif event_type == "session_completed":
+                    notification = ResponseUpdateNotification(
+                        event_type=event_type,
+                        session_id=session_id,
+                        timestamp=datetime.fromisoformat(event["timestamp"]),
+                        summary=SessionSummary(**event["summary"]) if event.get("summary") else None,
+                        progress=event.get("progress")
+                    )
+                    yield format_event(notification)
+                    break
+
+                elif event_type == "session_failed":
+                    notification = ResponseUpdateNotification(
+                        event_type=event_type,
+                        session_id=session_id,
+                        timestamp=datetime.fromisoformat(event["timestamp"]),
+                        data={"error": event.get("error")}
+                    )
+                    yield format_event(notification)
+                    break
 
     return StreamingResponse(
         event_generator(),
@@ -585,8 +801,8 @@ async def issue_session(payload: RealtimeSessionRequest):
         from digital_twins.digital_twin_management import get_synthetic_persona
         persona_data = await get_synthetic_persona(payload.persona_id)
         if persona_data:
-            persona = persona_data.persona_summary
-            created = create_realtime_session(instructions=get_instructions_for_persona(persona,payload.language), markdown=persona_data.markdown, gender=persona_data.gender)
+            instructions = await get_realtime_instructions(persona_data, payload.language)
+            created = await run_blocking(create_realtime_session, instructions=instructions, markdown=persona_data.markdown, gender=persona_data.gender)
             return RealtimeSessionResponse(
                 session_id=created.id,
                 client_secret=created.client_secret,
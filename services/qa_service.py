@@ -6,8 +6,11 @@ from models.qa_models import (
     ProspectResponse, SessionSummary, PersonaBase, LeadClassification
 )
 from storage.qa_session_storage import QASessionStorage
+from services.qa_session_buffer import SessionStateBuffer
+from services.qa_session_events import publish_session_event
 from storage.digital_twin_storage import ScalableDigitalTwinStorage
 from agent_dojo.agents.SyntheticPersonChatAgent import SyntheticPersonChatAgent
+from agent_dojo.tools.lmtools import TrackedLM
 import json
 import dspy
 
@@ -16,7 +19,7 @@ class QAService:
     def __init__(self):
         self.session_storage = QASessionStorage()
         self.digital_twin_storage = ScalableDigitalTwinStorage()
-        self.llm = dspy.LM('azure/gpt-4.1-mini')
+        self.llm = TrackedLM('azure/gpt-4.1-mini')
 
     async def submit_question(self, request: QuestionSubmitRequest) -> QuestionSubmitResponse:
         """Submit a question to selected prospects"""
@@ -59,12 +62,17 @@ class QAService:
         """Get persona information for prospect IDs"""
         prospects = []
 
-        for lead_id in prospect_ids:
-            try:
-                # Get digital twin data
-                twin_data = await self.digital_twin_storage.get_digital_twin_with_metadata(lead_id)
+        try:
+            # One batched metadata lookup instead of a round trip per prospect
+            twins = await self.digital_twin_storage.get_many(prospect_ids, include_markdown=False)
+        except Exception as e:
+            print(f"Error getting prospects: {e}")
+            twins = [{"lead_id": lead_id, "metadata": None, "found": False} for lead_id in prospect_ids]
 
-                if twin_data and isinstance(twin_data, dict):
+        for twin_data in twins:
+            lead_id = twin_data['lead_id']
+            try:
+                if twin_data['metadata']:
                     # Parse persona from digital twin metadata
                     metadata = twin_data.get('metadata', {})
                     personal_info = metadata.get('personal_information', {})
@@ -125,13 +133,15 @@ class QAService:
 
     async def _process_session_async(self, session_id: str):
         """Process Q&A session asynchronously"""
-        try:
-            session = self.session_storage.get_session(session_id)
-            if not session:
-                return
+        session = self.session_storage.get_session(session_id)
+        if not session:
+            return
 
+        # Status, responses and summary are buffered and written coalesced rather than one rewrite each
+        buffer = SessionStateBuffer(self.session_storage, session_id, session.total_expected, session.total_responded)
+        try:
             # Update status to in_progress
-            self.session_storage.update_session_status(session_id, SessionStatus.IN_PROGRESS)
+            await buffer.set_status(SessionStatus.IN_PROGRESS)
 
             # Process each prospect
             tasks = []
@@ -140,7 +150,8 @@ class QAService:
                     session_id,
                     prospect,
                     session.question,
-                    session.image_url
+                    session.image_url,
+                    buffer
                 )
                 tasks.append(task)
 
@@ -150,40 +161,56 @@ class QAService:
             # Filter out exceptions
             valid_responses = [r for r in responses if isinstance(r, ProspectResponse)]
 
+            # Write the remaining responses; a cancelled session gets no summary and no further events
+            await buffer.flush()
+            if buffer.cancelled:
+                return
+
             # Generate summary if we have responses
+            summary = None
             if valid_responses:
                 summary = await self._generate_summary(session_id, valid_responses)
-                self.session_storage.add_summary(session_id, summary)
+                buffer.set_summary(summary)
 
-            # Update final status
+            # Update final status; the summary is written with it
             if len(valid_responses) == session.total_expected:
-                self.session_storage.update_session_status(session_id, SessionStatus.COMPLETED)
+                await buffer.set_status(SessionStatus.COMPLETED)
             else:
-                self.session_storage.update_session_status(
-                    session_id,
+                await buffer.set_status(
                     SessionStatus.COMPLETED,
                     f"Completed with {len(valid_responses)}/{session.total_expected} responses"
                 )
 
-        except Exception as e:
-            print(f"Error processing session {session_id}: {e}")
-            self.session_storage.update_session_status(
+            # Published once the final state is written, so a client that reconnects finds it stored
+            if buffer.cancelled:
+                return
+            await publish_session_event(
                 session_id,
-                SessionStatus.FAILED,
-                str(e)
+                "session_completed",
+                summary=summary.model_dump(mode='json') if summary else None,
+                progress=buffer.progress()
             )
 
+        except Exception as e:
+            print(f"Error processing session {session_id}: {e}")
+            await buffer.set_status(SessionStatus.FAILED, str(e))
+            if not buffer.cancelled:
+                await publish_session_event(session_id, "session_failed", error=str(e))
+        finally:
+            await buffer.close()
+
     async def _get_prospect_response(
         self,
         session_id: str,
         prospect: PersonaBase,
         question: str,
-        image_url: Optional[str] = None
+        image_url: Optional[str] = None,
+        buffer: Optional[SessionStateBuffer] = None
     ) -> ProspectResponse:
         """Get response from a single prospect"""
         try:
             # Get digital twin data
-            twin_data = await self.digital_twin_storage.get_digital_twin_with_metadata(prospect.lead_id)
+            twin_data = await self.digital_twin_storage.get_twin_bundle(prospect.lead_id)
 
             if not twin_data:
                 # Create minimal response if no twin data
@@ -204,7 +231,7 @@ class QAService:
 
                 # Get response from agent (with empty history for single Q&A)
                 history = dspy.History(messages=[])
-                answer = SyntheticPersonChatAgent.run(full_question, history, persona_str)
+                answer = await SyntheticPersonChatAgent.arun(full_question, history, persona_str)
                 confidence = 0.85  # Default confidence for AI responses
 
             # Create response object
@@ -216,7 +243,11 @@ class QAService:
             )
 
             # Store response
-            self.session_storage.add_response(session_id, response)
+            # The buffer publishes response_received once the response is written
+            if buffer:
+                await buffer.add_response(response)
+            else:
+                self.session_storage.add_response(session_id, response)
 
             return response
 
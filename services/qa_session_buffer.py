@@ -0,0 +1,114 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from models.qa_models import ProspectResponse, SessionStatus, SessionSummary
+from services.qa_session_events import publish_session_event
+from storage.qa_session_storage import QASessionStorage
+
+# Longest a buffered response waits before it is written
+QA_SESSION_FLUSH_INTERVAL_SECONDS = float(os.getenv("QA_SESSION_FLUSH_INTERVAL_SECONDS", "2.0"))
+# Flush early once this many responses are pending
+QA_SESSION_FLUSH_MAX_RESPONSES = int(os.getenv("QA_SESSION_FLUSH_MAX_RESPONSES", "100"))
+
+
+class SessionStateBuffer:
+    """
+    Holds the mutations of one QA session while QAService processes it and writes them coalesced:
+    status transitions flush immediately, responses at most every QA_SESSION_FLUSH_INTERVAL_SECONDS,
+    and the summary together with the next transition. Each flush writes the pending response records
+    plus one ETag-conditional session replace, instead of a patch per response and per field.
+
+    response_received events are published after the flush that stores the response, so a client that
+    reconnects and reads the session never misses one. Once a flush finds the session failed by another
+    writer (cancelled) or deleted, cancelled is set and no further events are published.
+    """
+
+    def __init__(self, session_storage: QASessionStorage, session_id: str, total_expected: int,
+                 total_responded: int = 0, flush_interval: float = QA_SESSION_FLUSH_INTERVAL_SECONDS):
+        self.session_storage = session_storage
+        self.session_id = session_id
+        self.total_expected = total_expected
+        # Responses recorded so far, including ones not flushed yet
+        self.total_responded = total_responded
+        # Responses written to the store, reported as progress in response events
+        self.persisted_responded = total_responded
+        self.cancelled = False
+        self.flush_interval = flush_interval
+        self.flush_count = 0
+        self._fields: Dict[str, Any] = {}
+        self._records: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def add_response(self, response: ProspectResponse):
+        self._records.append(self.session_storage.make_response_record(self.session_id, response))
+        self.total_responded += 1
+        self._fields["updated_at"] = datetime.utcnow().isoformat()
+        if len(self._records) >= QA_SESSION_FLUSH_MAX_RESPONSES:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    def set_summary(self, summary: SessionSummary):
+        self._fields["summary"] = summary.model_dump(mode='json')
+        self._fields["updated_at"] = datetime.utcnow().isoformat()
+
+    async def set_status(self, status: SessionStatus, error_message: Optional[str] = None):
+        """Record a status transition and flush it, along with everything pending"""
+        now = datetime.utcnow().isoformat()
+        self._fields.update({"status": status.value, "updated_at": now})
+        if status == SessionStatus.COMPLETED:
+            self._fields["completed_at"] = now
+        if error_message:
+            self._fields["error_message"] = error_message
+        await self.flush()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._fields and not self._records:
+                return
+            fields, records = self._fields, self._records
+            self._fields, self._records = {}, []
+            try:
+                written = await asyncio.to_thread(
+                    self.session_storage.apply_updates, self.session_id, fields, records, len(records)
+                )
+                self.flush_count += 1
+            except Exception as e:
+                # Put the mutations back for the next flush; newer field values win
+                print(f"Error flushing session {self.session_id}: {e}")
+                self._fields = {**fields, **self._fields}
+                self._records = records + self._records
+                return
+
+            if written is None or (written.get("status") == SessionStatus.FAILED.value
+                                   and fields.get("status") != SessionStatus.FAILED.value):
+                self.cancelled = True
+            if self.cancelled:
+                return
+
+            for record in records:
+                self.persisted_responded += 1
+                await publish_session_event(
+                    self.session_id,
+                    "response_received",
+                    response={k: v for k, v in record.items() if k != "id"},
+                    progress={"responded": self.persisted_responded, "total": self.total_expected}
+                )
+
+    def progress(self) -> Dict[str, int]:
+        return {"responded": self.total_responded, "total": self.total_expected}
+
+    async def close(self):
+        """Cancel the pending timer and write whatever is left"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
@@ -0,0 +1,107 @@
+"""
+Push notifications for QA sessions. QAService publishes response and completion events; SSE
+streams subscribe to them instead of polling the session store.
+
+Events go through the in-process EventBus. With QA_SESSION_EVENTS_REDIS=true they are published on
+Redis instead and every worker relays the channel into its own EventBus, so a client connected to any
+worker sees the events of sessions processed by another.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from agent_dojo.event_system import event_bus
+from storage.azure_config import QA_SESSION_EVENTS_REDIS, azure_config
+
+EVENT_PREFIX = "qa_session:"
+
+_relay_task: Optional[asyncio.Task] = None
+
+
+def _event_name(session_id: str) -> str:
+    return f"{EVENT_PREFIX}{session_id}"
+
+
+async def publish_session_event(session_id: str, event_type: str, **data: Any) -> None:
+    """Publish an event (response_received, session_completed, session_failed) with JSON-serializable data"""
+    payload = {
+        "event_type": event_type,
+        "session_id": session_id,
+        "timestamp": datetime.utcnow().isoformat(),
+        **data
+    }
+    redis_client = azure_config.get_async_redis_client() if QA_SESSION_EVENTS_REDIS else None
+    if redis_client is not None:
+        try:
+            # The relay of every worker, this one included, hands it to the local EventBus
+            await redis_client.publish(_event_name(session_id), json.dumps(payload))
+            return
+        except Exception as e:
+            print(f"Error publishing session event to Redis, delivering locally only: {e}")
+    await event_bus.emit(_event_name(session_id), payload)
+
+
+class SessionSubscription:
+    """Queue of one session's events for a single SSE client; use as a context manager"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+
+    def _handler(self, payload: Dict[str, Any]) -> None:
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, payload)
+
+    def __enter__(self) -> "SessionSubscription":
+        event_bus.on(_event_name(self.session_id), self._handler)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event_bus.off(_event_name(self.session_id), self._handler)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next event, or None if none arrived within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+async def _relay_redis_events() -> None:
+    while True:
+        redis_client = azure_config.get_async_redis_client()
+        if redis_client is None:
+            return
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.psubscribe(f"{EVENT_PREFIX}*")
+            async for message in pubsub.listen():
+                if message.get("type") != "pmessage":
+                    continue
+                await event_bus.emit(message["channel"], json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"QA session event relay lost its Redis connection, reconnecting: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+def start_session_event_relay() -> None:
+    """Start relaying Redis session events into the local EventBus; a no-op without QA_SESSION_EVENTS_REDIS"""
+    global _relay_task
+    if QA_SESSION_EVENTS_REDIS and azure_config.get_async_redis_client() is not None and _relay_task is None:
+        _relay_task = asyncio.create_task(_relay_redis_events())
+
+
+async def stop_session_event_relay() -> None:
+    global _relay_task
+    if _relay_task is not None:
+        _relay_task.cancel()
+        try:
+            await _relay_task
+        except asyncio.CancelledError:
+            pass
+        _relay_task = None
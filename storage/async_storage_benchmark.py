@@ -0,0 +1,83 @@
+"""
+Benchmark concurrent digital twin reads against a local fake blob container.
+
+Each fake download waits for a fixed latency. With the async clients, N concurrent reads should
+finish in roughly one latency instead of N of them.
+
+Usage: python -m storage.async_storage_benchmark --reads 50 --latency-ms 100
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from storage.azure_config import azure_config
+from storage.digital_twin_storage import ScalableDigitalTwinStorage
+
+
+class _FakeDownloader:
+    def __init__(self, content: bytes):
+        self._content = content
+        self.properties = SimpleNamespace(metadata={})
+
+    async def readall(self) -> bytes:
+        return self._content
+
+
+class _FakeBlobClient:
+    def __init__(self, container, name: str):
+        self._container = container
+        self._name = name
+
+    async def download_blob(self):
+        await asyncio.sleep(self._container.latency_seconds)
+        if self._name not in self._container.blobs:
+            raise ResourceNotFoundError(f"Blob {self._name} not found")
+        return _FakeDownloader(self._container.blobs[self._name])
+
+
+class FakeBlobContainer:
+    """In-memory stand-in for an async ContainerClient with a fixed network latency"""
+
+    def __init__(self, latency_seconds: float):
+        self.latency_seconds = latency_seconds
+        self.blobs = {}
+
+    def get_blob_client(self, name: str):
+        return _FakeBlobClient(self, name)
+
+
+async def run_benchmark(reads: int, latency_ms: float):
+    container = FakeBlobContainer(latency_ms / 1000)
+    for i in range(reads):
+        container.blobs[f"lead-{i}.md"] = f"# Twin {i}".encode("utf-8")
+
+    async def get_fake_container(container_name: str):
+        return container
+
+    azure_config.get_async_blob_container_client = get_fake_container
+    try:
+        storage = ScalableDigitalTwinStorage()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(storage.get_digital_twin(f"lead-{i}") for i in range(reads)))
+        elapsed = time.perf_counter() - start
+    finally:
+        # The metadata lookups still open the real async clients and their connection pool
+        del azure_config.get_async_blob_container_client
+        await azure_config.close_async_clients()
+
+    serial_estimate = reads * latency_ms / 1000
+    print(f"{reads} concurrent reads with {latency_ms}ms latency took {elapsed:.3f}s "
+          f"(serial would take ~{serial_estimate:.3f}s, overlap x{serial_estimate / elapsed:.1f})")
+    assert all(results), "Every read should return content"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent async storage reads against a fake container")
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.reads, args.latency_ms))
@@ -0,0 +1,401 @@
+"""
+Azure implementation of the storage backends: Blob Storage through the shared async clients
+of azure_config, and Cosmos DB for twin metadata and QA sessions.
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from storage.azure_config import azure_config
+from storage.backends import BlobStore, QASessionStore, TwinMetadataStore
+from storage.pagination import query_page
+from storage.query_builder import build_query, select_clause
+
+# Fall back to a cross-partition id query for twins saved under the old month partitions.
+# Disable once storage/migrate_twin_partitions.py has been run.
+TWIN_METADATA_LEGACY_LOOKUP = os.getenv("TWIN_METADATA_LEGACY_LOOKUP", "true").lower() == "true"
+
+# Ids per ARRAY_CONTAINS metadata query in get_many()
+GET_MANY_QUERY_BATCH_SIZE = int(os.getenv("GET_MANY_QUERY_BATCH_SIZE", "100"))
+
+
+class AzureBlobStore(BlobStore):
+    def __init__(self, container_name: str):
+        self.container_name = container_name
+
+    async def _get_container(self):
+        return await azure_config.get_async_blob_container_client(self.container_name)
+
+    async def available(self) -> bool:
+        return await self._get_container() is not None
+
+    async def upload(self, name: str, data: bytes, metadata: Optional[Dict[str, str]] = None,
+                     content_type: Optional[str] = None) -> Optional[str]:
+        container = await self._get_container()
+        if not container:
+            return None
+        blob_client = container.get_blob_client(name)
+        await blob_client.upload_blob(
+            data,
+            overwrite=True,
+            metadata=metadata,
+            content_settings=ContentSettings(content_type=content_type) if content_type else None
+        )
+        return blob_client.url
+
+    async def download(self, name: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        container = await self._get_container()
+        if not container:
+            return None
+        try:
+            downloader = await container.get_blob_client(name).download_blob()
+            return await downloader.readall(), dict(downloader.properties.metadata or {})
+        except ResourceNotFoundError:
+            return None
+
+    async def delete(self, name: str) -> bool:
+        container = await self._get_container()
+        if not container:
+            return False
+        try:
+            await container.get_blob_client(name).delete_blob()
+            return True
+        except ResourceNotFoundError:
+            return False
+
+    async def exists(self, name: str) -> bool:
+        container = await self._get_container()
+        if not container:
+            return False
+        try:
+            await container.get_blob_client(name).get_blob_properties()
+            return True
+        except ResourceNotFoundError:
+            return False
+
+    async def list(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        container = await self._get_container()
+        if not container:
+            return []
+        return [
+            {
+                "name": blob.name,
+                "size": blob.size,
+                "last_modified": blob.last_modified.isoformat() if blob.last_modified else None
+            }
+            async for blob in container.list_blobs(name_starts_with=prefix)
+        ]
+
+
+class CosmosTwinMetadataStore(TwinMetadataStore):
+    def __init__(self, container_name: str = "metadata"):
+        self.container_name = container_name
+
+    async def _get_container(self):
+        return await azure_config.get_async_cosmos_container_client(self.container_name)
+
+    async def _query(self, query: str, parameters: List[Dict[str, Any]],
+                     max_item_count: Optional[int] = None) -> List[Dict[str, Any]]:
+        container = await self._get_container()
+        if not container:
+            return []
+        return [item async for item in container.query_items(
+            query=query,
+            parameters=parameters,
+            max_item_count=max_item_count
+        )]
+
+    async def available(self) -> bool:
+        return await self._get_container() is not None
+
+    async def read(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        from storage.digital_twin_storage import get_partition_key
+
+        container = await self._get_container()
+        if not container:
+            return None
+
+        try:
+            return await container.read_item(item=lead_id, partition_key=get_partition_key(lead_id))
+        except CosmosResourceNotFoundError:
+            pass
+
+        if TWIN_METADATA_LEGACY_LOOKUP:
+            query = "SELECT * FROM c WHERE c.id = @lead_id"
+            items = await self._query(query, [{"name": "@lead_id", "value": lead_id}], max_item_count=1)
+            if items:
+                return items[0]
+
+        return None
+
+    async def upsert(self, doc: Dict[str, Any]) -> None:
+        container = await self._get_container()
+        if container:
+            await container.upsert_item(doc)
+
+    async def delete(self, lead_id: str, partition_key: Optional[str] = None) -> bool:
+        from storage.digital_twin_storage import get_partition_key
+
+        container = await self._get_container()
+        if not container:
+            return False
+        try:
+            await container.delete_item(item=lead_id, partition_key=partition_key or get_partition_key(lead_id))
+            return True
+        except CosmosResourceNotFoundError:
+            return False
+
+    async def find_by_input_hash(self, input_hash: str) -> Optional[Dict[str, Any]]:
+        query = "SELECT TOP 1 * FROM c WHERE c.input_hash = @input_hash ORDER BY c.last_updated DESC"
+        items = await self._query(query, [{"name": "@input_hash", "value": input_hash}])
+        return items[0] if items else None
+
+    async def get_many(self, lead_ids: List[str]) -> List[Dict[str, Any]]:
+        items = []
+        for start in range(0, len(lead_ids), GET_MANY_QUERY_BATCH_SIZE):
+            batch = lead_ids[start:start + GET_MANY_QUERY_BATCH_SIZE]
+            items.extend(await self._query(
+                "SELECT * FROM c WHERE ARRAY_CONTAINS(@lead_ids, c.id)",
+                [{"name": "@lead_ids", "value": batch}]
+            ))
+        return items
+
+    async def list_page(self, classification: Optional[str], limit: int, continuation_token: Optional[str],
+                        fields: Optional[Sequence[str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        container = await self._get_container()
+        if not container:
+            return [], None
+
+        if classification:
+            conditions = ["c.lead_classification = @classification"]
+            parameters = [{"name": "@classification", "value": classification}]
+        else:
+            conditions = []
+            parameters = []
+        query = build_query(fields, conditions, order_by="c.last_updated DESC")
+        return await query_page(container, query, parameters, limit, continuation_token)
+
+    async def search(self, criteria: Dict[str, Any], limit: int,
+                     fields: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+        conditions = []
+        parameters = []
+
+        if 'min_age' in criteria:
+            conditions.append("c.personal_information.age >= @min_age")
+            parameters.append({"name": "@min_age", "value": str(criteria['min_age'])})
+
+        if 'max_age' in criteria:
+            conditions.append("c.personal_information.age <= @max_age")
+            parameters.append({"name": "@max_age", "value": str(criteria['max_age'])})
+
+        if 'occupation' in criteria:
+            conditions.append("CONTAINS(c.personal_information.occupation, @occupation)")
+            parameters.append({"name": "@occupation", "value": criteria['occupation']})
+
+        if 'location' in criteria:
+            conditions.append("CONTAINS(c.demographic_information.location, @location)")
+            parameters.append({"name": "@location", "value": criteria['location']})
+
+        if 'marital_status' in criteria:
+            conditions.append("c.demographic_information.marital_status = @marital_status")
+            parameters.append({"name": "@marital_status", "value": criteria['marital_status']})
+
+        if 'lead_classification' in criteria:
+            conditions.append("c.lead_classification = @lead_classification")
+            parameters.append({"name": "@lead_classification", "value": criteria['lead_classification']})
+
+        query = build_query(fields, conditions, order_by="c.last_updated DESC", top=limit)
+        return await self._query(query, parameters, max_item_count=limit)
+
+
+# Sessions and their response records share the qa_sessions container and the session's partition
+SESSION_DOC_TYPE = "session"
+RESPONSE_DOC_TYPE = "response"
+
+# Index only what list queries filter and sort on; responses, summaries and context are never queried
+QA_SESSIONS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "automatic": True,
+    "includedPaths": [
+        {"path": "/doc_type/?"},
+        {"path": "/status/?"},
+        {"path": "/created_at/?"},
+        {"path": "/updated_at/?"},
+        {"path": "/completed_at/?"},
+        {"path": "/question/?"},
+        {"path": "/prospect_ids/[]/?"},
+        {"path": "/answered_at/?"}
+    ],
+    "excludedPaths": [
+        {"path": "/*"},
+        {"path": "/\"_etag\"/?"}
+    ]
+}
+
+
+class CosmosQASessionStore(QASessionStore):
+    def __init__(self):
+        self.container = azure_config.get_cosmos_container_client("qa_sessions")
+        self.image_container = azure_config.get_blob_container_client("qa-images")
+        self._ensure_container_exists()
+
+    def _ensure_container_exists(self):
+        """Ensure QA sessions container exists in Cosmos DB"""
+        try:
+            if azure_config.cosmos_client:
+                database = azure_config.cosmos_client.get_database_client("mirai-lms")
+                partition_key = {"paths": ["/session_id"], "kind": "Hash"}
+                container = database.create_container_if_not_exists(
+                    id="qa_sessions",
+                    partition_key=partition_key,
+                    indexing_policy=QA_SESSIONS_INDEXING_POLICY
+                )
+                # Containers created before prospect_ids existed keep their old policy until replaced;
+                # Cosmos rebuilds the index online
+                indexing_policy = container.read().get("indexingPolicy", {})
+                included = {p.get("path") for p in indexing_policy.get("includedPaths", [])}
+                if "/*" not in included and "/prospect_ids/[]/?" not in included:
+                    database.replace_container(
+                        container, partition_key=partition_key, indexing_policy=QA_SESSIONS_INDEXING_POLICY
+                    )
+        except Exception as e:
+            print(f"Error ensuring QA sessions container exists: {e}")
+
+    def available(self) -> bool:
+        return self.container is not None
+
+    def create(self, doc: Dict[str, Any]) -> None:
+        self.container.create_item(body={**doc, "doc_type": SESSION_DOC_TYPE})
+
+    def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.container.read_item(item=session_id, partition_key=session_id)
+        except CosmosResourceNotFoundError:
+            return None
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        self.container.upsert_item(body=doc)
+
+    def patch(self, session_id: str, set_fields: Optional[Dict[str, Any]] = None,
+              increments: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+        operations = [{"op": "set", "path": f"/{field}", "value": value} for field, value in (set_fields or {}).items()]
+        operations += [{"op": "incr", "path": f"/{field}", "value": value} for field, value in (increments or {}).items()]
+        try:
+            return self.container.patch_item(item=session_id, partition_key=session_id, patch_operations=operations)
+        except CosmosResourceNotFoundError:
+            return None
+
+    def delete(self, session_id: str) -> None:
+        self.container.delete_item(item=session_id, partition_key=session_id)
+        response_ids = self.container.query_items(
+            query="SELECT VALUE c.id FROM c WHERE c.doc_type = @doc_type",
+            parameters=[{"name": "@doc_type", "value": RESPONSE_DOC_TYPE}],
+            partition_key=session_id
+        )
+        for response_id in list(response_ids):
+            self.container.delete_item(item=response_id, partition_key=session_id)
+
+    def replace(self, doc: Dict[str, Any], etag: str) -> bool:
+        body = {k: v for k, v in doc.items() if not k.startswith('_')}
+        try:
+            self.container.replace_item(
+                item=doc["id"],
+                body=body,
+                etag=etag,
+                match_condition=MatchConditions.IfNotModified
+            )
+            return True
+        except CosmosAccessConditionFailedError:
+            return False
+
+    def add_responses(self, session_id: str, docs: List[Dict[str, Any]]) -> None:
+        # One upsert per record in the session's partition; record ids are fixed, so a retried flush
+        # overwrites instead of duplicating
+        for doc in docs:
+            self.container.upsert_item(body={
+                **doc,
+                "session_id": session_id,
+                "partition_key": session_id,
+                "doc_type": RESPONSE_DOC_TYPE
+            })
+
+    def list_responses(self, session_id: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Single-partition query served by the range index on answered_at
+        query = "SELECT * FROM c WHERE c.doc_type = @doc_type"
+        parameters = [{"name": "@doc_type", "value": RESPONSE_DOC_TYPE}]
+        if since:
+            query += " AND c.answered_at > @since"
+            parameters.append({"name": "@since", "value": since})
+        query += " ORDER BY c.answered_at ASC"
+        return list(self.container.query_items(query=query, parameters=parameters, partition_key=session_id))
+
+    def _where_clause(self, filters: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+        # Sessions written before response records existed have no doc_type
+        clause = "WHERE (NOT IS_DEFINED(c.doc_type) OR c.doc_type = @session_doc_type)"
+        parameters = [{"name": "@session_doc_type", "value": SESSION_DOC_TYPE}]
+
+        status_values = filters.get('status_values')
+        if status_values:
+            clause += f" AND c.status IN ({','.join(['@status' + str(i) for i in range(len(status_values))])})"
+            for i, status in enumerate(status_values):
+                parameters.append({"name": f"@status{i}", "value": status})
+
+        if filters.get('prospect_id'):
+            clause += " AND ARRAY_CONTAINS(c.prospect_ids, @prospect_id)"
+            parameters.append({"name": "@prospect_id", "value": filters['prospect_id']})
+
+        if filters.get('date_from'):
+            clause += " AND c.created_at >= @date_from"
+            parameters.append({"name": "@date_from", "value": filters['date_from']})
+
+        if filters.get('date_to'):
+            clause += " AND c.created_at <= @date_to"
+            parameters.append({"name": "@date_to", "value": filters['date_to']})
+
+        if filters.get('search_query'):
+            clause += " AND CONTAINS(c.question, @search, true)"
+            parameters.append({"name": "@search", "value": filters['search_query']})
+
+        return clause, parameters
+
+    def query(self, filters: Dict[str, Any], sort_by: str = "created_at", sort_order: str = "desc",
+              fields: Optional[Sequence[str]] = None, offset: int = 0,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        where, parameters = self._where_clause(filters)
+        sort_direction = "DESC" if sort_order == "desc" else "ASC"
+        query = f"{select_clause(fields)} {where} ORDER BY c.{sort_by} {sort_direction}"
+
+        if limit is not None:
+            query += " OFFSET @offset LIMIT @limit"
+            parameters += [{"name": "@offset", "value": offset}, {"name": "@limit", "value": limit}]
+
+        return list(self.container.query_items(
+            query=query,
+            parameters=parameters,
+            enable_cross_partition_query=True
+        ))
+
+    def count(self, filters: Dict[str, Any]) -> int:
+        where, parameters = self._where_clause(filters)
+        results = self.container.query_items(
+            query=f"SELECT VALUE COUNT(1) FROM c {where}",
+            parameters=parameters,
+            enable_cross_partition_query=True
+        )
+        return sum(results)
+
+    def save_image(self, blob_name: str, data: bytes, content_type: str) -> Optional[str]:
+        blob_client = self.image_container.get_blob_client(blob_name)
+        blob_client.upload_blob(
+            data=data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=content_type)
+        )
+        return blob_client.url
+
+    def delete_image(self, blob_name: str) -> None:
+        self.image_container.get_blob_client(blob_name).delete_blob()
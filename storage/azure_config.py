@@ -1,13 +1,26 @@
+import asyncio
 import os
 from typing import Optional
 from azure.storage.blob import BlobServiceClient
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
 from azure.cosmos import CosmosClient
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+import aiohttp
 import redis
+import redis.asyncio as aioredis
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Size of the HTTP connection pool shared by the async Blob and Cosmos clients
+AZURE_HTTP_POOL_SIZE = int(os.getenv("AZURE_HTTP_POOL_SIZE", "100"))
+# Opt-in shared Redis cache tier, see storage/twin_cache.py
+REDIS_CACHE_ENABLED = os.getenv("REDIS_CACHE_ENABLED", "false").lower() == "true"
+# Opt-in Redis pub/sub relay of QA session events between workers, see services/qa_session_events.py
+QA_SESSION_EVENTS_REDIS = os.getenv("QA_SESSION_EVENTS_REDIS", "false").lower() == "true"
+
 class AzureStorageConfig:
     _instance = None
     
@@ -23,6 +36,13 @@ class AzureStorageConfig:
         self.redis_client = None
         self.search_client = None
         
+        # Async clients are bound to the event loop that opened them, see open_async_clients()
+        self.async_blob_service_client = None
+        self.async_cosmos_client = None
+        self.async_redis_client = None
+        self._http_session = None
+        self._async_loop = None
+        
         self._init_blob_storage()
         self._init_cosmos_db()
         #self._init_redis_cache()
@@ -90,6 +110,84 @@ class AzureStorageConfig:
             return database.get_container_client(container_name)
         return None
     
+    async def open_async_clients(self):
+        """
+        Create the async Blob and Cosmos clients on the running event loop.
+        Both clients share one aiohttp connection pool.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is loop:
+            return
+        if self._async_loop is not None:
+            raise RuntimeError("Async Azure clients are already open on another event loop. Use utils.async_helper.run_async to call storage from sync code.")
+        
+        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+        endpoint = os.getenv("COSMOS_ENDPOINT")
+        key = os.getenv("COSMOS_KEY")
+        
+        self._http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=AZURE_HTTP_POOL_SIZE, ttl_dns_cache=300)
+        )
+        if connection_string:
+            self.async_blob_service_client = AsyncBlobServiceClient.from_connection_string(
+                connection_string,
+                transport=AioHttpTransport(session=self._http_session, session_owner=False)
+            )
+        if endpoint and key:
+            self.async_cosmos_client = AsyncCosmosClient(
+                url=endpoint,
+                credential=key,
+                transport=AioHttpTransport(session=self._http_session, session_owner=False)
+            )
+        
+        redis_host = os.getenv("REDIS_HOST")
+        redis_key = os.getenv("REDIS_KEY")
+        if (REDIS_CACHE_ENABLED or QA_SESSION_EVENTS_REDIS) and redis_host and redis_key:
+            self.async_redis_client = aioredis.Redis(
+                host=redis_host,
+                port=6380,
+                password=redis_key,
+                ssl=True,
+                decode_responses=True
+            )
+        self._async_loop = loop
+    
+    async def close_async_clients(self):
+        """Close the async clients and their shared connection pool"""
+        if self.async_blob_service_client:
+            await self.async_blob_service_client.close()
+        if self.async_cosmos_client:
+            await self.async_cosmos_client.close()
+        if self.async_redis_client:
+            await self.async_redis_client.aclose()
+        if self._http_session:
+            await self._http_session.close()
+        self.async_blob_service_client = None
+        self.async_cosmos_client = None
+        self.async_redis_client = None
+        self._http_session = None
+        self._async_loop = None
+    
+    async def get_async_blob_container_client(self, container_name: str):
+        await self.open_async_clients()
+        if self.async_blob_service_client:
+            return self.async_blob_service_client.get_container_client(container_name)
+        return None
+    
+    async def get_async_cosmos_container_client(self, container_name: str):
+        await self.open_async_clients()
+        if self.async_cosmos_client:
+            database = self.async_cosmos_client.get_database_client("mirai-lms")
+            return database.get_container_client(container_name)
+        return None
+    
+    def get_async_redis_client(self):
+        return self.async_redis_client
+    
+    def get_async_redis_cache_client(self):
+        """Redis client for the shared cache tier, None unless REDIS_CACHE_ENABLED"""
+        return self.async_redis_client if REDIS_CACHE_ENABLED else None
+    
     def get_redis_client(self):
         return self.redis_client
     
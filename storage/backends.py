@@ -0,0 +1,194 @@
+"""
+Storage backend interfaces used by ScalableDigitalTwinStorage, PersonaImageStorage and QASessionStorage.
+
+STORAGE_BACKEND selects the implementation:
+- "azure" (default): Blob Storage and Cosmos DB, see storage/azure_backend.py
+- "local": a sharded filesystem tree for blobs and SQLite for documents, see storage/local_backend.py
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure").lower()
+
+
+class BlobStore(ABC):
+    """Named binary objects in one container"""
+
+    @abstractmethod
+    async def available(self) -> bool:
+        """False when the backend is not configured; callers then skip blob work"""
+
+    @abstractmethod
+    async def upload(self, name: str, data: bytes, metadata: Optional[Dict[str, str]] = None,
+                     content_type: Optional[str] = None) -> Optional[str]:
+        """Create or replace a blob and return its URL"""
+
+    @abstractmethod
+    async def download(self, name: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Return (data, metadata), or None if the blob does not exist"""
+
+    @abstractmethod
+    async def delete(self, name: str) -> bool:
+        """Delete a blob; False if it did not exist"""
+
+    @abstractmethod
+    async def exists(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def list(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Blobs whose name starts with prefix, as dicts with name, size and last_modified"""
+
+
+class TwinMetadataStore(ABC):
+    """Digital twin metadata documents, keyed by lead_id ("id")"""
+
+    @abstractmethod
+    async def available(self) -> bool:
+        pass
+
+    @abstractmethod
+    async def read(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def upsert(self, doc: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, lead_id: str, partition_key: Optional[str] = None) -> bool:
+        """Delete a document; partition_key addresses a copy stored under a non-default partition"""
+
+    @abstractmethod
+    async def find_by_input_hash(self, input_hash: str) -> Optional[Dict[str, Any]]:
+        """Most recently updated document with the given input_hash"""
+
+    @abstractmethod
+    async def get_many(self, lead_ids: List[str]) -> List[Dict[str, Any]]:
+        """Documents for the given ids, in no particular order; missing ids are omitted"""
+
+    @abstractmethod
+    async def list_page(self, classification: Optional[str], limit: int, continuation_token: Optional[str],
+                        fields: Optional[Sequence[str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of documents, newest first, and the opaque token of the next page"""
+
+    @abstractmethod
+    async def search(self, criteria: Dict[str, Any], limit: int,
+                     fields: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+        """
+        Documents matching criteria (min_age, max_age, occupation, location, marital_status,
+        lead_classification), newest first
+        """
+
+
+class QASessionStore(ABC):
+    """
+    QA session documents keyed by session_id, the response records of each session, and the images
+    attached to sessions. Responses are stored as separate records next to their session so recording
+    one never rewrites the session document.
+    """
+
+    @abstractmethod
+    def available(self) -> bool:
+        pass
+
+    @abstractmethod
+    def create(self, doc: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Session document, including its current _etag"""
+
+    @abstractmethod
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    def patch(self, session_id: str, set_fields: Optional[Dict[str, Any]] = None,
+              increments: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically set and increment top-level fields of a session without rewriting the document.
+        Returns the updated document, or None if the session does not exist.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Delete a session and its response records"""
+
+    @abstractmethod
+    def replace(self, doc: Dict[str, Any], etag: str) -> bool:
+        """
+        Replace a session only if it is unchanged since it was read with the given "_etag".
+        Returns False when another writer got there first; the caller re-reads and retries.
+        """
+
+    @abstractmethod
+    def add_responses(self, session_id: str, docs: List[Dict[str, Any]]) -> None:
+        """
+        Store response records; each doc carries a unique "id" and an "answered_at" timestamp.
+        Writing a record again with the same id replaces it, so a failed flush can be retried.
+        """
+
+    @abstractmethod
+    def list_responses(self, session_id: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Response records of a session answered after `since` (ISO timestamp), oldest first"""
+
+    @abstractmethod
+    def query(self, filters: Dict[str, Any], sort_by: str = "created_at", sort_order: str = "desc",
+              fields: Optional[Sequence[str]] = None, offset: int = 0,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        One page of sessions matching filters, which may hold status_values, prospect_id, date_from,
+        date_to (ISO timestamps on created_at) and search_query (substring of the question).
+        sort_by is one of created_at, updated_at, completed_at, status.
+        """
+
+    @abstractmethod
+    def count(self, filters: Dict[str, Any]) -> int:
+        """Number of sessions matching filters, computed by the store rather than by fetching them"""
+
+    @abstractmethod
+    def save_image(self, blob_name: str, data: bytes, content_type: str) -> Optional[str]:
+        """Store a session image and return its URL"""
+
+    @abstractmethod
+    def delete_image(self, blob_name: str) -> None:
+        pass
+
+
+_instances: Dict[str, Any] = {}
+_instances_lock = threading.Lock()
+
+
+def _get_instance(key: str, factory):
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = factory()
+        return _instances[key]
+
+
+def get_blob_store(container_name: str) -> BlobStore:
+    if STORAGE_BACKEND == "local":
+        from storage.local_backend import LocalBlobStore
+        return _get_instance(f"blob:{container_name}", lambda: LocalBlobStore(container_name))
+    from storage.azure_backend import AzureBlobStore
+    return _get_instance(f"blob:{container_name}", lambda: AzureBlobStore(container_name))
+
+
+def get_twin_metadata_store() -> TwinMetadataStore:
+    if STORAGE_BACKEND == "local":
+        from storage.local_backend import SqliteTwinMetadataStore
+        return _get_instance("twin_metadata", SqliteTwinMetadataStore)
+    from storage.azure_backend import CosmosTwinMetadataStore
+    return _get_instance("twin_metadata", CosmosTwinMetadataStore)
+
+
+def get_qa_session_store() -> QASessionStore:
+    if STORAGE_BACKEND == "local":
+        from storage.local_backend import SqliteQASessionStore
+        return _get_instance("qa_sessions", SqliteQASessionStore)
+    from storage.azure_backend import CosmosQASessionStore
+    return _get_instance("qa_sessions", CosmosQASessionStore)
@@ -0,0 +1,69 @@
+"""
+Compression codecs for text blobs. The codec is recorded in the blob's metadata ("codec"), so
+blobs written before compression was enabled (no metadata) are read back as plain bytes.
+
+Compressed blobs are uploaded as application/octet-stream rather than with a Content-Encoding header:
+HTTP clients, the Azure SDK's aiohttp transport included, decompress such bodies transparently, so a
+reader could no longer tell whether the codec still has to be applied.
+"""
+import gzip
+import os
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_NONE = "none"
+CODEC_GZIP = "gzip"
+CODEC_ZSTD = "zstd"
+
+# Codec used for new twin markdown uploads; zstd needs the optional zstandard package
+TWIN_BLOB_CODEC = os.getenv("TWIN_BLOB_CODEC", CODEC_GZIP).lower()
+GZIP_LEVEL = int(os.getenv("TWIN_BLOB_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("TWIN_BLOB_ZSTD_LEVEL", "3"))
+
+
+def available_codecs():
+    codecs = [CODEC_NONE, CODEC_GZIP]
+    if zstandard is not None:
+        codecs.append(CODEC_ZSTD)
+    return codecs
+
+
+def resolve_codec(codec: Optional[str] = None) -> str:
+    """Codec to write with; falls back to gzip when zstd is configured but zstandard is not installed"""
+    codec = (codec or TWIN_BLOB_CODEC).lower()
+    if codec == CODEC_ZSTD and zstandard is None:
+        print("Warning: zstandard is not installed, compressing blobs with gzip instead")
+        return CODEC_GZIP
+    if codec not in (CODEC_NONE, CODEC_GZIP, CODEC_ZSTD):
+        raise ValueError(f"Unknown blob codec: {codec}")
+    return codec
+
+
+def content_type(codec: str, plain_content_type: str) -> str:
+    """Content type to upload encoded data with; only uncompressed data keeps its own type"""
+    return plain_content_type if codec == CODEC_NONE else "application/octet-stream"
+
+
+def encode(data: bytes, codec: str) -> bytes:
+    if codec == CODEC_GZIP:
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def decode(data: bytes, codec: Optional[str]) -> bytes:
+    """Decompress data written with `codec`; a missing codec means an uncompressed legacy blob"""
+    if not codec or codec == CODEC_NONE:
+        return data
+    if codec == CODEC_GZIP:
+        return gzip.decompress(data)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown blob codec: {codec}")
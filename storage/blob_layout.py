@@ -0,0 +1,53 @@
+"""
+Blob naming for digital twin markdown. The path a twin was written to is recorded in its metadata
+document ("blob_path") and readers use that, so changing the layout only affects new twins until
+storage/migrate_blob_layout.py moves the existing ones.
+
+- hash: {h[0:2]}/{h[2:4]}/{lead_id}.md with h the sha256 of lead_id; spreads twins over 65536 prefixes
+  and, like flat, can be computed from lead_id alone, so the markdown can be fetched concurrently with
+  the metadata (see derived_blob_path)
+- date: {year}/{month}/{day}/{lead_id}.md, which keeps prefix listings and lifecycle rules per day cheap,
+  but the path is only known from the metadata's blob_path, so reads fetch the metadata first
+- flat: {lead_id}.md
+"""
+import hashlib
+import os
+from datetime import datetime
+from typing import Optional
+
+LAYOUT_FLAT = "flat"
+LAYOUT_DATE = "date"
+LAYOUT_HASH = "hash"
+
+TWIN_BLOB_LAYOUT = os.getenv("TWIN_BLOB_LAYOUT", LAYOUT_HASH).lower()
+
+
+def flat_blob_path(lead_id: str) -> str:
+    """Where twins were stored before blob_path was recorded; also used when there is no metadata"""
+    return f"{lead_id}.md"
+
+
+def hash_blob_path(lead_id: str) -> str:
+    digest = hashlib.sha256(lead_id.encode("utf-8")).hexdigest()
+    return f"{digest[0:2]}/{digest[2:4]}/{lead_id}.md"
+
+
+def derived_blob_path(lead_id: str, layout: Optional[str] = None) -> Optional[str]:
+    """Path of a twin written under a layout that depends on lead_id only, or None for the date layout"""
+    layout = (layout or TWIN_BLOB_LAYOUT).lower()
+    if layout == LAYOUT_FLAT:
+        return flat_blob_path(lead_id)
+    if layout == LAYOUT_HASH:
+        return hash_blob_path(lead_id)
+    return None
+
+
+def twin_blob_path(lead_id: str, when: Optional[datetime] = None, layout: Optional[str] = None) -> str:
+    layout = (layout or TWIN_BLOB_LAYOUT).lower()
+    if layout == LAYOUT_DATE:
+        when = when or datetime.utcnow()
+        return f"{when:%Y}/{when:%m}/{when:%d}/{lead_id}.md"
+    path = derived_blob_path(lead_id, layout)
+    if path is None:
+        raise ValueError(f"Unknown blob layout: {layout}")
+    return path
@@ -0,0 +1,68 @@
+"""
+Compare blob codecs on the digital twin markdown in the agents' training sets:
+stored size, compression ratio and encode/decode time per twin.
+
+Usage: python -m storage.compression_benchmark [--repeat 20]
+"""
+import argparse
+import csv
+import glob
+import os
+import statistics
+import sys
+import time
+
+from storage import blob_codec
+
+TRAINING_SET_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 "agent_dojo", "agents", "*", "training_set", "*.csv")
+MARKDOWN_COLUMNS = ("digital_twin", "existing_digital_twin", "persona")
+
+
+def load_samples():
+    csv.field_size_limit(sys.maxsize)
+    samples = set()
+    for path in glob.glob(TRAINING_SET_GLOB):
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                for column in MARKDOWN_COLUMNS:
+                    if row.get(column):
+                        samples.add(row[column])
+    return [sample.encode("utf-8") for sample in samples]
+
+
+def run_benchmark(repeat: int):
+    samples = load_samples()
+    if not samples:
+        print("No training set samples found")
+        return
+
+    raw_bytes = sum(len(sample) for sample in samples)
+    print(f"{len(samples)} markdown samples, {raw_bytes / 1024:.1f} KiB raw, "
+          f"median {statistics.median(len(s) for s in samples)} bytes")
+    print(f"{'codec':<6} {'stored KiB':>11} {'ratio':>7} {'encode us':>10} {'decode us':>10}")
+
+    for codec in blob_codec.available_codecs():
+        encoded = [blob_codec.encode(sample, codec) for sample in samples]
+        stored_bytes = sum(len(e) for e in encoded)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for sample in samples:
+                blob_codec.encode(sample, codec)
+        encode_us = (time.perf_counter() - start) / (repeat * len(samples)) * 1e6
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for data in encoded:
+                blob_codec.decode(data, codec)
+        decode_us = (time.perf_counter() - start) / (repeat * len(samples)) * 1e6
+
+        print(f"{codec:<6} {stored_bytes / 1024:>11.1f} {raw_bytes / stored_bytes:>7.2f} {encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark blob compression codecs on training set twins")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run_benchmark(args.repeat)
@@ -1,5 +1,6 @@
 from typing import List, Dict, Any, Optional
 from storage.azure_config import azure_config
+from storage.query_builder import TWIN_LIST_FIELDS, build_query
 
 class DigitalTwinSearch:
     def __init__(self):
@@ -105,16 +106,14 @@ class DigitalTwinSearch:
                 where_clauses.append("c.marital_status = @marital_status")
                 parameters.append({"name": "@marital_status", "value": filters['marital_status']})
         
-        if where_clauses:
-            query_text = f"SELECT * FROM c WHERE {' AND '.join(where_clauses)} ORDER BY c.last_updated DESC"
-        else:
-            query_text = "SELECT * FROM c ORDER BY c.last_updated DESC"
+        query_text = build_query(TWIN_LIST_FIELDS, where_clauses, order_by="c.last_updated DESC", top=top)
         
         try:
             items = list(self.metadata_container.query_items(
                 query=query_text,
                 parameters=parameters,
-                max_item_count=top
+                max_item_count=top,
+                enable_cross_partition_query=True
             ))
             
             return {
@@ -1,10 +1,14 @@
+import asyncio
 import json
 import os
 from datetime import datetime
-from typing import Optional, Dict, List, Any
-from azure.core.exceptions import ResourceNotFoundError
+from typing import Optional, Dict, List, Any, Sequence, Tuple
 from agent_dojo.agents.DigitalTwinCreatorAgent.InsuranceProspectModel import InsuranceProspect
-from storage.azure_config import azure_config
+from storage.backends import get_blob_store, get_twin_metadata_store
+from storage.twin_cache import twin_cache
+from storage.query_builder import TWIN_LIST_FIELDS
+from storage import blob_codec
+from storage.blob_layout import derived_blob_path, flat_blob_path, twin_blob_path
 import hashlib
 import dataclasses
 
@@ -15,31 +19,89 @@ class DataclassEncoder(json.JSONEncoder):
             return dataclasses.asdict(obj)
         return super().default(obj)
 
+def compute_content_hash(markdown: str) -> str:
+    """Hash identifying a version of a digital twin's markdown"""
+    return hashlib.md5(markdown.encode()).hexdigest()
+
+def compute_input_hash(data: str, existing_digital_twin: Optional[str] = None) -> str:
+    """Hash identifying the inputs a digital twin was created from"""
+    payload = json.dumps([data or "", existing_digital_twin or ""], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+# Blob downloads in flight for get_many()
+GET_MANY_DOWNLOAD_CONCURRENCY = int(os.getenv("GET_MANY_DOWNLOAD_CONCURRENCY", "16"))
+
+# Content type of uncompressed twin markdown; compressed blobs are uploaded as opaque bytes
+MARKDOWN_CONTENT_TYPE = "text/markdown; charset=utf-8"
+
+def _markdown_cache_key(lead_id: str) -> str:
+    return f"markdown:{lead_id}"
+
+def _metadata_cache_key(lead_id: str) -> str:
+    return f"metadata:{lead_id}"
+
+def get_partition_key(lead_id: str) -> str:
+    """Partition key of a twin's metadata document; derived from lead_id so lookups are point reads"""
+    return lead_id
+
+# Fields that change on every save and are excluded when comparing metadata documents
+_VOLATILE_METADATA_FIELDS = ("last_updated", "partition_key", "metadata_hash")
+
+def _compute_metadata_hash(metadata_doc: Dict[str, Any]) -> str:
+    stable = {k: v for k, v in metadata_doc.items() if k not in _VOLATILE_METADATA_FIELDS and not k.startswith('_')}
+    return hashlib.md5(json.dumps(stable, sort_keys=True, cls=DataclassEncoder).encode()).hexdigest()
+
 class ScalableDigitalTwinStorage:
     def __init__(self):
-        self.blob_container = azure_config.get_blob_container_client("digital-twins")
-        self.metadata_container = azure_config.get_cosmos_container_client("metadata")
+        # Azure Blob/Cosmos or local filesystem/SQLite, depending on STORAGE_BACKEND
+        self.blob_store = get_blob_store("digital-twins")
+        self.metadata_store = get_twin_metadata_store()
         
-    def _get_blob_path(self, lead_id: str) -> str:
-        return f"{lead_id}.md"
+    def _get_blob_path(self, lead_id: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Blob path recorded in the twin's metadata; twins without one predate blob_path and are flat"""
+        return (metadata or {}).get('blob_path') or flat_blob_path(lead_id)
     
-    async def save_digital_twin(self, lead_id: str, markdown: str, insurance_prospect: Optional[InsuranceProspect] = None) -> Dict[str, Any]:
-        blob_path = self._get_blob_path(lead_id)
+    async def save_digital_twin(self, lead_id: str, markdown: str, insurance_prospect: Optional[InsuranceProspect] = None,
+                                input_hash: Optional[str] = None) -> Dict[str, Any]:
+        content_hash = compute_content_hash(markdown)
+        blob_written = False
+        metadata_written = False
+        blob_available = await self.blob_store.available()
+        metadata_available = await self.metadata_store.available()
+
+        # Compare with the stored version so unchanged twins cost no blob upload or RUs
+        existing_metadata = await self._read_metadata(lead_id) if metadata_available else None
+        markdown_unchanged = bool(existing_metadata) and existing_metadata.get('content_hash') == content_hash
+        
+        # Existing twins keep their path until migrated; new ones follow TWIN_BLOB_LAYOUT, unless no
+        # metadata document will record the path, in which case readers can only find the flat one
+        if existing_metadata:
+            blob_path = self._get_blob_path(lead_id, existing_metadata)
+        elif metadata_available and insurance_prospect:
+            blob_path = twin_blob_path(lead_id)
+        else:
+            blob_path = flat_blob_path(lead_id)
         
         # Save markdown to blob storage
-        if self.blob_container:
-            blob_client = self.blob_container.get_blob_client(blob_path)
-            blob_client.upload_blob(markdown, overwrite=True)
+        if blob_available and not markdown_unchanged:
+            codec = blob_codec.resolve_codec()
+            await self.blob_store.upload(
+                blob_path,
+                blob_codec.encode(markdown.encode('utf-8'), codec),
+                metadata={"codec": codec},
+                content_type=blob_codec.content_type(codec, MARKDOWN_CONTENT_TYPE)
+            )
+            blob_written = True
         
-        # Save insurance prospect to Cosmos DB
-        if self.metadata_container and insurance_prospect:
+        # Save insurance prospect to the metadata store
+        if metadata_available and insurance_prospect:
             # Convert insurance_prospect to dict
             prospect_dict = dataclasses.asdict(insurance_prospect) if dataclasses.is_dataclass(insurance_prospect) else insurance_prospect
             
-            # Create metadata document for Cosmos DB
+            # Create metadata document
             metadata_doc = {
                 "id": lead_id,
-                "partition_key": datetime.now().strftime('%Y-%m'),
+                "partition_key": get_partition_key(lead_id),
                 "blob_path": blob_path,
                 "lead_classification": insurance_prospect.lead_classification if hasattr(insurance_prospect, 'lead_classification') else "unknown",
                 "persona_summary": insurance_prospect.persona_summary if hasattr(insurance_prospect, 'persona_summary') else "Unknown",
@@ -48,90 +110,203 @@ class ScalableDigitalTwinStorage:
                 "financial_information": prospect_dict.get('financial_information', {}),
                 "insurance_history": prospect_dict.get('insurance_history', {}),
                 "last_updated": datetime.utcnow().isoformat(),
-                "content_hash": hashlib.md5(markdown.encode()).hexdigest()
+                "content_hash": content_hash,
+                "input_hash": input_hash or (existing_metadata or {}).get('input_hash')
             }
+            metadata_doc["metadata_hash"] = _compute_metadata_hash(metadata_doc)
+            
+            legacy_partition_key = None
+            if existing_metadata and existing_metadata.get('partition_key') != metadata_doc["partition_key"]:
+                legacy_partition_key = existing_metadata.get('partition_key')
             
-            # Upsert to Cosmos DB
-            self.metadata_container.upsert_item(metadata_doc)
+            # Upsert only if something other than the timestamp changed; the stored document is hashed
+            # rather than trusting its metadata_hash, which writers outside this method may leave stale
+            if not existing_metadata or legacy_partition_key is not None or _compute_metadata_hash(existing_metadata) != metadata_doc["metadata_hash"]:
+                await self.metadata_store.upsert(metadata_doc)
+                metadata_written = True
+            
+            # A twin saved under an old month partition has now been rewritten under its own key
+            if legacy_partition_key is not None:
+                await self.metadata_store.delete(lead_id, partition_key=legacy_partition_key)
+        
+        if blob_written or metadata_written:
+            await twin_cache.invalidate(_markdown_cache_key(lead_id), _metadata_cache_key(lead_id))
         
         return {
             "lead_id": lead_id,
             "blob_path": blob_path,
+            "content_hash": content_hash,
+            "blob_written": blob_written,
+            "metadata_written": metadata_written,
         }
     
-    async def get_digital_twin(self, lead_id: str) -> Optional[str]:
-        # Try to get from blob storage directly
-        if self.blob_container:
-            blob_path = f"{lead_id}.md"
-            blob_client = self.blob_container.get_blob_client(blob_path)
-            try:
-                content = blob_client.download_blob().readall().decode('utf-8')
-                return content
-            except ResourceNotFoundError:
-                pass
+    async def get_digital_twin(self, lead_id: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Get a twin's markdown; pass its metadata when already loaded to skip the blob_path lookup"""
+        cache_key = _markdown_cache_key(lead_id)
+        content, token = await twin_cache.lookup(cache_key)
+        if content is None:
+            if metadata is None:
+                metadata = await self.get_digital_twin_metadata(lead_id)
+            content = await self._read_markdown(lead_id, metadata)
+            await twin_cache.set(cache_key, content, token)
+        return content
+    
+    async def _read_markdown(self, lead_id: str, metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+        blob_path = self._get_blob_path(lead_id, metadata)
+        blob = await self.blob_store.download(blob_path)
+        if blob is None and metadata:
+            # The cached metadata may predate a layout migration; look the path up again
+            fresh_metadata = await self._read_metadata(lead_id)
+            fresh_path = self._get_blob_path(lead_id, fresh_metadata)
+            if fresh_path != blob_path:
+                await twin_cache.invalidate(_metadata_cache_key(lead_id))
+                blob = await self.blob_store.download(fresh_path)
+        return self._decode_blob(blob)
+    
+    def _decode_blob(self, blob: Optional[Tuple[bytes, Dict[str, str]]]) -> Optional[str]:
+        if blob is None:
+            return None
         
-        return None
+        # Blobs written before compression have no codec metadata and are plain UTF-8
+        data, blob_metadata = blob
+        return blob_codec.decode(data, blob_metadata.get("codec")).decode('utf-8')
     
-    async def get_digital_twin_with_metadata(self, lead_id: str) -> Optional[Dict[str, Any]]:
-        """Get both the markdown content and metadata for a digital twin"""
-        result = {}
+    async def _get_markdown_at(self, lead_id: str, blob_path: str) -> Optional[str]:
+        """Markdown through the cache, downloaded from exactly blob_path on a miss"""
+        cache_key = _markdown_cache_key(lead_id)
+        content, token = await twin_cache.lookup(cache_key)
+        if content is None:
+            content = self._decode_blob(await self.blob_store.download(blob_path))
+            await twin_cache.set(cache_key, content, token)
+        return content
+    
+    async def get_twin_bundle(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a digital twin's metadata and markdown together. Under the hash and flat layouts the blob path
+        follows from lead_id, so on a cache miss the metadata read and blob download run concurrently; a
+        twin stored elsewhere (not migrated yet) is then read again from its recorded blob_path. Date-layout
+        paths are only known from the metadata, so there the download follows the metadata read.
+        Returns None if neither exists.
+        """
+        derived_path = derived_blob_path(lead_id)
+        if derived_path is not None:
+            metadata, markdown = await asyncio.gather(
+                self.get_digital_twin_metadata(lead_id),
+                self._get_markdown_at(lead_id, derived_path)
+            )
+            if markdown is None and self._get_blob_path(lead_id, metadata) != derived_path:
+                markdown = await self.get_digital_twin(lead_id, metadata)
+        else:
+            metadata = await self.get_digital_twin_metadata(lead_id)
+            markdown = await self.get_digital_twin(lead_id, metadata or {})
+        if not metadata and not markdown:
+            return None
         
-        # Get metadata from Cosmos DB
-        if self.metadata_container:
-            query = "SELECT * FROM c WHERE c.id = @lead_id"
-            items = list(self.metadata_container.query_items(
-                query=query,
-                parameters=[{"name": "@lead_id", "value": lead_id}],
-                max_item_count=1,
-                enable_cross_partition_query=True
-            ))
+        return {
+            "lead_id": lead_id,
+            "metadata": metadata or {},
+            "markdown": markdown or "",
+        }
+    
+    async def get_many(self, lead_ids: List[str], include_markdown: bool = True,
+                       metadata: Optional[Sequence[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Get many digital twins at once. Metadata comes from batched store queries,
+        markdown from parallel blob downloads bounded by GET_MANY_DOWNLOAD_CONCURRENCY.
+        Full metadata documents the caller already has (e.g. from list_digital_twins(fields=None))
+        can be passed as `metadata`; those ids are not queried again.
+        Returns one entry per input id, in input order, with found=False for misses.
+        """
+        unique_ids = list(dict.fromkeys(lead_ids))
+        metadata_by_id: Dict[str, Dict[str, Any]] = {doc['id']: doc for doc in metadata or []}
+        
+        # Serve what we can from the cache, query the rest in batches
+        tokens = {}
+        for lead_id in unique_ids:
+            if lead_id in metadata_by_id:
+                continue
+            cached, token = await twin_cache.lookup(_metadata_cache_key(lead_id))
+            if cached is not None:
+                metadata_by_id[lead_id] = cached
+            else:
+                tokens[lead_id] = token
+        
+        if tokens:
+            for item in await self.metadata_store.get_many(list(tokens)):
+                metadata_by_id[item['id']] = item
+                await twin_cache.set(_metadata_cache_key(item['id']), item, tokens.get(item['id']))
+        
+        markdown_by_id: Dict[str, Optional[str]] = {}
+        if include_markdown:
+            semaphore = asyncio.Semaphore(GET_MANY_DOWNLOAD_CONCURRENCY)
+            
+            async def download(lead_id: str):
+                async with semaphore:
+                    markdown_by_id[lead_id] = await self.get_digital_twin(lead_id, metadata_by_id.get(lead_id, {}))
             
-            if items:
-                result['metadata'] = items[0]
+            await asyncio.gather(*(download(lead_id) for lead_id in unique_ids))
         
-        # Get markdown from blob storage
-        markdown = await self.get_digital_twin(lead_id)
-        if markdown:
-            result['markdown'] = markdown
+        results = []
+        for lead_id in lead_ids:
+            metadata = metadata_by_id.get(lead_id)
+            markdown = markdown_by_id.get(lead_id)
+            results.append({
+                "lead_id": lead_id,
+                "metadata": metadata,
+                "markdown": markdown,
+                "found": metadata is not None or markdown is not None,
+            })
+        return results
+    
+    async def get_digital_twin_with_metadata(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        """Get both the markdown content and metadata for a digital twin"""
+        bundle = await self.get_twin_bundle(lead_id)
+        if not bundle:
+            return None
         
-        return result if result else None
+        result = {}
+        if bundle['metadata']:
+            result['metadata'] = bundle['metadata']
+        if bundle['markdown']:
+            result['markdown'] = bundle['markdown']
+        return result
     
     async def get_digital_twin_metadata(self, lead_id: str) -> Optional[Dict[str, Any]]:
-        """Get only the metadata from Cosmos DB"""
-        if self.metadata_container:
-            query = "SELECT * FROM c WHERE c.id = @lead_id"
-            items = list(self.metadata_container.query_items(
-                query=query,
-                parameters=[{"name": "@lead_id", "value": lead_id}],
-                max_item_count=1,
-                enable_cross_partition_query=True
-            ))
-            
-            if items:
-                return items[0]
-        
-        return None
+        """Get only the metadata document"""
+        cache_key = _metadata_cache_key(lead_id)
+        metadata, token = await twin_cache.lookup(cache_key)
+        if metadata is None:
+            metadata = await self._read_metadata(lead_id)
+            await twin_cache.set(cache_key, metadata, token)
+        return metadata
+    
+    async def _read_metadata(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        # Uncached read, used by writers that must compare against the stored document
+        return await self.metadata_store.read(lead_id)
+    
+    async def find_by_input_hash(self, input_hash: str) -> Optional[Dict[str, Any]]:
+        """Get the metadata of the most recent twin created from the given inputs"""
+        return await self.metadata_store.find_by_input_hash(input_hash)
     
     async def list_digital_twins(self, classification: Optional[str] = None, 
-                                 limit: int = 100) -> List[Dict[str, Any]]:
-        """List digital twins combining data from Cosmos DB and blob storage"""
+                                 limit: int = 100, fields: Optional[Sequence[str]] = TWIN_LIST_FIELDS) -> List[Dict[str, Any]]:
+        """List the most recently updated digital twins, at most `limit` of them"""
+        page = await self.list_digital_twins_page(classification=classification, limit=limit, fields=fields)
+        return page["items"]
+    
+    async def list_digital_twins_page(self, classification: Optional[str] = None, limit: int = 100,
+                                      continuation_token: Optional[str] = None,
+                                      fields: Optional[Sequence[str]] = TWIN_LIST_FIELDS) -> Dict[str, Any]:
+        """
+        List one page of at most `limit` digital twins, newest first.
+        Pass the returned continuation_token back to get the next page; it is None on the last page.
+        Only `fields` are selected (the list card fields by default); pass None for full documents.
+        """
         results = []
+        next_token = None
         
-        if self.metadata_container:
-            # Query Cosmos DB for metadata
-            if classification:
-                query = "SELECT * FROM c WHERE c.lead_classification = @classification ORDER BY c.last_updated DESC"
-                parameters = [{"name": "@classification", "value": classification}]
-            else:
-                query = "SELECT * FROM c ORDER BY c.last_updated DESC"
-                parameters = []
-            
-            items = list(self.metadata_container.query_items(
-                query=query,
-                parameters=parameters,
-                max_item_count=limit,
-                enable_cross_partition_query=True
-            ))
+        if await self.metadata_store.available():
+            items, next_token = await self.metadata_store.list_page(classification, limit, continuation_token, fields)
             
             # For each item, optionally fetch the markdown content
             for item in items:
@@ -148,101 +323,95 @@ class ScalableDigitalTwinStorage:
                 
                 results.append(result_item)
         
-        return results
+        return {"items": results, "continuation_token": next_token}
     
     async def delete_digital_twin(self, lead_id: str) -> bool:
-        """Delete digital twin from both blob storage and Cosmos DB"""
+        """Delete digital twin from both the blob and metadata stores"""
         deleted = False
+        metadata = None
         
-        # Delete from blob storage
-        if self.blob_container:
-            blob_path = f"{lead_id}.md"
-            blob_client = self.blob_container.get_blob_client(blob_path)
-            try:
-                blob_client.delete_blob()
-                deleted = True
-            except:
-                pass
+        try:
+            # The stored document tells us which partition and blob path the twin lives in
+            metadata = await self._read_metadata(lead_id)
+        except Exception:
+            pass
         
-        # Delete from Cosmos DB
-        if self.metadata_container:
-            try:
-                # Need to get the item first to know the partition key
-                metadata = await self.get_digital_twin_metadata(lead_id)
-                if metadata:
-                    self.metadata_container.delete_item(
-                        item=lead_id,
-                        partition_key=metadata.get('partition_key')
-                    )
-                    deleted = True
-            except:
-                pass
+        try:
+            deleted = await self.blob_store.delete(self._get_blob_path(lead_id, metadata))
+        except Exception:
+            pass
+        
+        try:
+            if metadata:
+                await self.metadata_store.delete(lead_id, partition_key=metadata.get('partition_key'))
+                deleted = True
+        except Exception:
+            pass
         
+        await twin_cache.invalidate(_markdown_cache_key(lead_id), _metadata_cache_key(lead_id))
         return deleted
     
+    async def relocate_blob(self, lead_id: str, new_path: str) -> bool:
+        """
+        Move a twin's markdown to new_path: copy the blob, record the path (and the new metadata_hash)
+        in the metadata document, invalidate the cached copies, then delete the old blob. Readers follow
+        blob_path, so the twin stays readable throughout, and re-running after a failure completes the move.
+        Returns False if the twin has no metadata document or no blob at either path.
+        """
+        metadata = await self._read_metadata(lead_id)
+        if metadata is None:
+            return False
+        old_path = self._get_blob_path(lead_id, metadata)
+        if old_path == new_path:
+            return True
+        
+        blob = await self.blob_store.download(old_path)
+        if blob is None:
+            # A previous attempt may have copied the blob and died before updating the document
+            if not await self.blob_store.exists(new_path):
+                return False
+        else:
+            data, blob_metadata = blob
+            codec = blob_metadata.get("codec") or blob_codec.CODEC_NONE
+            await self.blob_store.upload(
+                new_path,
+                data,
+                metadata=blob_metadata,
+                content_type=blob_codec.content_type(codec, MARKDOWN_CONTENT_TYPE)
+            )
+        
+        metadata = {k: v for k, v in metadata.items() if not k.startswith('_')}
+        metadata['blob_path'] = new_path
+        metadata['metadata_hash'] = _compute_metadata_hash(metadata)
+        await self.metadata_store.upsert(metadata)
+        await twin_cache.invalidate(_markdown_cache_key(lead_id), _metadata_cache_key(lead_id))
+        
+        await self.blob_store.delete(old_path)
+        return True
+    
     async def update_classification(self, lead_id: str, new_classification: str) -> bool:
-        """Update the lead classification in Cosmos DB"""
-        if self.metadata_container:
-            try:
-                # Get existing metadata
-                metadata = await self.get_digital_twin_metadata(lead_id)
-                if metadata:
-                    # Update classification
-                    metadata['lead_classification'] = new_classification
-                    metadata['last_updated'] = datetime.utcnow().isoformat()
-                    
-                    # Upsert back to Cosmos DB
-                    self.metadata_container.upsert_item(metadata)
-                    return True
-            except Exception as e:
-                print(f"Error updating classification: {e}")
+        """Update the lead classification in the metadata store"""
+        try:
+            # Get existing metadata
+            metadata = await self._read_metadata(lead_id)
+            if metadata:
+                # Update classification
+                metadata['lead_classification'] = new_classification
+                metadata['last_updated'] = datetime.utcnow().isoformat()
+                metadata['metadata_hash'] = _compute_metadata_hash(metadata)
+                
+                await self.metadata_store.upsert(metadata)
+                await twin_cache.invalidate(_metadata_cache_key(lead_id))
+                return True
+        except Exception as e:
+            print(f"Error updating classification: {e}")
         
         return False
     
-    async def search_by_criteria(self, criteria: Dict[str, Any], limit: int = 100) -> List[Dict[str, Any]]:
-        """Search digital twins based on various criteria"""
-        if not self.metadata_container:
+    async def search_by_criteria(self, criteria: Dict[str, Any], limit: int = 100,
+                                 fields: Optional[Sequence[str]] = TWIN_LIST_FIELDS) -> List[Dict[str, Any]]:
+        """Search digital twins based on various criteria, returning at most `limit` projected documents"""
+        if not await self.metadata_store.available():
             return []
         
-        # Build dynamic query based on criteria
-        conditions = []
-        parameters = []
-        
-        if 'min_age' in criteria:
-            conditions.append("c.personal_information.age >= @min_age")
-            parameters.append({"name": "@min_age", "value": str(criteria['min_age'])})
-        
-        if 'max_age' in criteria:
-            conditions.append("c.personal_information.age <= @max_age")
-            parameters.append({"name": "@max_age", "value": str(criteria['max_age'])})
-        
-        if 'occupation' in criteria:
-            conditions.append("CONTAINS(c.personal_information.occupation, @occupation)")
-            parameters.append({"name": "@occupation", "value": criteria['occupation']})
-        
-        if 'location' in criteria:
-            conditions.append("CONTAINS(c.demographic_information.location, @location)")
-            parameters.append({"name": "@location", "value": criteria['location']})
-        
-        if 'marital_status' in criteria:
-            conditions.append("c.demographic_information.marital_status = @marital_status")
-            parameters.append({"name": "@marital_status", "value": criteria['marital_status']})
-        
-        if 'lead_classification' in criteria:
-            conditions.append("c.lead_classification = @lead_classification")
-            parameters.append({"name": "@lead_classification", "value": criteria['lead_classification']})
-        
-        # Build final query
-        if conditions:
-            query = f"SELECT * FROM c WHERE {' AND '.join(conditions)} ORDER BY c.last_updated DESC"
-        else:
-            query = "SELECT * FROM c ORDER BY c.last_updated DESC"
-        
-        items = list(self.metadata_container.query_items(
-            query=query,
-            parameters=parameters,
-            max_item_count=limit,
-            enable_cross_partition_query=True
-        ))
-        
-        return items
\ No newline at end of file
+        return await self.metadata_store.search(criteria, limit, fields)
\ No newline at end of file
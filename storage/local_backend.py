@@ -0,0 +1,574 @@
+"""
+Single-node storage backend: blobs in a sharded filesystem tree, twin metadata and QA sessions in SQLite.
+
+Everything lives under LOCAL_STORAGE_DIR:
+- blobs/<container>/<ab>/<cd>/<quoted name>.blob, sharded by the sha1 of the blob name so no directory
+  grows past a few thousand entries; each file is a JSON header line (metadata, content type) followed
+  by the raw bytes, and is replaced atomically
+- storage.db, a WAL-mode SQLite database; documents are stored as JSON next to indexed columns for the
+  fields that are filtered or sorted on, with FTS5 trigram tables for substring search when available
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+from storage.backends import BlobStore, QASessionStore, TwinMetadataStore
+from storage.pagination import InvalidContinuationToken, decode_continuation_token, encode_continuation_token
+
+LOCAL_STORAGE_DIR = os.getenv(
+    "LOCAL_STORAGE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "local_storage")
+)
+LOCAL_SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("LOCAL_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+_BLOB_SUFFIX = ".blob"
+
+
+def _project(doc: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    if not fields:
+        return doc
+    return {field: doc[field] for field in fields if field in doc}
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, container_name: str, root_dir: str = LOCAL_STORAGE_DIR):
+        self.container_name = container_name
+        self.container_dir = os.path.join(root_dir, "blobs", container_name)
+        os.makedirs(self.container_dir, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+        return os.path.join(self.container_dir, digest[:2], digest[2:4], quote(name, safe="") + _BLOB_SUFFIX)
+
+    def url(self, name: str) -> str:
+        return f"/local_blobs/{self.container_name}/{name}"
+
+    def write_sync(self, name: str, data: bytes, metadata: Optional[Dict[str, str]] = None,
+                   content_type: Optional[str] = None) -> None:
+        """Blocking upload; for callers already running off the event loop, such as SqliteQASessionStore"""
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = json.dumps({"metadata": metadata or {}, "content_type": content_type}).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header + b"\n")
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def read_with_content_type(self, name: str) -> Optional[Tuple[bytes, Dict[str, str], Optional[str]]]:
+        """Blocking read returning (data, metadata, content_type); used by the /local_blobs route"""
+        try:
+            with open(self._path(name), "rb") as f:
+                header = json.loads(f.readline())
+                return f.read(), header.get("metadata") or {}, header.get("content_type")
+        except FileNotFoundError:
+            return None
+
+    def delete_sync(self, name: str) -> bool:
+        """Blocking delete; returns False if the blob did not exist"""
+        try:
+            os.remove(self._path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _list(self, prefix: Optional[str]) -> List[Dict[str, Any]]:
+        blobs = []
+        for dir_path, _, filenames in os.walk(self.container_dir):
+            for filename in filenames:
+                if not filename.endswith(_BLOB_SUFFIX):
+                    continue
+                name = unquote(filename[:-len(_BLOB_SUFFIX)])
+                if prefix and not name.startswith(prefix):
+                    continue
+                path = os.path.join(dir_path, filename)
+                stat = os.stat(path)
+                with open(path, "rb") as f:
+                    header_size = len(f.readline())
+                blobs.append({
+                    "name": name,
+                    "size": stat.st_size - header_size,
+                    "last_modified": datetime.utcfromtimestamp(stat.st_mtime).isoformat()
+                })
+        return sorted(blobs, key=lambda blob: blob["name"])
+
+    async def available(self) -> bool:
+        return True
+
+    async def upload(self, name: str, data: bytes, metadata: Optional[Dict[str, str]] = None,
+                     content_type: Optional[str] = None) -> Optional[str]:
+        await asyncio.to_thread(self.write_sync, name, data, metadata, content_type)
+        return self.url(name)
+
+    async def download(self, name: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        result = await asyncio.to_thread(self.read_with_content_type, name)
+        if result is None:
+            return None
+        data, metadata, _ = result
+        return data, metadata
+
+    async def delete(self, name: str) -> bool:
+        return await asyncio.to_thread(self.delete_sync, name)
+
+    async def exists(self, name: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(name))
+
+    async def list(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._list, prefix)
+
+
+class SqliteDatabase:
+    """
+    One SQLite file shared by the local stores. Each thread gets its own connection (reads run
+    concurrently under WAL); writes are serialized by a process-wide lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self.write_lock = threading.Lock()
+        self.fts_enabled = self._check_fts()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=LOCAL_SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={LOCAL_SQLITE_BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
+
+    def _check_fts(self) -> bool:
+        try:
+            conn = sqlite3.connect(":memory:")
+            conn.execute("CREATE VIRTUAL TABLE t USING fts5(a, tokenize='trigram')")
+            conn.close()
+            return True
+        except sqlite3.OperationalError:
+            print("Warning: SQLite has no FTS5 trigram support, local text search falls back to substring scans")
+            return False
+
+    def transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(connection) in one write transaction and return its result"""
+        conn = self.connection()
+        with self.write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def write(self, statements: List[Tuple[str, Sequence[Any]]]):
+        """Run statements in one transaction"""
+        def run(conn):
+            for sql, params in statements:
+                conn.execute(sql, params)
+        self.transaction(run)
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return self.connection().execute(sql, params).fetchall()
+
+
+_database: Optional[SqliteDatabase] = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> SqliteDatabase:
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = SqliteDatabase(os.path.join(LOCAL_STORAGE_DIR, "storage.db"))
+        return _database
+
+
+class SqliteTwinMetadataStore(TwinMetadataStore):
+    def __init__(self):
+        self.db = get_database()
+        statements = [
+            ("""CREATE TABLE IF NOT EXISTS twin_metadata (
+                    id TEXT PRIMARY KEY,
+                    lead_classification TEXT,
+                    last_updated TEXT NOT NULL DEFAULT '',
+                    input_hash TEXT,
+                    doc TEXT NOT NULL
+                )""", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_twin_metadata_updated ON twin_metadata (last_updated DESC, id DESC)", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_twin_metadata_classification "
+             "ON twin_metadata (lead_classification, last_updated DESC, id DESC)", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_twin_metadata_input_hash ON twin_metadata (input_hash, last_updated DESC)", ()),
+        ]
+        if self.db.fts_enabled:
+            statements.append((
+                "CREATE VIRTUAL TABLE IF NOT EXISTS twin_metadata_fts "
+                "USING fts5(id UNINDEXED, persona_summary, occupation, location, tokenize='trigram')", ()
+            ))
+        self.db.write(statements)
+
+    def _upsert(self, doc: Dict[str, Any]):
+        statements = [(
+            "INSERT OR REPLACE INTO twin_metadata (id, lead_classification, last_updated, input_hash, doc) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (doc["id"], doc.get("lead_classification"), doc.get("last_updated") or "", doc.get("input_hash"),
+             json.dumps(doc, ensure_ascii=False))
+        )]
+        if self.db.fts_enabled:
+            statements.append(("DELETE FROM twin_metadata_fts WHERE id = ?", (doc["id"],)))
+            statements.append((
+                "INSERT INTO twin_metadata_fts (id, persona_summary, occupation, location) VALUES (?, ?, ?, ?)",
+                (doc["id"], doc.get("persona_summary") or "",
+                 str((doc.get("personal_information") or {}).get("occupation") or ""),
+                 str((doc.get("demographic_information") or {}).get("location") or ""))
+            ))
+        self.db.write(statements)
+
+    def _delete(self, lead_id: str) -> bool:
+        existed = bool(self.db.query("SELECT 1 FROM twin_metadata WHERE id = ?", (lead_id,)))
+        statements = [("DELETE FROM twin_metadata WHERE id = ?", (lead_id,))]
+        if self.db.fts_enabled:
+            statements.append(("DELETE FROM twin_metadata_fts WHERE id = ?", (lead_id,)))
+        self.db.write(statements)
+        return existed
+
+    def _select_docs(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        return [json.loads(row["doc"]) for row in self.db.query(sql, params)]
+
+    def _list_page(self, classification: Optional[str], limit: int, continuation_token: Optional[str],
+                   fields: Optional[Sequence[str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        conditions = []
+        params: List[Any] = []
+        if classification:
+            conditions.append("lead_classification = ?")
+            params.append(classification)
+
+        # Keyset pagination on (last_updated, id): a page costs the same however deep it is
+        cursor = decode_continuation_token(continuation_token)
+        if cursor is not None:
+            try:
+                last_updated, last_id = json.loads(cursor)
+            except (ValueError, TypeError) as e:
+                raise InvalidContinuationToken(f"Invalid continuation token: {e}")
+            conditions.append("(last_updated, id) < (?, ?)")
+            params.extend([last_updated, last_id])
+
+        sql = "SELECT id, last_updated, doc FROM twin_metadata"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        sql += " ORDER BY last_updated DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self.db.query(sql, params)
+        next_token = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_token = encode_continuation_token(json.dumps([last["last_updated"], last["id"]]))
+        return [_project(json.loads(row["doc"]), fields) for row in rows], next_token
+
+    def _text_condition(self, column: str, json_path: str, value: str, params: List[Any]) -> str:
+        # Trigram FTS only matches terms of at least three characters
+        if self.db.fts_enabled and len(value) >= 3:
+            params.append(f"{column} : {_fts_phrase(value)}")
+            return "id IN (SELECT id FROM twin_metadata_fts WHERE twin_metadata_fts MATCH ?)"
+        params.append(value)
+        return f"instr(json_extract(doc, '{json_path}'), ?) > 0"
+
+    def _search(self, criteria: Dict[str, Any], limit: int,
+                fields: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+        conditions = []
+        params: List[Any] = []
+
+        if 'min_age' in criteria:
+            conditions.append("CAST(json_extract(doc, '$.personal_information.age') AS INTEGER) >= ?")
+            params.append(int(criteria['min_age']))
+
+        if 'max_age' in criteria:
+            conditions.append("CAST(json_extract(doc, '$.personal_information.age') AS INTEGER) <= ?")
+            params.append(int(criteria['max_age']))
+
+        if 'occupation' in criteria:
+            conditions.append(self._text_condition(
+                "occupation", "$.personal_information.occupation", criteria['occupation'], params))
+
+        if 'location' in criteria:
+            conditions.append(self._text_condition(
+                "location", "$.demographic_information.location", criteria['location'], params))
+
+        if 'marital_status' in criteria:
+            conditions.append("json_extract(doc, '$.demographic_information.marital_status') = ?")
+            params.append(criteria['marital_status'])
+
+        if 'lead_classification' in criteria:
+            conditions.append("lead_classification = ?")
+            params.append(criteria['lead_classification'])
+
+        sql = "SELECT doc FROM twin_metadata"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        sql += " ORDER BY last_updated DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return [_project(doc, fields) for doc in self._select_docs(sql, params)]
+
+    def _get_many(self, lead_ids: List[str]) -> List[Dict[str, Any]]:
+        items = []
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(lead_ids), 500):
+            batch = lead_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            items.extend(self._select_docs(f"SELECT doc FROM twin_metadata WHERE id IN ({placeholders})", batch))
+        return items
+
+    def _read(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        docs = self._select_docs("SELECT doc FROM twin_metadata WHERE id = ?", (lead_id,))
+        return docs[0] if docs else None
+
+    def _find_by_input_hash(self, input_hash: str) -> Optional[Dict[str, Any]]:
+        docs = self._select_docs(
+            "SELECT doc FROM twin_metadata WHERE input_hash = ? ORDER BY last_updated DESC LIMIT 1", (input_hash,))
+        return docs[0] if docs else None
+
+    async def available(self) -> bool:
+        return True
+
+    async def read(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, lead_id)
+
+    async def upsert(self, doc: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._upsert, doc)
+
+    async def delete(self, lead_id: str, partition_key: Optional[str] = None) -> bool:
+        # SQLite has no partitions; a twin has exactly one row
+        return await asyncio.to_thread(self._delete, lead_id)
+
+    async def find_by_input_hash(self, input_hash: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._find_by_input_hash, input_hash)
+
+    async def get_many(self, lead_ids: List[str]) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_many, lead_ids)
+
+    async def list_page(self, classification: Optional[str], limit: int, continuation_token: Optional[str],
+                        fields: Optional[Sequence[str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await asyncio.to_thread(self._list_page, classification, limit, continuation_token, fields)
+
+    async def search(self, criteria: Dict[str, Any], limit: int,
+                     fields: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._search, criteria, limit, fields)
+
+
+class SqliteQASessionStore(QASessionStore):
+    # Columns list queries may sort on; anything else falls back to created_at
+    SORTABLE_COLUMNS = ("created_at", "updated_at", "completed_at", "status")
+
+    def __init__(self):
+        self.db = get_database()
+        self.images = LocalBlobStore("qa-images")
+        statements = [
+            ("""CREATE TABLE IF NOT EXISTS qa_sessions (
+                    id TEXT PRIMARY KEY,
+                    status TEXT,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    completed_at TEXT,
+                    question TEXT,
+                    doc TEXT NOT NULL
+                )""", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_qa_sessions_created ON qa_sessions (created_at)", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_qa_sessions_status ON qa_sessions (status, created_at)", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_qa_sessions_updated ON qa_sessions (updated_at)", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_qa_sessions_completed ON qa_sessions (completed_at)", ()),
+            ("""CREATE TABLE IF NOT EXISTS qa_responses (
+                    id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    answered_at TEXT NOT NULL,
+                    doc TEXT NOT NULL
+                )""", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_qa_responses_session ON qa_responses (session_id, answered_at)", ()),
+            # Prospect membership, the local counterpart of the indexed prospect_ids array
+            ("""CREATE TABLE IF NOT EXISTS qa_session_prospects (
+                    prospect_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    PRIMARY KEY (prospect_id, session_id)
+                ) WITHOUT ROWID""", ()),
+            ("CREATE INDEX IF NOT EXISTS ix_qa_session_prospects_session ON qa_session_prospects (session_id)", ()),
+            # Sessions stored before the table existed
+            ("""INSERT OR IGNORE INTO qa_session_prospects (prospect_id, session_id)
+                SELECT json_extract(p.value, '$.lead_id'), s.id
+                FROM qa_sessions s, json_each(s.doc, '$.target_prospects') p
+                WHERE s.id NOT IN (SELECT session_id FROM qa_session_prospects)
+                  AND json_extract(p.value, '$.lead_id') IS NOT NULL""", ()),
+        ]
+        if self.db.fts_enabled:
+            statements.append((
+                "CREATE VIRTUAL TABLE IF NOT EXISTS qa_sessions_fts USING fts5(id UNINDEXED, question, tokenize='trigram')",
+                ()
+            ))
+        self.db.write(statements)
+
+    def _row_statements(self, doc: Dict[str, Any], verb: str) -> List[Tuple[str, Sequence[Any]]]:
+        # Every write gets a new _etag, mirroring Cosmos, so replace() can detect concurrent writers
+        doc["_etag"] = uuid.uuid4().hex
+        statements = [(
+            f"{verb} INTO qa_sessions (id, status, created_at, updated_at, completed_at, question, doc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (doc["id"], doc.get("status"), doc.get("created_at"), doc.get("updated_at"), doc.get("completed_at"),
+             doc.get("question"), json.dumps(doc, ensure_ascii=False))
+        )]
+        statements.append(("DELETE FROM qa_session_prospects WHERE session_id = ?", (doc["id"],)))
+        prospect_ids = doc.get("prospect_ids") or [p.get("lead_id") for p in doc.get("target_prospects") or []]
+        statements.extend(
+            ("INSERT OR IGNORE INTO qa_session_prospects (prospect_id, session_id) VALUES (?, ?)",
+             (prospect_id, doc["id"]))
+            for prospect_id in prospect_ids if prospect_id
+        )
+        if self.db.fts_enabled:
+            statements.append(("DELETE FROM qa_sessions_fts WHERE id = ?", (doc["id"],)))
+            statements.append(("INSERT INTO qa_sessions_fts (id, question) VALUES (?, ?)",
+                               (doc["id"], doc.get("question") or "")))
+        return statements
+
+    def available(self) -> bool:
+        return True
+
+    def create(self, doc: Dict[str, Any]) -> None:
+        self.db.write(self._row_statements(doc, "INSERT"))
+
+    def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.query("SELECT doc FROM qa_sessions WHERE id = ?", (session_id,))
+        return json.loads(rows[0]["doc"]) if rows else None
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        self.db.write(self._row_statements(doc, "INSERT OR REPLACE"))
+
+    def patch(self, session_id: str, set_fields: Optional[Dict[str, Any]] = None,
+              increments: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+        def apply(conn):
+            row = conn.execute("SELECT doc FROM qa_sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            doc = json.loads(row["doc"])
+            doc.update(set_fields or {})
+            for field, value in (increments or {}).items():
+                doc[field] = (doc.get(field) or 0) + value
+            for sql, params in self._row_statements(doc, "INSERT OR REPLACE"):
+                conn.execute(sql, params)
+            return doc
+        return self.db.transaction(apply)
+
+    def delete(self, session_id: str) -> None:
+        statements = [
+            ("DELETE FROM qa_sessions WHERE id = ?", (session_id,)),
+            ("DELETE FROM qa_responses WHERE session_id = ?", (session_id,)),
+            ("DELETE FROM qa_session_prospects WHERE session_id = ?", (session_id,)),
+        ]
+        if self.db.fts_enabled:
+            statements.append(("DELETE FROM qa_sessions_fts WHERE id = ?", (session_id,)))
+        self.db.write(statements)
+
+    def replace(self, doc: Dict[str, Any], etag: str) -> bool:
+        def apply(conn):
+            row = conn.execute("SELECT doc FROM qa_sessions WHERE id = ?", (doc["id"],)).fetchone()
+            if row is None or json.loads(row["doc"]).get("_etag") != etag:
+                return False
+            for sql, params in self._row_statements(doc, "INSERT OR REPLACE"):
+                conn.execute(sql, params)
+            return True
+        return self.db.transaction(apply)
+
+    def add_responses(self, session_id: str, docs: List[Dict[str, Any]]) -> None:
+        self.db.write([
+            (
+                "INSERT OR REPLACE INTO qa_responses (id, session_id, answered_at, doc) VALUES (?, ?, ?, ?)",
+                (doc["id"], session_id, doc["answered_at"],
+                 json.dumps({**doc, "session_id": session_id}, ensure_ascii=False))
+            )
+            for doc in docs
+        ])
+
+    def list_responses(self, session_id: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT doc FROM qa_responses WHERE session_id = ?"
+        params: List[Any] = [session_id]
+        if since:
+            sql += " AND answered_at > ?"
+            params.append(since)
+        sql += " ORDER BY answered_at ASC"
+        return [json.loads(row["doc"]) for row in self.db.query(sql, params)]
+
+    def _where_clause(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        conditions = []
+        params: List[Any] = []
+
+        status_values = filters.get('status_values')
+        if status_values:
+            conditions.append(f"status IN ({','.join('?' * len(status_values))})")
+            params.extend(status_values)
+
+        if filters.get('prospect_id'):
+            conditions.append("id IN (SELECT session_id FROM qa_session_prospects WHERE prospect_id = ?)")
+            params.append(filters['prospect_id'])
+
+        if filters.get('date_from'):
+            conditions.append("created_at >= ?")
+            params.append(filters['date_from'])
+
+        if filters.get('date_to'):
+            conditions.append("created_at <= ?")
+            params.append(filters['date_to'])
+
+        search_query = filters.get('search_query')
+        if search_query:
+            if self.db.fts_enabled and len(search_query) >= 3:
+                conditions.append("id IN (SELECT id FROM qa_sessions_fts WHERE qa_sessions_fts MATCH ?)")
+                params.append(f"question : {_fts_phrase(search_query)}")
+            else:
+                conditions.append("instr(LOWER(question), LOWER(?)) > 0")
+                params.append(search_query)
+
+        return (f" WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+    def query(self, filters: Dict[str, Any], sort_by: str = "created_at", sort_order: str = "desc",
+              fields: Optional[Sequence[str]] = None, offset: int = 0,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        where, params = self._where_clause(filters)
+        sort_column = sort_by if sort_by in self.SORTABLE_COLUMNS else "created_at"
+        sort_direction = "DESC" if sort_order == "desc" else "ASC"
+
+        sql = f"SELECT doc FROM qa_sessions{where} ORDER BY {sort_column} {sort_direction}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+
+        return [_project(json.loads(row["doc"]), fields) for row in self.db.query(sql, params)]
+
+    def count(self, filters: Dict[str, Any]) -> int:
+        where, params = self._where_clause(filters)
+        return self.db.query(f"SELECT COUNT(*) AS n FROM qa_sessions{where}", params)[0]["n"]
+
+    def save_image(self, blob_name: str, data: bytes, content_type: str) -> Optional[str]:
+        self.images.write_sync(blob_name, data, content_type=content_type)
+        return self.images.url(blob_name)
+
+    def delete_image(self, blob_name: str) -> None:
+        self.images.delete_sync(blob_name)
@@ -0,0 +1,122 @@
+"""
+Move existing digital twin markdown blobs to the TWIN_BLOB_LAYOUT paths (see storage/blob_layout.py).
+
+For each metadata document whose blob_path differs from its target path, ScalableDigitalTwinStorage.
+relocate_blob copies the blob to the new path, updates the document's blob_path, and deletes the old
+blob. Readers follow blob_path, so a twin is readable at every step. Under the date layout twins are
+dated by their last_updated timestamp.
+
+The job walks the metadata in pages and records the continuation token of the last finished page in
+a checkpoint file, so an interrupted run resumes where it stopped. Twins already at their target path
+are skipped, so re-running is safe.
+
+Usage: python -m storage.migrate_blob_layout [--dry-run] [--concurrency 16] [--checkpoint FILE] [--restart]
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict
+
+from storage.azure_config import azure_config
+from storage.blob_layout import TWIN_BLOB_LAYOUT, flat_blob_path, twin_blob_path
+from storage.digital_twin_storage import ScalableDigitalTwinStorage
+
+DEFAULT_CHECKPOINT = ".blob_layout_migration.json"
+PAGE_SIZE = 200
+
+
+def _target_path(doc: Dict[str, Any]) -> str:
+    try:
+        when = datetime.fromisoformat(doc["last_updated"])
+    except (KeyError, TypeError, ValueError):
+        when = None
+    return twin_blob_path(doc["id"], when)
+
+
+def _new_checkpoint() -> Dict[str, Any]:
+    return {"continuation_token": None, "counts": {"migrated": 0, "skipped": 0, "missing": 0, "failed": 0}}
+
+
+def _load_checkpoint(path: str) -> Dict[str, Any]:
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        print(f"Resuming from {path}: {checkpoint['counts']}")
+        return checkpoint
+    return _new_checkpoint()
+
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+async def _migrate_twin(storage: ScalableDigitalTwinStorage, doc: Dict[str, Any], dry_run: bool) -> str:
+    lead_id = doc["id"]
+    old_path = doc.get("blob_path") or flat_blob_path(lead_id)
+    new_path = _target_path(doc)
+    if old_path == new_path:
+        return "skipped"
+    if dry_run:
+        print(f"Would move {lead_id}: {old_path} -> {new_path}")
+        return "migrated"
+
+    if not await storage.relocate_blob(lead_id, new_path):
+        print(f"No blob found for {lead_id} at {old_path}")
+        return "missing"
+    return "migrated"
+
+
+async def migrate(dry_run: bool = False, concurrency: int = 16, checkpoint_path: str = DEFAULT_CHECKPOINT,
+                  restart: bool = False) -> Dict[str, int]:
+    await azure_config.open_async_clients()
+    try:
+        storage = ScalableDigitalTwinStorage()
+        if not await storage.blob_store.available() or not await storage.metadata_store.available():
+            raise RuntimeError("Blob and metadata storage must both be configured")
+
+        checkpoint = _new_checkpoint() if restart or dry_run else _load_checkpoint(checkpoint_path)
+        counts = checkpoint["counts"]
+        semaphore = asyncio.Semaphore(concurrency)
+        print(f"Migrating twin blobs to the '{TWIN_BLOB_LAYOUT}' layout")
+
+        async def migrate_one(doc):
+            async with semaphore:
+                try:
+                    counts[await _migrate_twin(storage, doc, dry_run)] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    print(f"Failed to migrate {doc.get('id')}: {e}")
+
+        token = checkpoint["continuation_token"]
+        while True:
+            docs, token = await storage.metadata_store.list_page(None, PAGE_SIZE, token, ("id", "blob_path", "last_updated"))
+            await asyncio.gather(*(migrate_one(doc) for doc in docs))
+            if not dry_run:
+                checkpoint["continuation_token"] = token
+                _save_checkpoint(checkpoint_path, checkpoint)
+            print(f"Progress: {counts}")
+            if not token:
+                break
+
+        if not dry_run:
+            os.remove(checkpoint_path)
+        print(f"Blob layout migration {'dry run ' if dry_run else ''}finished: {counts}")
+        return counts
+    finally:
+        await azure_config.close_async_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move digital twin blobs to the configured TWIN_BLOB_LAYOUT")
+    parser.add_argument("--dry-run", action="store_true", help="List the blobs that would move without changing them")
+    parser.add_argument("--concurrency", type=int, default=16, help="Twins moved in parallel")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="File recording progress for resuming")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start from the beginning")
+    args = parser.parse_args()
+    asyncio.run(migrate(dry_run=args.dry_run, concurrency=args.concurrency,
+                        checkpoint_path=args.checkpoint, restart=args.restart))
@@ -0,0 +1,71 @@
+"""
+Add the prospect_ids array to QA sessions created before create_session wrote it, so the
+ARRAY_CONTAINS prospect filter of list_sessions finds them.
+
+Each session gets a single patch operation setting prospect_ids from its target_prospects. Only
+sessions without the field are selected, so the tool can be re-run after a failure. The local SQLite
+backend fills its prospect table on startup and needs no migration.
+
+Usage: python -m storage.migrate_session_prospect_ids [--dry-run] [--concurrency 16]
+"""
+import argparse
+import asyncio
+from typing import Any, Dict
+
+from storage.azure_backend import SESSION_DOC_TYPE
+from storage.azure_config import azure_config
+from utils.async_helper import for_each_bounded
+
+
+async def _migrate_session(sessions_container, doc: Dict[str, Any], dry_run: bool) -> None:
+    session_id = doc["id"]
+    prospect_ids = list(dict.fromkeys(
+        p["lead_id"] for p in doc.get("target_prospects") or [] if p.get("lead_id")
+    ))
+    if dry_run:
+        print(f"Would set prospect_ids of {session_id}: {prospect_ids}")
+        return
+
+    await sessions_container.patch_item(
+        item=session_id,
+        partition_key=session_id,
+        patch_operations=[{"op": "set", "path": "/prospect_ids", "value": prospect_ids}]
+    )
+
+
+async def migrate(dry_run: bool = False, concurrency: int = 16) -> Dict[str, int]:
+    await azure_config.open_async_clients()
+    try:
+        sessions_container = await azure_config.get_async_cosmos_container_client("qa_sessions")
+        if not sessions_container:
+            raise RuntimeError("Cosmos DB is not configured (COSMOS_ENDPOINT / COSMOS_KEY)")
+
+        counts = {"migrated": 0, "failed": 0}
+
+        async def migrate_one(doc):
+            try:
+                await _migrate_session(sessions_container, doc, dry_run)
+                counts["migrated"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"Failed to migrate {doc.get('id')}: {e}")
+
+        query = (
+            "SELECT c.id, c.target_prospects FROM c "
+            "WHERE (NOT IS_DEFINED(c.doc_type) OR c.doc_type = @session_doc_type) AND NOT IS_DEFINED(c.prospect_ids)"
+        )
+        parameters = [{"name": "@session_doc_type", "value": SESSION_DOC_TYPE}]
+        await for_each_bounded(sessions_container.query_items(query=query, parameters=parameters), migrate_one, concurrency)
+
+        print(f"Session prospect_ids migration {'dry run ' if dry_run else ''}finished: {counts}")
+        return counts
+    finally:
+        await azure_config.close_async_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill prospect_ids on QA sessions")
+    parser.add_argument("--dry-run", action="store_true", help="List the sessions that would change without patching them")
+    parser.add_argument("--concurrency", type=int, default=16, help="Sessions patched in parallel")
+    args = parser.parse_args()
+    asyncio.run(migrate(dry_run=args.dry_run, concurrency=args.concurrency))
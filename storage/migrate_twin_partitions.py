@@ -0,0 +1,64 @@
+"""
+Rewrite digital twin metadata documents saved under the old month partitions ('2025-01', ...)
+so their partition_key is derived from lead_id and they can be fetched with point reads.
+
+Each document is upserted under its new partition and the old copy is deleted. The tool is
+idempotent: documents already under their own key are skipped, so it can be re-run after a failure.
+
+Usage: python -m storage.migrate_twin_partitions [--dry-run] [--concurrency 16]
+"""
+import argparse
+import asyncio
+from typing import Any, Dict
+
+from storage.azure_config import azure_config
+from storage.digital_twin_storage import get_partition_key
+from utils.async_helper import for_each_bounded
+
+
+async def _migrate_document(metadata_container, doc: Dict[str, Any], dry_run: bool) -> None:
+    lead_id = doc["id"]
+    old_partition_key = doc.get("partition_key")
+    if dry_run:
+        print(f"Would move {lead_id}: {old_partition_key} -> {get_partition_key(lead_id)}")
+        return
+
+    new_doc = {k: v for k, v in doc.items() if not k.startswith('_')}
+    new_doc["partition_key"] = get_partition_key(lead_id)
+    await metadata_container.upsert_item(new_doc)
+    await metadata_container.delete_item(item=lead_id, partition_key=old_partition_key)
+
+
+async def migrate(dry_run: bool = False, concurrency: int = 16) -> Dict[str, int]:
+    await azure_config.open_async_clients()
+    try:
+        metadata_container = await azure_config.get_async_cosmos_container_client("metadata")
+        if not metadata_container:
+            raise RuntimeError("Cosmos DB is not configured (COSMOS_ENDPOINT / COSMOS_KEY)")
+
+        counts = {"migrated": 0, "failed": 0}
+
+        async def migrate_one(doc):
+            try:
+                await _migrate_document(metadata_container, doc, dry_run)
+                counts["migrated"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"Failed to migrate {doc.get('id')}: {e}")
+
+        # Only documents whose partition_key is not their own id still need to move
+        query = "SELECT * FROM c WHERE c.partition_key != c.id"
+        await for_each_bounded(metadata_container.query_items(query=query), migrate_one, concurrency)
+
+        print(f"Partition migration {'dry run ' if dry_run else ''}finished: {counts}")
+        return counts
+    finally:
+        await azure_config.close_async_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move digital twin metadata to lead_id partitions")
+    parser.add_argument("--dry-run", action="store_true", help="List the documents that would move without changing them")
+    parser.add_argument("--concurrency", type=int, default=16, help="Documents rewritten in parallel")
+    args = parser.parse_args()
+    asyncio.run(migrate(dry_run=args.dry_run, concurrency=args.concurrency))
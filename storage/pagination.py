@@ -0,0 +1,45 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class InvalidContinuationToken(ValueError):
+    pass
+
+
+def encode_continuation_token(cosmos_token: Optional[str]) -> Optional[str]:
+    """Wrap a Cosmos continuation token into an opaque, URL-safe string for API clients"""
+    if not cosmos_token:
+        return None
+    return base64.urlsafe_b64encode(json.dumps({"c": cosmos_token}).encode("utf-8")).decode("ascii")
+
+
+def decode_continuation_token(token: Optional[str]) -> Optional[str]:
+    """Inverse of encode_continuation_token; raises InvalidContinuationToken for tokens we did not issue"""
+    if not token:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")))["c"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidContinuationToken(f"Invalid continuation token: {e}")
+
+
+async def query_page(container, query: str, parameters: List[Dict[str, Any]], page_size: int,
+                     continuation_token: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch a single page of an async Cosmos query.
+    Returns (items, continuation token for the next page or None when the query is exhausted).
+    """
+    pager = container.query_items(
+        query=query,
+        parameters=parameters,
+        max_item_count=page_size
+    ).by_page(decode_continuation_token(continuation_token))
+
+    try:
+        page = await pager.__anext__()
+    except StopAsyncIteration:
+        return [], None
+
+    items = [item async for item in page]
+    return items, encode_continuation_token(pager.continuation_token)
@@ -1,13 +1,13 @@
+import asyncio
 import os
 from typing import Optional, Dict, Any, Tuple
 from PIL import Image
 import io
-from azure.storage.blob import ContentSettings
-from storage.azure_config import azure_config
+from storage.backends import get_blob_store
 
 class PersonaImageStorage:
     def __init__(self):
-        self.blob_container = azure_config.get_blob_container_client("persona-images")
+        self.blob_store = get_blob_store("persona-images")
         self.local_fallback_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
                                                "agent_dojo", "persona_photographs")
         
@@ -37,6 +37,7 @@ class PersonaImageStorage:
     async def save_persona_image(self, lead_id: str, image_bytes: bytes) -> Dict[str, str]:
         paths = self._get_image_paths(lead_id)
         urls = {}
+        blob_available = await self.blob_store.available()
         
         sizes = {
             "icon": (64, 64),
@@ -47,25 +48,19 @@ class PersonaImageStorage:
         
         for size_name, size in sizes.items():
             if size:
-                resized_bytes = self._resize_image(image_bytes, size)
+                # Resizing is CPU bound, keep it off the event loop
+                resized_bytes = await asyncio.to_thread(self._resize_image, image_bytes, size)
             else:
                 resized_bytes = image_bytes
             
-            if self.blob_container:
-                blob_path = paths[size_name]
-                blob_client = self.blob_container.get_blob_client(blob_path)
-                blob_client.upload_blob(
-                    resized_bytes, 
-                    overwrite=True,
-                    content_settings=ContentSettings(content_type="image/jpeg")
-                )
-                urls[size_name] = blob_client.url
+            if blob_available:
+                urls[size_name] = await self.blob_store.upload(paths[size_name], resized_bytes, content_type="image/jpeg")
             
             #local_path = os.path.join(self.local_fallback_dir, f"{lead_id}_{size_name}.jpeg")
             #with open(local_path, 'wb') as f:
             #    f.write(resized_bytes)
             
-            if not self.blob_container:
+            if not blob_available:
                 urls[size_name] = f"/persona_image_{size_name}/{lead_id}"
         
         return urls
@@ -84,10 +79,11 @@ class PersonaImageStorage:
         paths = self._get_image_paths(lead_id)
         blob_path = paths.get(size_map[size])
         
-        if self.blob_container and blob_path:
+        if blob_path and await self.blob_store.available():
             try:
-                blob_client = self.blob_container.get_blob_client(blob_path)
-                return blob_client.download_blob().readall()
+                blob = await self.blob_store.download(blob_path)
+                if blob is not None:
+                    return blob[0]
             except Exception:
                 pass
 
@@ -106,12 +102,11 @@ class PersonaImageStorage:
         paths = self._get_image_paths(lead_id)
         deleted = False
         
-        if self.blob_container:
+        if await self.blob_store.available():
             for blob_path in paths.values():
                 try:
-                    blob_client = self.blob_container.get_blob_client(blob_path)
-                    blob_client.delete_blob()
-                    deleted = True
+                    if await self.blob_store.delete(blob_path):
+                        deleted = True
                 except Exception:
                     pass
         
@@ -130,11 +125,10 @@ class PersonaImageStorage:
     async def image_exists(self, lead_id: str) -> bool:
         paths = self._get_image_paths(lead_id)
         
-        if self.blob_container:
+        if await self.blob_store.available():
             try:
-                blob_client = self.blob_container.get_blob_client(paths["full"])
-                blob_client.get_blob_properties()
-                return True
+                if await self.blob_store.exists(paths["full"]):
+                    return True
             except Exception:
                 pass
 
@@ -144,17 +138,16 @@ class PersonaImageStorage:
     async def list_persona_images(self, prefix: Optional[str] = None) -> list:
         images = []
         
-        if self.blob_container:
+        if await self.blob_store.available():
             try:
-                blobs = self.blob_container.list_blobs(name_starts_with=prefix)
-                for blob in blobs:
-                    if blob.name.endswith('/full.jpeg'):
-                        lead_id = blob.name.split('/')[0]
+                for blob in await self.blob_store.list(prefix):
+                    if blob["name"].endswith('/full.jpeg'):
+                        lead_id = blob["name"].split('/')[0]
                         images.append({
                             "lead_id": lead_id,
-                            "blob_name": blob.name,
-                            "size": blob.size,
-                            "last_modified": blob.last_modified.isoformat() if blob.last_modified else None
+                            "blob_name": blob["name"],
+                            "size": blob["size"],
+                            "last_modified": blob["last_modified"]
                         })
             except Exception as e:
                 print(f"Error listing blobs: {e}")
@@ -1,8 +1,9 @@
 import json
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
-from storage.azure_config import azure_config
+from storage.backends import get_qa_session_store
+from storage.query_builder import QA_SESSION_LIST_FIELDS
 from models.qa_models import (
     QuestionSession, ProspectResponse, SessionSummary,
     SessionStatus, PersonaBase
@@ -10,24 +11,21 @@ from models.qa_models import (
 import base64
 import io
 
+# Columns list_sessions may order by; anything else falls back to created_at
+SESSION_SORT_FIELDS = ("created_at", "updated_at", "completed_at", "status")
+ACTIVE_STATUSES = [SessionStatus.PENDING.value, SessionStatus.IN_PROGRESS.value]
+
+def _to_utc_iso(timestamp: datetime) -> str:
+    """ISO form of a timestamp as stored on records (naive UTC), so string comparison orders correctly"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.isoformat()
+
 
 class QASessionStorage:
     def __init__(self):
-        self.cosmos_client = azure_config.get_cosmos_container_client("qa_sessions")
-        self.blob_container = azure_config.get_blob_container_client("qa-images")
-        self._ensure_container_exists()
-
-    def _ensure_container_exists(self):
-        """Ensure QA sessions container exists in Cosmos DB"""
-        try:
-            if azure_config.cosmos_client:
-                database = azure_config.cosmos_client.get_database_client("mirai-lms")
-                database.create_container_if_not_exists(
-                    id="qa_sessions",
-                    partition_key={"paths": ["/session_id"], "kind": "Hash"}
-                )
-        except Exception as e:
-            print(f"Error ensuring QA sessions container exists: {e}")
+        # Cosmos DB or local SQLite, depending on STORAGE_BACKEND
+        self.store = get_qa_session_store()
 
     def create_session(
         self,
@@ -62,16 +60,18 @@ class QASessionStorage:
             error_message=None
         )
 
-        # Store in Cosmos DB
+        # Store the session document
         session_dict = session.model_dump(mode='json')
         session_dict['id'] = session_id
         session_dict['partition_key'] = session_id
         session_dict['context'] = context or {}
+        # Denormalized for indexed per-prospect lookups (ARRAY_CONTAINS) in list_sessions
+        session_dict['prospect_ids'] = list(dict.fromkeys(p.lead_id for p in target_prospects))
 
         try:
-            self.cosmos_client.create_item(body=session_dict)
+            self.store.create(session_dict)
         except Exception as e:
-            print(f"Error creating session in Cosmos DB: {e}")
+            print(f"Error creating session: {e}")
             raise
 
         return session
@@ -87,92 +87,119 @@ class QASessionStorage:
             blob_name = f"qa-sessions/{session_id}/image.{extension}"
 
             # Upload to blob storage
-            blob_client = self.blob_container.get_blob_client(blob_name)
-            blob_client.upload_blob(
-                data=image_data,
-                overwrite=True,
-                content_settings={"content_type": mime_type}
-            )
-
-            return blob_client.url
+            return self.store.save_image(blob_name, image_data, mime_type)
         except Exception as e:
             print(f"Error uploading session image: {e}")
             return None
 
     def get_session(self, session_id: str) -> Optional[QuestionSession]:
-        """Get a Q&A session by ID"""
+        """Get a Q&A session by ID, with its responses"""
         try:
-            item = self.cosmos_client.read_item(
-                item=session_id,
-                partition_key=session_id
-            )
-            return QuestionSession(**item)
+            item = self.store.read(session_id)
+            if not item:
+                return None
+            return QuestionSession(**{**item, "responses": self._load_responses(item)})
         except Exception as e:
             print(f"Error getting session: {e}")
             return None
 
+    def _load_responses(self, item: Dict[str, Any], since_timestamp: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Response records of a session, plus the ones embedded in sessions written before records existed"""
+        since = _to_utc_iso(since_timestamp) if since_timestamp else None
+        responses = self.store.list_responses(item['session_id'], since)
+
+        embedded = item.get('responses') or []
+        if embedded:
+            if since:
+                embedded = [r for r in embedded if r.get('answered_at', '') > since]
+            responses = sorted(embedded + responses, key=lambda r: r.get('answered_at', ''))
+        return responses
+
     def update_session_status(self, session_id: str, status: SessionStatus, error_message: Optional[str] = None):
         """Update session status"""
         try:
-            session = self.get_session(session_id)
-            if session:
-                session.status = status
-                session.updated_at = datetime.utcnow()
-                if status == SessionStatus.COMPLETED:
-                    session.completed_at = datetime.utcnow()
-                if error_message:
-                    session.error_message = error_message
-
-                self._update_session(session)
+            now = datetime.utcnow().isoformat()
+            fields = {"status": status.value, "updated_at": now}
+            if status == SessionStatus.COMPLETED:
+                fields["completed_at"] = now
+            if error_message:
+                fields["error_message"] = error_message
+
+            self.store.patch(session_id, fields)
         except Exception as e:
             print(f"Error updating session status: {e}")
 
     def add_response(self, session_id: str, response: ProspectResponse):
-        """Add a response to a session"""
+        """
+        Add a response to a session. The response is stored as its own record and the session's
+        counter is incremented in place, so concurrent responses neither rewrite nor overwrite the session.
+        """
         try:
-            session = self.get_session(session_id)
-            if session:
-                session.responses.append(response)
-                session.total_responded = len(session.responses)
-
-                # Update status to in_progress if first response
-                if session.status == SessionStatus.PENDING:
-                    session.status = SessionStatus.IN_PROGRESS
-
-                session.updated_at = datetime.utcnow()
-
-                # Check if all responses received
-                if session.total_responded >= session.total_expected:
-                    session.status = SessionStatus.COMPLETED
-                    session.completed_at = datetime.utcnow()
+            self.store.add_responses(session_id, [self.make_response_record(session_id, response)])
 
-                self._update_session(session)
+            now = datetime.utcnow().isoformat()
+            session = self.store.patch(session_id, {"updated_at": now}, {"total_responded": 1})
+            if not session:
+                return
+
+            # Check if all responses received, otherwise move to in_progress on the first one
+            if session['total_responded'] >= session['total_expected']:
+                if session['status'] != SessionStatus.COMPLETED.value:
+                    self.store.patch(session_id, {"status": SessionStatus.COMPLETED.value, "completed_at": now})
+            elif session['status'] == SessionStatus.PENDING.value:
+                self.store.patch(session_id, {"status": SessionStatus.IN_PROGRESS.value})
         except Exception as e:
             print(f"Error adding response: {e}")
 
+    def make_response_record(self, session_id: str, response: ProspectResponse) -> Dict[str, Any]:
+        """Response record with its id assigned, so writing it again replaces rather than duplicates it"""
+        record = response.model_dump(mode='json')
+        record['id'] = f"{session_id}-{uuid.uuid4().hex[:12]}"
+        return record
+
+    def apply_updates(
+        self,
+        session_id: str,
+        fields: Dict[str, Any],
+        response_records: List[Dict[str, Any]],
+        responded_delta: int = 0,
+        max_attempts: int = 5
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Write a batch of buffered session mutations: the response records (idempotent upserts), then the
+        session's fields and responded counter in one ETag-conditional replace, re-read and re-applied
+        if another writer changed the session meanwhile. A cancelled session keeps its failed status.
+        Returns the session document as written, or None if the session does not exist.
+        """
+        if response_records:
+            self.store.add_responses(session_id, response_records)
+
+        for _ in range(max_attempts):
+            item = self.store.read(session_id)
+            if not item:
+                return None
+
+            updated = {**item, **fields}
+            if item.get('status') == SessionStatus.FAILED.value and fields.get('status') != SessionStatus.FAILED.value:
+                for field in ('status', 'completed_at', 'error_message'):
+                    updated[field] = item.get(field)
+            updated['total_responded'] = (item.get('total_responded') or 0) + responded_delta
+
+            if self.store.replace(updated, item['_etag']):
+                return updated
+
+        raise RuntimeError(f"Session {session_id} kept changing during {max_attempts} update attempts")
+
     def add_summary(self, session_id: str, summary: SessionSummary):
         """Add or update summary for a session"""
         try:
-            session = self.get_session(session_id)
-            if session:
-                session.summary = summary
-                session.updated_at = datetime.utcnow()
-                self._update_session(session)
+            self.store.patch(session_id, {
+                "summary": summary.model_dump(mode='json'),
+                "updated_at": datetime.utcnow().isoformat()
+            })
         except Exception as e:
             print(f"Error adding summary: {e}")
 
-    def _update_session(self, session: QuestionSession):
-        """Update session in Cosmos DB"""
-        try:
-            session_dict = session.model_dump(mode='json')
-            session_dict['id'] = session.session_id
-            session_dict['partition_key'] = session.session_id
-
-            self.cosmos_client.upsert_item(body=session_dict)
-        except Exception as e:
-            print(f"Error updating session in Cosmos DB: {e}")
-            raise
-
     def list_sessions(
         self,
         status_filter: Optional[List[SessionStatus]] = None,
@@ -187,59 +214,33 @@ class QASessionStorage:
     ) -> Dict[str, Any]:
         """List Q&A sessions with filtering and pagination"""
         try:
-            # Build query
-            query = "SELECT * FROM c WHERE 1=1"
-            parameters = []
-
-            if status_filter:
-                status_values = [s.value for s in status_filter]
-                query += f" AND c.status IN ({','.join(['@status' + str(i) for i in range(len(status_values))])})"
-                for i, status in enumerate(status_values):
-                    parameters.append({"name": f"@status{i}", "value": status})
-
-            if date_from:
-                query += " AND c.created_at >= @date_from"
-                parameters.append({"name": "@date_from", "value": date_from.isoformat()})
-
-            if date_to:
-                query += " AND c.created_at <= @date_to"
-                parameters.append({"name": "@date_to", "value": date_to.isoformat()})
-
-            if search_query:
-                query += " AND CONTAINS(LOWER(c.question), LOWER(@search))"
-                parameters.append({"name": "@search", "value": search_query})
-
-            # Add sorting
-            sort_direction = "DESC" if sort_order == "desc" else "ASC"
-            query += f" ORDER BY c.{sort_by} {sort_direction}"
-
-            # Execute query
-            items = list(self.cosmos_client.query_items(
-                query=query,
-                parameters=parameters,
-                enable_cross_partition_query=True
-            ))
-
-            # Apply prospect_id filter (if needed)
-            if prospect_id:
-                items = [
-                    item for item in items
-                    if any(p.get('lead_id') == prospect_id for p in item.get('target_prospects', []))
-                ]
-
-            # Calculate pagination
-            total_count = len(items)
-            total_pages = (total_count + page_size - 1) // page_size
-            start_idx = (page - 1) * page_size
-            end_idx = start_idx + page_size
-
-            # Get page items
-            page_items = items[start_idx:end_idx]
+            filters = {
+                "status_values": [s.value for s in status_filter] if status_filter else None,
+                "prospect_id": prospect_id,
+                "date_from": _to_utc_iso(date_from) if date_from else None,
+                "date_to": _to_utc_iso(date_to) if date_to else None,
+                "search_query": search_query
+            }
+            if sort_by not in SESSION_SORT_FIELDS:
+                sort_by = "created_at"
+
+            # Only the requested page is fetched, and list rows only need the card fields
+            page_items = self.store.query(
+                filters,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                fields=QA_SESSION_LIST_FIELDS,
+                offset=(page - 1) * page_size,
+                limit=page_size
+            )
             sessions = [QuestionSession(**item) for item in page_items]
 
-            # Count active and completed sessions
-            active_count = sum(1 for item in items if item['status'] in ['pending', 'in_progress'])
-            completed_count = sum(1 for item in items if item['status'] == 'completed')
+            total_count = self.store.count(filters)
+            total_pages = (total_count + page_size - 1) // page_size
+
+            # Active and completed counts within the same filters, skipping statuses the filter excludes
+            active_count = self._count_with_statuses(filters, ACTIVE_STATUSES)
+            completed_count = self._count_with_statuses(filters, [SessionStatus.COMPLETED.value])
 
             return {
                 "sessions": sessions,
@@ -263,22 +264,21 @@ class QASessionStorage:
                 "completed_sessions_count": 0
             }
 
+    def _count_with_statuses(self, filters: Dict[str, Any], statuses: List[str]) -> int:
+        if filters["status_values"]:
+            statuses = [s for s in statuses if s in filters["status_values"]]
+            if not statuses:
+                return 0
+        return self.store.count({**filters, "status_values": statuses})
+
     def get_responses(self, session_id: str, since_timestamp: Optional[datetime] = None) -> List[ProspectResponse]:
         """Get responses for a session, optionally filtered by timestamp"""
         try:
-            session = self.get_session(session_id)
-            if not session:
+            item = self.store.read(session_id)
+            if not item:
                 return []
 
-            responses = session.responses
-
-            if since_timestamp:
-                responses = [
-                    r for r in responses
-                    if r.answered_at > since_timestamp
-                ]
-
-            return responses
+            return [ProspectResponse(**r) for r in self._load_responses(item, since_timestamp)]
         except Exception as e:
             print(f"Error getting responses: {e}")
             return []
@@ -286,12 +286,13 @@ class QASessionStorage:
     def cancel_session(self, session_id: str) -> bool:
         """Cancel a Q&A session"""
         try:
-            session = self.get_session(session_id)
-            if session and session.status in [SessionStatus.PENDING, SessionStatus.IN_PROGRESS]:
-                session.status = SessionStatus.FAILED
-                session.error_message = "Session cancelled by user"
-                session.updated_at = datetime.utcnow()
-                self._update_session(session)
+            item = self.store.read(session_id)
+            if item and item['status'] in [SessionStatus.PENDING.value, SessionStatus.IN_PROGRESS.value]:
+                self.store.patch(session_id, {
+                    "status": SessionStatus.FAILED.value,
+                    "error_message": "Session cancelled by user",
+                    "updated_at": datetime.utcnow().isoformat()
+                })
                 return True
             return False
         except Exception as e:
@@ -302,22 +303,17 @@ class QASessionStorage:
         """Delete a Q&A session permanently"""
         try:
             # Check if session exists
-            session = self.get_session(session_id)
-            if not session:
+            item = self.store.read(session_id)
+            if not item:
                 return False
 
-            # Delete from Cosmos DB
-            self.cosmos_client.delete_item(
-                item=session_id,
-                partition_key=session_id
-            )
+            self.store.delete(session_id)
 
             # Delete associated images from blob storage if any
-            if session.image_url:
+            if item.get('image_url'):
                 try:
                     blob_name = f"qa-sessions/{session_id}/image.png"
-                    blob_client = self.blob_container.get_blob_client(blob_name)
-                    blob_client.delete_blob()
+                    self.store.delete_image(blob_name)
                 except Exception as e:
                     print(f"Error deleting session image: {e}")
 
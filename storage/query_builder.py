@@ -0,0 +1,55 @@
+"""
+Helpers for building Cosmos DB SQL queries that project only the fields a view renders.
+List views select their card fields; detail views keep fetching the full document.
+"""
+from typing import List, Optional, Sequence
+
+# Metadata fields rendered by persona cards and search results
+TWIN_LIST_FIELDS = (
+    "id",
+    "lead_classification",
+    "persona_summary",
+    "personal_information",
+    "demographic_information",
+    "financial_information",
+    "insurance_history",
+    "last_updated",
+)
+
+# QA session fields rendered by the session list; responses and summary are only loaded on the detail view
+QA_SESSION_LIST_FIELDS = (
+    "session_id",
+    "question",
+    "image_url",
+    "target_prospects",
+    "status",
+    "created_at",
+    "updated_at",
+    "completed_at",
+    "total_expected",
+    "total_responded",
+    "error_message",
+)
+
+
+def select_clause(fields: Optional[Sequence[str]] = None, alias: str = "c", top: Optional[int] = None) -> str:
+    """SELECT clause projecting the given top-level fields, or the whole document when fields is None"""
+    top_clause = f"TOP {int(top)} " if top else ""
+    if not fields:
+        return f"SELECT {top_clause}* FROM {alias}"
+    projection = ", ".join(f"{alias}.{field}" for field in fields)
+    return f"SELECT {top_clause}{projection} FROM {alias}"
+
+
+def build_query(fields: Optional[Sequence[str]] = None, conditions: Optional[List[str]] = None,
+                order_by: Optional[str] = None, alias: str = "c", top: Optional[int] = None) -> str:
+    """
+    Build a full query from a projection, AND-ed conditions and an ORDER BY expression
+    (e.g. "c.last_updated DESC").
+    """
+    query = select_clause(fields, alias, top)
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    return query
@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from storage.azure_config import azure_config
+
+# In-process tier; kept short-lived since other workers' writes only reach it through expiry
+TWIN_CACHE_ENABLED = os.getenv("TWIN_CACHE_ENABLED", "true").lower() == "true"
+TWIN_CACHE_MAX_BYTES = int(os.getenv("TWIN_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TWIN_CACHE_TTL_SECONDS = float(os.getenv("TWIN_CACHE_TTL_SECONDS", "300"))
+# Shared tier; invalidated on every write, so it can hold entries much longer
+TWIN_CACHE_REDIS_TTL_SECONDS = int(os.getenv("TWIN_CACHE_REDIS_TTL_SECONDS", "3600"))
+
+# Keys whose last invalidation is remembered in-process; older ones fall back to a conservative floor
+_MAX_TRACKED_INVALIDATIONS = 100_000
+
+# Store the value only if the key's generation is still the one the reader saw
+_SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '') == ARGV[3] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class TwinCache:
+    """
+    Read-through cache for digital twin reads: an in-process LRU bounded by total value size,
+    backed by an optional Redis tier shared between workers.
+
+    Values must be JSON-serializable. Writers call invalidate() for the keys they change.
+
+    Readers that fill the cache on a miss use lookup() and pass its token to set(): every invalidation
+    moves the key to a new generation (in-process and in Redis), and set() drops a value read before
+    the latest one, so a slow reader cannot cache a document a concurrent writer just replaced.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl_seconds: Optional[float], redis_ttl_seconds: int,
+                 get_redis_client: Callable[[], Any], enabled: bool = True):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.enabled = enabled
+        self._get_redis_client = get_redis_client
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # In-process generations: a clock bumped by every invalidation and the tick each key last saw
+        self._clock = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._invalidated_floor = 0
+        self._stats = {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "stale_sets": 0,
+            "redis_errors": 0,
+        }
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def _redis_generation_key(self, key: str) -> str:
+        return f"{self.name}:gen:{key}"
+
+    def _invalidated_since(self, key: str, tick: int) -> bool:
+        #Caller must hold self._lock
+        return self._invalidated.get(key, self._invalidated_floor) > tick
+
+    def _remember(self, key: str, value: Any, size: int) -> None:
+        #Caller must hold self._lock
+        if size > self.max_bytes:
+            return
+        self._forget(key)
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats["evictions"] += 1
+
+    def _forget(self, key: str) -> bool:
+        #Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[1]
+        return True
+
+    async def get(self, key: str) -> Optional[Any]:
+        value, _ = await self.lookup(key)
+        return value
+
+    async def lookup(self, key: str) -> Tuple[Optional[Any], Optional[tuple]]:
+        """
+        Like get(), also returning a token on a miss. Pass it to set() with the value read from storage
+        so the value is dropped if the key was invalidated in the meantime.
+        """
+        if not self.enabled:
+            return None, None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, _, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value, None
+                self._forget(key)
+                self._stats["expirations"] += 1
+            tick = self._clock
+
+        generation = None
+        redis_client = self._get_redis_client()
+        if redis_client is not None:
+            try:
+                payload, generation = await redis_client.mget(self._redis_key(key), self._redis_generation_key(key))
+                if payload is not None:
+                    value = json.loads(payload)
+                    with self._lock:
+                        if not self._invalidated_since(key, tick):
+                            self._remember(key, value, len(payload))
+                        self._stats["redis_hits"] += 1
+                    return value, None
+                generation = generation or ""
+            except Exception as e:
+                with self._lock:
+                    self._stats["redis_errors"] += 1
+                print(f"{self.name} cache - Redis read failed: {e}")
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, (tick, generation)
+
+    async def set(self, key: str, value: Any, token: Optional[tuple] = None) -> None:
+        """Cache a value; with a token from lookup(), only if the key was not invalidated since"""
+        if not self.enabled or value is None:
+            return
+
+        payload = json.dumps(value, default=str, ensure_ascii=False)
+        tick, generation = token if token is not None else (None, None)
+        if tick is not None:
+            with self._lock:
+                if self._invalidated_since(key, tick):
+                    self._stats["stale_sets"] += 1
+                    return
+
+        redis_client = self._get_redis_client()
+        if redis_client is not None and (token is None or generation is not None):
+            try:
+                if token is None:
+                    await redis_client.set(self._redis_key(key), payload, ex=self.redis_ttl_seconds)
+                else:
+                    stored = await redis_client.eval(
+                        _SET_IF_GENERATION, 2, self._redis_key(key), self._redis_generation_key(key),
+                        payload, self.redis_ttl_seconds, generation
+                    )
+                    if not stored:
+                        with self._lock:
+                            self._stats["stale_sets"] += 1
+                        return
+            except Exception as e:
+                with self._lock:
+                    self._stats["redis_errors"] += 1
+                print(f"{self.name} cache - Redis write failed: {e}")
+
+        with self._lock:
+            if tick is not None and self._invalidated_since(key, tick):
+                self._stats["stale_sets"] += 1
+                return
+            self._remember(key, value, len(payload.encode("utf-8")))
+            self._stats["stores"] += 1
+
+    async def invalidate(self, *keys: str) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._clock += 1
+            for key in keys:
+                self._forget(key)
+                self._invalidated[key] = self._clock
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > _MAX_TRACKED_INVALIDATIONS:
+                _, tick = self._invalidated.popitem(last=False)
+                self._invalidated_floor = max(self._invalidated_floor, tick)
+            self._stats["invalidations"] += len(keys)
+
+        redis_client = self._get_redis_client()
+        if redis_client is not None and keys:
+            try:
+                # A fresh random generation, so readers that looked the key up earlier cannot store
+                pipeline = redis_client.pipeline(transaction=True)
+                pipeline.delete(*(self._redis_key(key) for key in keys))
+                for key in keys:
+                    pipeline.set(self._redis_generation_key(key), uuid.uuid4().hex, ex=self.redis_ttl_seconds)
+                await pipeline.execute()
+            except Exception as e:
+                with self._lock:
+                    self._stats["redis_errors"] += 1
+                print(f"{self.name} cache - Redis invalidation failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+            stats["memory_bytes"] = self._bytes
+        lookups = stats["memory_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["redis_hits"]) / lookups if lookups else 0.0
+        stats["max_bytes"] = self.max_bytes
+        stats["redis_enabled"] = self._get_redis_client() is not None
+        stats["enabled"] = self.enabled
+        return stats
+
+
+twin_cache = TwinCache(
+    "twin",
+    max_bytes=TWIN_CACHE_MAX_BYTES,
+    ttl_seconds=TWIN_CACHE_TTL_SECONDS,
+    redis_ttl_seconds=TWIN_CACHE_REDIS_TTL_SECONDS,
+    get_redis_client=azure_config.get_async_redis_cache_client,
+    enabled=TWIN_CACHE_ENABLED,
+)
@@ -13,6 +13,10 @@ def main():
     parser.add_argument('--csv-path', default='personas.csv', help='Path to the CSV file')
     parser.add_argument('--api-url', default='https://mirai-lms-api.azurewebsites.net/create_digital_twin_agent', help='URL of the API endpoint')
     parser.add_argument('--limit', type=int, default=10, help='Limit the number of rows to process (for testing)')
+    parser.add_argument('--bulk', action='store_true', help='Send all rows in one request to the bulk creation endpoint')
+    parser.add_argument('--bulk-api-url', default='https://mirai-lms-api.azurewebsites.net/bulk_create_digital_twins', help='URL of the bulk creation endpoint')
+    parser.add_argument('--job-id', default=None, help='Bulk job id; rerunning with the same id resumes an interrupted job')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of records the bulk endpoint processes in parallel')
     args = parser.parse_args()
 
     csv_path = args.csv_path
@@ -36,6 +40,10 @@ def main():
         print(f"Error reading CSV file: {e}")
         sys.exit(1)
 
+    if args.bulk:
+        run_bulk(personas, args.bulk_api_url, args.job_id, args.concurrency)
+        return
+
     # Process each row in the CSV
     total_count = len(personas)
     current_count = 0
@@ -96,5 +104,36 @@ def main():
 
     print(f"Processing complete. Processed {current_count} personas.")
 
+def run_bulk(personas, bulk_api_url, job_id=None, concurrency=4):
+    """Send all personas to the bulk endpoint and print each streamed result line"""
+    records = []
+    for idx, persona in enumerate(personas, start=1):
+        if 'webtraffic' not in persona:
+            print(f"Warning: Skipping row {idx}: Missing required 'webtraffic' column")
+            continue
+        records.append({'data': persona['webtraffic'], 'existing_digital_twin': ''})
+
+    body = {'records': records, 'concurrency': concurrency}
+    if job_id:
+        body['job_id'] = job_id
+
+    print(f"Sending {len(records)} records to {bulk_api_url}")
+    try:
+        with requests.post(bulk_api_url, json=body, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                result = json.loads(line)
+                if result.get('event') == 'record':
+                    print(f"  [{result.get('index')}] {result.get('status')}: lead_id={result.get('lead_id')} {result.get('error', '')}")
+                else:
+                    print(f"  {json.dumps(result)}")
+    except requests.exceptions.RequestException as e:
+        print(f"  Error: Bulk request failed: {e}")
+        print("  Rerun the same command to resume from the last completed record")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
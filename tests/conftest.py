@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Tests run against the local backend, set before any storage module reads the environment
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_DIR"] = tempfile.mkdtemp(prefix="storage-tests-")
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from utils.async_helper import for_each_bounded, run_blocking
+
+AGENT_LATENCY = 0.5
+CONCURRENT_CALLS = 8
+
+
+def _blocking_agent(question, *args, **kwargs):
+    # Stands in for a synchronous DSPy round trip
+    time.sleep(AGENT_LATENCY)
+    return f"answer to {question}"
+
+
+def test_run_blocking_calls_overlap():
+    async def scenario():
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(run_blocking(_blocking_agent, i) for i in range(CONCURRENT_CALLS)))
+        return answers, time.perf_counter() - started
+
+    answers, elapsed = asyncio.run(scenario())
+    assert answers == [f"answer to {i}" for i in range(CONCURRENT_CALLS)]
+    assert elapsed < 2 * AGENT_LATENCY
+
+
+def test_concurrent_chat_requests_overlap(monkeypatch):
+    pytest.importorskip("dspy")
+    import main
+    from agent_dojo.agents.SyntheticPersonChatAgent import SyntheticPersonChatAgent
+
+    monkeypatch.setattr(SyntheticPersonChatAgent, "run", _blocking_agent)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post("/chat_with_synthetic_persona/LEAD-1", json={"question": f"q{i}"})
+                for i in range(CONCURRENT_CALLS)
+            ))
+            return responses, time.perf_counter() - started
+
+    responses, elapsed = asyncio.run(scenario())
+    assert [r.json()["answer"] for r in responses] == [f"answer to q{i}" for i in range(CONCURRENT_CALLS)]
+    # One agent latency plus overhead, not CONCURRENT_CALLS of them
+    assert elapsed < 2 * AGENT_LATENCY
+
+
+def test_for_each_bounded_pulls_items_only_as_workers_free_up():
+    concurrency = 4
+    pulled, finished, in_flight, max_in_flight, max_ahead = 0, 0, 0, 0, 0
+
+    async def items():
+        nonlocal pulled, max_ahead
+        for i in range(100):
+            pulled += 1
+            max_ahead = max(max_ahead, pulled - finished)
+            yield i
+
+    async def handle(item):
+        nonlocal finished, in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        finished += 1
+
+    asyncio.run(for_each_bounded(items(), handle, concurrency))
+    assert finished == 100
+    assert max_in_flight == concurrency
+    # Running items plus a queue of at most `concurrency`, plus the one being handed over
+    assert max_ahead <= 2 * concurrency + 1
@@ -0,0 +1,34 @@
+import asyncio
+import json
+import time
+import uuid
+
+from digital_twins import bulk_ingestion
+from digital_twins.bulk_ingestion import BulkRecord, stream_bulk_creation
+
+
+def _collect(records, **kwargs):
+    async def run():
+        return [json.loads(line) async for line in stream_bulk_creation(records, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_realtime_instructions_do_not_hold_a_concurrency_slot(monkeypatch):
+    async def acreate(data, existing_digital_twin="", lead_id=None):
+        return {"lead_id": lead_id, "digital_twin": "# Twin", "insurance_prospect": None}
+
+    async def prepare_realtime_instructions(lead_id):
+        await asyncio.sleep(0.3)
+
+    monkeypatch.setattr(bulk_ingestion.DigitalTwinCreatorAgent, "acreate", acreate)
+    monkeypatch.setattr(bulk_ingestion, "prepare_realtime_instructions", prepare_realtime_instructions)
+
+    records = [BulkRecord(record_id=uuid.uuid4().hex, data="visit", lead_id=f"LEAD-{i}") for i in range(4)]
+    start = time.perf_counter()
+    lines = _collect(records, job_id=f"test-{uuid.uuid4().hex}", concurrency=1, generate_images=False)
+    elapsed = time.perf_counter() - start
+
+    # Four records through one slot would take 1.2s if each waited for its instructions
+    assert elapsed < 0.3
+    assert [line["status"] for line in lines if line["event"] == "record"] == ["succeeded"] * 4
+    assert lines[-1]["succeeded"] == 4
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+dspy = pytest.importorskip("dspy")
+
+from agent_dojo.agents.SyntheticPersonChatAgent import SyntheticPersonChatAgent
+from agent_dojo.tools.lmtools import get_current_usage
+
+CHUNKS = ["Hello", " there", "!"]
+
+
+def _stub_streamify(monkeypatch, on_chunk=None):
+    def streamify(agent, stream_listeners=None, async_streaming=True):
+        async def stream_program(question, history, persona, language):
+            get_current_usage().record_call({"usage": {"total_tokens": 7}, "cost": 0.01, "model": "stub"})
+            for text in CHUNKS:
+                if on_chunk:
+                    on_chunk(history)
+                yield dspy.streaming.StreamResponse("predict", "answer", text, False)
+                await asyncio.sleep(0)
+            yield dspy.Prediction(answer="".join(CHUNKS))
+        return stream_program
+
+    monkeypatch.setattr(SyntheticPersonChatAgent, "_load_agent", lambda: object())
+    monkeypatch.setattr(SyntheticPersonChatAgent.dspy, "streamify", streamify)
+
+
+def _post_stream(path, question):
+    import main
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json={"question": question})
+
+    response = asyncio.run(scenario())
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return main, events
+
+
+def test_stream_emits_tokens_then_done_and_appends_history_at_the_end(monkeypatch):
+    seen_history = []
+    _stub_streamify(monkeypatch, on_chunk=lambda history: seen_history.append(list(history.messages)))
+
+    main, events = _post_stream("/chat_with_synthetic_persona/LEAD-1/stream", "Who are you?")
+
+    assert [e for e, _ in events] == ["token"] * len(CHUNKS) + ["done"]
+    assert [d["text"] for _, d in events[:-1]] == CHUNKS
+    done = events[-1][1]
+    assert done["answer"] == "Hello there!" and done["cached"] is False
+    assert done["usage"]["total_tokens"] == 7 and done["usage"]["by_model"]["stub"]["calls"] == 1
+    assert seen_history == [[]] * len(CHUNKS)
+    assert main.chat_sessions[done["session_id"]].messages == [{"question": "Who are you?", "answer": "Hello there!"}]
+
+
+def test_stream_serves_a_cached_answer(monkeypatch):
+    _stub_streamify(monkeypatch)
+    monkeypatch.setattr(SyntheticPersonChatAgent.chat_response_cache, "get", lambda key: "Cached hello")
+
+    main, events = _post_stream("/chat_with_synthetic_persona/LEAD-1/stream", "Cached?")
+
+    assert events == [
+        ("token", {"text": "Cached hello"}),
+        ("done", {"answer": "Cached hello", "session_id": events[-1][1]["session_id"], "usage": None, "cached": True}),
+    ]
+    assert main.chat_sessions[events[-1][1]["session_id"]].messages == [{"question": "Cached?", "answer": "Cached hello"}]
+
+
+def test_stream_closed_from_another_context(monkeypatch):
+    _stub_streamify(monkeypatch)
+
+    async def scenario():
+        stream = SyntheticPersonChatAgent.astream("Who are you?", dspy.History(messages=[]), use_cache=False)
+        first = await asyncio.create_task(stream.__anext__())
+        # A server dropping the client finalizes the generator from a different task
+        await asyncio.create_task(stream.aclose())
+        return first
+
+    assert asyncio.run(scenario()) == {"type": "token", "text": "Hello"}
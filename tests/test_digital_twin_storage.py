@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+
+from agent_dojo.agents.DigitalTwinCreatorAgent.InsuranceProspectModel import (
+    DemographicInformation, FinancialInformation, InsuranceHistory, InsuranceProspect, PersonalInformation
+)
+from storage import blob_layout, digital_twin_storage
+from storage.digital_twin_storage import ScalableDigitalTwinStorage
+
+
+def _prospect(classification: str) -> InsuranceProspect:
+    return InsuranceProspect(
+        personal_information=PersonalInformation(),
+        demographic_information=DemographicInformation(),
+        financial_information=FinancialInformation(),
+        insurance_history=InsuranceHistory(),
+        lead_classification=classification
+    )
+
+
+def test_save_after_update_classification_rewrites_metadata():
+    async def scenario():
+        storage = ScalableDigitalTwinStorage()
+        lead_id = f"LEAD-{uuid.uuid4().hex[:8]}"
+        await storage.save_digital_twin(lead_id, "# Twin", _prospect("cold"))
+        assert await storage.update_classification(lead_id, "hot")
+
+        result = await storage.save_digital_twin(lead_id, "# Twin", _prospect("cold"))
+        metadata = await storage.metadata_store.read(lead_id)
+        return result, metadata
+
+    result, metadata = asyncio.run(scenario())
+    assert result["metadata_written"]
+    assert metadata["lead_classification"] == "cold"
+
+
+def test_default_layout_bundle_reads_metadata_and_markdown_concurrently(monkeypatch):
+    async def scenario():
+        storage = ScalableDigitalTwinStorage()
+        hashed_id = f"LEAD-{uuid.uuid4().hex[:8]}"
+        dated_id = f"LEAD-{uuid.uuid4().hex[:8]}"
+        saved = await storage.save_digital_twin(hashed_id, "# Hashed", _prospect("cold"))
+        monkeypatch.setattr(digital_twin_storage, "twin_blob_path",
+                            lambda lead_id: blob_layout.twin_blob_path(lead_id, layout=blob_layout.LAYOUT_DATE))
+        await storage.save_digital_twin(dated_id, "# Dated", _prospect("cold"))
+
+        def delayed(method):
+            async def wrapper(*args, **kwargs):
+                await asyncio.sleep(0.2)
+                return await method(*args, **kwargs)
+            return wrapper
+        monkeypatch.setattr(storage.metadata_store, "read", delayed(storage.metadata_store.read))
+        monkeypatch.setattr(storage.blob_store, "download", delayed(storage.blob_store.download))
+
+        started = asyncio.get_running_loop().time()
+        hashed_bundle = await storage.get_twin_bundle(hashed_id)
+        elapsed = asyncio.get_running_loop().time() - started
+        dated_bundle = await storage.get_twin_bundle(dated_id)
+        return saved, hashed_bundle, elapsed, dated_bundle
+
+    saved, hashed_bundle, elapsed, dated_bundle = asyncio.run(scenario())
+    assert saved["blob_path"] == blob_layout.hash_blob_path(saved["lead_id"])
+    assert hashed_bundle["markdown"] == "# Hashed"
+    assert elapsed < 0.35
+    # A twin written under another layout is still found through its recorded blob_path
+    assert dated_bundle["markdown"] == "# Dated"
+
+
+def test_compressed_markdown_is_not_labelled_as_markdown():
+    async def scenario():
+        storage = ScalableDigitalTwinStorage()
+        lead_id = f"LEAD-{uuid.uuid4().hex[:8]}"
+        result = await storage.save_digital_twin(lead_id, "# Twin", _prospect("cold"))
+        return storage.blob_store.read_with_content_type(result["blob_path"])
+
+    _, metadata, content_type = asyncio.run(scenario())
+    assert metadata["codec"] == "gzip"
+    assert content_type == "application/octet-stream"
+
+
+def test_blob_layout_migration_relocates_twins(monkeypatch, tmp_path):
+    from storage.migrate_blob_layout import migrate
+
+    lead_id = f"LEAD-{uuid.uuid4().hex[:8]}"
+
+    async def save_flat():
+        monkeypatch.setattr(digital_twin_storage, "twin_blob_path", blob_layout.flat_blob_path)
+        await ScalableDigitalTwinStorage().save_digital_twin(lead_id, "# Twin", _prospect("cold"))
+        monkeypatch.undo()
+
+    async def read_back():
+        storage = ScalableDigitalTwinStorage()
+        metadata = await storage.metadata_store.read(lead_id)
+        return metadata, await storage.get_digital_twin(lead_id), await storage.blob_store.exists(f"{lead_id}.md")
+
+    asyncio.run(save_flat())
+    counts = asyncio.run(migrate(checkpoint_path=str(tmp_path / "checkpoint.json"), restart=True))
+    metadata, markdown, flat_blob_exists = asyncio.run(read_back())
+
+    assert counts["failed"] == 0 and counts["migrated"] >= 1
+    assert metadata["blob_path"] == blob_layout.hash_blob_path(lead_id)
+    assert metadata["metadata_hash"] == digital_twin_storage._compute_metadata_hash(metadata)
+    assert markdown == "# Twin"
+    assert not flat_blob_exists
+
+
+def test_get_many_reuses_listed_metadata(monkeypatch):
+    async def scenario():
+        storage = ScalableDigitalTwinStorage()
+        lead_id = f"LEAD-{uuid.uuid4().hex[:8]}"
+        await storage.save_digital_twin(lead_id, "# Twin", _prospect("cold"))
+        listed = [twin for twin in await storage.list_digital_twins(limit=1000, fields=None) if twin['id'] == lead_id]
+        await digital_twin_storage.twin_cache.invalidate(digital_twin_storage._metadata_cache_key(lead_id))
+
+        queried = []
+        get_many = storage.metadata_store.get_many
+
+        async def counting_get_many(lead_ids):
+            queried.extend(lead_ids)
+            return await get_many(lead_ids)
+
+        monkeypatch.setattr(storage.metadata_store, "get_many", counting_get_many)
+        twins = await storage.get_many([lead_id], metadata=[twin['metadata'] for twin in listed])
+        return twins, queried
+
+    twins, queried = asyncio.run(scenario())
+    assert queried == []
+    assert twins[0]["markdown"] == "# Twin" and twins[0]["metadata"]["lead_classification"] == "cold"
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime
+
+from models.qa_models import PersonaBase, ProspectResponse, SessionStatus
+from services.qa_session_buffer import SessionStateBuffer
+from services.qa_session_events import SessionSubscription
+from storage.qa_session_storage import QASessionStorage
+
+
+def _response(lead_id: str) -> ProspectResponse:
+    return ProspectResponse(
+        persona=PersonaBase(lead_id=lead_id),
+        answer="Sounds good",
+        answered_at=datetime.utcnow(),
+        confidence_score=0.85
+    )
+
+
+def _new_session(storage: QASessionStorage):
+    prospects = [PersonaBase(lead_id="L1"), PersonaBase(lead_id="L2")]
+    return storage.create_session("Would you buy this?", ["L1", "L2"], prospects)
+
+
+def test_response_event_follows_the_flush_that_stores_it():
+    async def scenario():
+        storage = QASessionStorage()
+        session = _new_session(storage)
+        buffer = SessionStateBuffer(storage, session.session_id, 2, flush_interval=60)
+        with SessionSubscription(session.session_id) as subscription:
+            await buffer.add_response(_response("L1"))
+            before_flush = await subscription.get(0.05)
+            await buffer.flush()
+            event = await subscription.get(1)
+            stored = storage.get_session(session.session_id)
+        await buffer.close()
+        return before_flush, event, stored
+
+    before_flush, event, stored = asyncio.run(scenario())
+    assert before_flush is None
+    assert event["event_type"] == "response_received"
+    assert event["response"]["persona"]["lead_id"] == "L1"
+    assert event["progress"] == {"responded": 1, "total": 2}
+    assert [r.persona.lead_id for r in stored.responses] == ["L1"]
+
+
+def test_cancelled_session_publishes_no_further_events():
+    async def scenario():
+        storage = QASessionStorage()
+        session = _new_session(storage)
+        buffer = SessionStateBuffer(storage, session.session_id, 2, flush_interval=60)
+        await buffer.set_status(SessionStatus.IN_PROGRESS)
+        assert storage.cancel_session(session.session_id)
+        with SessionSubscription(session.session_id) as subscription:
+            await buffer.add_response(_response("L1"))
+            await buffer.set_status(SessionStatus.COMPLETED)
+            event = await subscription.get(0.1)
+        return buffer.cancelled, event, storage.get_session(session.session_id)
+
+    cancelled, event, stored = asyncio.run(scenario())
+    assert cancelled
+    assert event is None
+    assert stored.status == SessionStatus.FAILED
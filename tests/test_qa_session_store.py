@@ -0,0 +1,55 @@
+from unittest.mock import create_autospec
+
+import pytest
+
+pytest.importorskip("azure.cosmos")
+pytest.importorskip("pydantic")
+
+from azure.cosmos import ContainerProxy
+
+from storage.azure_backend import RESPONSE_DOC_TYPE, CosmosQASessionStore
+from storage.qa_session_storage import QASessionStorage
+
+
+def _cosmos_session_storage(session_doc):
+    # Autospec limits the fake to methods the pinned SDK really has
+    store = CosmosQASessionStore.__new__(CosmosQASessionStore)
+    store.container = create_autospec(ContainerProxy, instance=True)
+    store.container.read_item.return_value = session_doc
+    storage = QASessionStorage.__new__(QASessionStorage)
+    storage.store = store
+    return storage
+
+
+def test_cosmos_apply_updates_writes_responses_and_session():
+    storage = _cosmos_session_storage({
+        "id": "QS-1", "session_id": "QS-1", "status": "in_progress", "total_responded": 1, "_etag": "e1"
+    })
+    records = [
+        {"id": "QS-1:L1", "lead_id": "L1", "answered_at": "2026-01-01T00:00:00"},
+        {"id": "QS-1:L2", "lead_id": "L2", "answered_at": "2026-01-01T00:00:01"},
+    ]
+
+    assert storage.apply_updates("QS-1", {"status": "completed"}, records, len(records))
+
+    container = storage.store.container
+    bodies = [call.kwargs["body"] for call in container.upsert_item.call_args_list]
+    assert [body["id"] for body in bodies] == ["QS-1:L1", "QS-1:L2"]
+    assert all(body["partition_key"] == "QS-1" and body["doc_type"] == RESPONSE_DOC_TYPE for body in bodies)
+
+    replaced = container.replace_item.call_args.kwargs
+    assert replaced["etag"] == "e1"
+    assert replaced["body"]["status"] == "completed"
+    assert replaced["body"]["total_responded"] == 3
+
+
+def test_sqlite_session_images_round_trip():
+    from storage.local_backend import SqliteQASessionStore
+
+    store = SqliteQASessionStore()
+    url = store.save_image("QS-1/question.png", b"\x89PNG", "image/png")
+
+    assert url == store.images.url("QS-1/question.png")
+    assert store.images.read_with_content_type("QS-1/question.png") == (b"\x89PNG", {}, "image/png")
+    store.delete_image("QS-1/question.png")
+    assert store.images.read_with_content_type("QS-1/question.png") is None
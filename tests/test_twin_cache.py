@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from storage.twin_cache import TwinCache
+
+
+def _cache(redis_client=None) -> TwinCache:
+    return TwinCache("test", max_bytes=1024 * 1024, ttl_seconds=300, redis_ttl_seconds=3600,
+                     get_redis_client=lambda: redis_client)
+
+
+async def _stale_reader_races_a_save(cache: TwinCache):
+    # A reader misses and reads the old document; a save lands and invalidates before it caches it
+    _, token = await cache.lookup("metadata:L1")
+    await cache.invalidate("metadata:L1")
+    await cache.set("metadata:L1", {"lead_classification": "cold"}, token)
+
+
+def test_set_drops_a_value_read_before_an_invalidation():
+    cache = _cache()
+
+    async def scenario():
+        await _stale_reader_races_a_save(cache)
+        value, token = await cache.lookup("metadata:L1")
+        await cache.set("metadata:L1", {"lead_classification": "hot"}, token)
+        return value, await cache.get("metadata:L1")
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale is None
+    assert fresh == {"lead_classification": "hot"}
+    assert cache.get_stats()["stale_sets"] == 1
+
+
+def test_redis_tier_drops_a_value_read_before_another_workers_invalidation():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        reader, writer = _cache(redis_client), _cache(redis_client)
+        _, token = await reader.lookup("metadata:L1")
+        await writer.invalidate("metadata:L1")
+        await reader.set("metadata:L1", {"lead_classification": "cold"}, token)
+        stale = await _cache(redis_client).get("metadata:L1")
+
+        _, token = await reader.lookup("metadata:L1")
+        await reader.set("metadata:L1", {"lead_classification": "hot"}, token)
+        return stale, await _cache(redis_client).get("metadata:L1")
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale is None
+    assert fresh == {"lead_classification": "hot"}
@@ -3,14 +3,47 @@ Centralized async utility module to handle async operations
 in both sync and async contexts without event loop conflicts.
 """
 import asyncio
-from typing import Any, Coroutine, TypeVar
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, Awaitable, Callable, Coroutine, Optional, TypeVar
 import sys
 
 T = TypeVar('T')
 
+# Dedicated pool for blocking agent work (LLM round trips) so it never runs on the event loop
+AGENT_EXECUTOR_MAX_WORKERS = int(os.getenv("AGENT_EXECUTOR_MAX_WORKERS", "32"))
+_agent_executor: Optional[ThreadPoolExecutor] = None
+_agent_executor_lock = threading.Lock()
+
+# Loop that owns the async Azure clients: the application's loop when registered, otherwise a background loop
+_main_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+def set_main_loop(loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """
+    Register the application's event loop so run_async() schedules coroutines on it.
+    Pass None on shutdown.
+    """
+    global _main_loop
+    _main_loop = loop
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="async-helper-loop", daemon=True).start()
+        return _background_loop
+
 def run_async(coro: Coroutine[Any, Any, T]) -> T:
     """
     Run an async function from a synchronous context.
+    The coroutine is scheduled on the application's loop (or a long-lived background loop)
+    rather than a fresh one, so loop-bound resources such as the async Azure clients can be shared.
     NOTE: This will fail if called from within an already running event loop.
     Use await directly in async contexts instead.
     
@@ -20,17 +53,15 @@ def run_async(coro: Coroutine[Any, Any, T]) -> T:
     Returns:
         The result of the coroutine
     """
-    try:
-        # Check if an event loop is already running
-        asyncio.get_running_loop()
-        # If we reach here, we're in an async context
+    if is_async_context():
+        coro.close()
         raise RuntimeError(
             "Cannot use run_async() from within an async context. "
             "Use 'await' directly instead."
         )
-    except RuntimeError:
-        # No event loop is running, we can use asyncio.run()
-        return asyncio.run(coro)
+    
+    loop = _main_loop if _main_loop is not None and _main_loop.is_running() else _get_background_loop()
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
 
 async def run_async_from_async(coro: Coroutine[Any, Any, T]) -> T:
     """
@@ -56,4 +87,75 @@ def is_async_context() -> bool:
         asyncio.get_running_loop()
         return True
     except RuntimeError:
-        return False
\ No newline at end of file
+        return False
+
+def get_agent_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared thread pool used to run blocking agent calls from async code.
+    """
+    global _agent_executor
+    with _agent_executor_lock:
+        if _agent_executor is None:
+            _agent_executor = ThreadPoolExecutor(
+                max_workers=AGENT_EXECUTOR_MAX_WORKERS,
+                thread_name_prefix="agent-worker"
+            )
+        return _agent_executor
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking function in the agent executor and await its result.
+    The caller's context (dspy.context settings, usage collectors) is copied into the worker thread.
+    
+    Args:
+        func: The blocking function to run
+        
+    Returns:
+        The result of the function
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_agent_executor(), call)
+
+async def for_each_bounded(items: AsyncIterable[T], func: Callable[[T], Awaitable[Any]], concurrency: int) -> None:
+    """
+    Await func(item) for every item of an async iterable, at most `concurrency` at a time.
+    Items are pulled only as workers free up, so memory stays bounded however long the iterable is.
+    func should handle its own errors; an exception from it or from the iterable stops the run.
+    
+    Args:
+        items: The async iterable to consume, e.g. a query result
+        func: The coroutine function applied to each item
+        concurrency: Number of workers
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    done = object()
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            await func(item)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for item in items:
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(done)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+def shutdown_agent_executor(wait: bool = True) -> None:
+    """
+    Shut down the agent executor, e.g. on application shutdown.
+    """
+    global _agent_executor
+    with _agent_executor_lock:
+        if _agent_executor is not None:
+            _agent_executor.shutdown(wait=wait)
+            _agent_executor = None
@@ -0,0 +1,159 @@
+"""
+In-process background work queue with a concurrency cap, retries and per-key deduplication.
+Jobs are kept in memory, so status is only visible on the worker that accepted the job.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass
+class WorkJob:
+    job_id: str
+    queue_name: str
+    dedup_key: Optional[str]
+    func: Callable = field(repr=False)
+    args: tuple = field(default=(), repr=False)
+    kwargs: Dict[str, Any] = field(default_factory=dict, repr=False)
+    status: JobStatus = JobStatus.QUEUED
+    attempts: int = 0
+    max_attempts: int = 3
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Any = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (JobStatus.QUEUED, JobStatus.RUNNING)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "queue": self.queue_name,
+            "key": self.dedup_key,
+            "status": self.status.value,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class BackgroundWorkQueue:
+    def __init__(self, name: str, max_workers: int = 2, max_attempts: int = 3,
+                 retry_backoff_seconds: float = 2.0, max_finished_jobs: int = 1000):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, WorkJob]" = OrderedDict()
+        self._active_by_key: Dict[str, WorkJob] = {}
+        self._stats = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0, "retries": 0}
+
+    def submit(self, func: Callable, *args, dedup_key: Optional[str] = None, **kwargs) -> WorkJob:
+        """
+        Queue func(*args, **kwargs). If a job with the same dedup_key is still queued or running,
+        that job is returned instead of queueing a new one.
+        """
+        with self._lock:
+            if dedup_key is not None:
+                existing = self._active_by_key.get(dedup_key)
+                if existing is not None and existing.is_active:
+                    self._stats["deduplicated"] += 1
+                    return existing
+
+            job = WorkJob(
+                job_id=uuid.uuid4().hex,
+                queue_name=self.name,
+                dedup_key=dedup_key,
+                func=func,
+                args=args,
+                kwargs=kwargs,
+                max_attempts=self.max_attempts,
+            )
+            self._jobs[job.job_id] = job
+            if dedup_key is not None:
+                self._active_by_key[dedup_key] = job
+            self._stats["submitted"] += 1
+            self._prune_finished()
+
+        self._executor.submit(self._execute, job)
+        return job
+
+    def _execute(self, job: WorkJob) -> None:
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+
+        while True:
+            job.attempts += 1
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+                job.error = None
+                job.status = JobStatus.SUCCEEDED
+                break
+            except Exception as e:
+                job.error = str(e)
+                print(f"{self.name} - job {job.job_id} attempt {job.attempts}/{job.max_attempts} failed: {e}")
+                if job.attempts >= job.max_attempts:
+                    print(traceback.format_exc())
+                    job.status = JobStatus.FAILED
+                    break
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(self.retry_backoff_seconds * (2 ** (job.attempts - 1)))
+
+        job.finished_at = datetime.utcnow()
+        with self._lock:
+            self._stats["succeeded" if job.status == JobStatus.SUCCEEDED else "failed"] += 1
+            if job.dedup_key is not None and self._active_by_key.get(job.dedup_key) is job:
+                del self._active_by_key[job.dedup_key]
+
+    def _prune_finished(self) -> None:
+        #Caller must hold self._lock; drops the oldest finished jobs beyond max_finished_jobs
+        finished = [job_id for job_id, job in self._jobs.items() if not job.is_active]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def get_job(self, job_id: str) -> Optional[WorkJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_latest_job_for_key(self, dedup_key: str) -> Optional[WorkJob]:
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.dedup_key == dedup_key:
+                    return job
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queued"] = sum(1 for job in self._jobs.values() if job.status == JobStatus.QUEUED)
+            stats["running"] = sum(1 for job in self._jobs.values() if job.status == JobStatus.RUNNING)
+        stats["max_workers"] = self.max_workers
+        return stats
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -1,9 +1,13 @@
+import asyncio
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Sequence
 
 import requests
 
+from agent_dojo.agents.SyntheticPersonChatAgent.SyntheticPersonChatAgent import aget_instructions_for_persona
+from digital_twins.digital_twin_management import get_synthetic_persona
+from storage.digital_twin_storage import compute_content_hash
 
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")  # Set in your env/secret store
@@ -59,3 +63,40 @@ def create_realtime_session(instructions: Optional[str] = None, markdown: Option
     )
 
 
+# Languages offered by /realtime/session; instructions are precomputed for each of them
+REALTIME_LANGUAGES = ("en-US", "ja")
+
+
+def _persona_content_hash(persona_data) -> Optional[str]:
+    """Twin version key for the persona; older twins without a stored hash fall back to hashing the markdown"""
+    if persona_data.content_hash:
+        return persona_data.content_hash
+    if persona_data.markdown:
+        return compute_content_hash(persona_data.markdown)
+    return None
+
+
+async def get_realtime_instructions(persona_data, language: str) -> str:
+    """
+    Realtime instructions for a persona, served from the cache keyed by twin content_hash and language
+    and generated with an LLM call only on a miss.
+    """
+    return await aget_instructions_for_persona(
+        persona_data.persona_summary,
+        language,
+        content_hash=_persona_content_hash(persona_data)
+    )
+
+
+async def prepare_realtime_instructions(lead_id: str, languages: Sequence[str] = REALTIME_LANGUAGES) -> None:
+    """
+    Eagerly generate and cache realtime instructions for a freshly saved twin,
+    so issuing a voice session later is a cache lookup.
+    """
+    try:
+        persona_data = await get_synthetic_persona(lead_id)
+        if not persona_data:
+            return
+        await asyncio.gather(*(get_realtime_instructions(persona_data, language) for language in languages))
+    except Exception as e:
+        print(f"Warning: Could not precompute realtime instructions for {lead_id}: {e}")